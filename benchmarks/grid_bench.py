@@ -0,0 +1,156 @@
+"""拼图(combine_images)的耗时和峰值内存基准
+
+对比旧实现与当前各compose.resize_quality设置拼接2张和4张图片的每次耗时(ms/grid)、
+进程峰值RSS，以及输出与旧实现输出的PSNR。每种设置在独立子进程中运行，峰值RSS互不影响。
+旧实现(legacy)为下载后先完整解码全部图片并同时持有，再逐张LANCZOS缩放。
+解码缓存容量设为0，每次都重新解码，模拟新生成的图片。
+
+用法:
+    python benchmarks/grid_bench.py [--size 2048] [--repeat 6]
+需要numpy和Pillow。
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+import plugin_env
+
+VARIANTS = ["legacy", "high", "balanced", "fast"]
+
+def _peak_rss_mb():
+    """进程峰值RSS，Linux下读取VmHWM(ru_maxrss在exec后可能沿用父进程的值)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS下ru_maxrss单位为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def make_fixtures(out_dir, size, count=4):
+    """生成带噪点的平滑JPEG照片，接近生成结果的压缩率"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        base = Image.fromarray(rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)).resize((size, size), Image.BICUBIC)
+        pixels = np.asarray(base, dtype=np.int16) + rng.normal(0, 6, (size, size, 3)).astype(np.int16)
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(
+            os.path.join(out_dir, f"u{i}.jpg"), "JPEG", quality=92)
+
+class _Result:
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+        self.ok = True
+
+class _LocalDownloader:
+    """从本地文件返回图片内容"""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+
+    def download_all(self, urls):
+        results = []
+        for url in urls:
+            with open(os.path.join(self.fixture_dir, url), "rb") as f:
+                results.append(_Result(url, f.read()))
+        return results
+
+def _create_processor(variant, tmp_dir, downloader):
+    from PIL import Image
+    image_processor = plugin_env.load_module("image_processor")
+    decoded_cache = plugin_env.load_module("decoded_cache").DecodedImageCache(0)
+
+    if variant != "legacy":
+        return image_processor.ImageProcessor(tmp_dir, downloader=downloader, decoded_cache=decoded_cache,
+                                              resize_quality=variant)
+
+    class LegacyImageProcessor(image_processor.ImageProcessor):
+        def combine_images(self, image_urls):
+            # 旧实现先完整解码全部图片，拼接期间一直持有
+            decoded = [self._decode_pil_rgb(r.content) for r in self.downloader.download_all(image_urls)]
+            try:
+                return super().combine_images(image_urls)
+            finally:
+                del decoded
+
+        def _thumbnail(self, image_bytes, size):
+            return self._decode_pil_rgb(image_bytes).resize(size, Image.Resampling.LANCZOS)
+
+    return LegacyImageProcessor(tmp_dir, downloader=downloader, decoded_cache=decoded_cache)
+
+def run_variant(variant, fixture_dir, count, repeat, output_path):
+    """在当前进程中运行一种设置
+    Returns:
+        dict: ms(中位耗时)、rss_mb(峰值RSS)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        processor = _create_processor(variant, tmp_dir, _LocalDownloader(fixture_dir))
+        urls = [f"u{i}.jpg" for i in range(count)]
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = processor.combine_images(urls)
+            times.append(time.perf_counter() - start)
+            data = result.read()
+            result.close()
+        with open(output_path, "wb") as f:
+            f.write(data)
+    times.sort()
+    return {"ms": times[len(times) // 2] * 1000, "rss_mb": _peak_rss_mb()}
+
+def psnr(path_a, path_b):
+    import numpy as np
+    from PIL import Image
+    a = np.asarray(Image.open(path_a).convert("RGB"), dtype=np.float64)
+    b = np.asarray(Image.open(path_b).convert("RGB"), dtype=np.float64)
+    if a.shape != b.shape:
+        return float("nan")
+    mse = ((a - b) ** 2).mean()
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048, help="测试图片边长")
+    parser.add_argument("--repeat", type=int, default=6)
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, default=4, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.fixtures, args.count, args.repeat, args.output)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 在子进程中生成，避免生成过程的内存计入结果
+        subprocess.run([sys.executable, "-c",
+                        f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+                        f"import grid_bench; grid_bench.make_fixtures({tmp_dir!r}, {args.size})"], check=True)
+        print(f"{'images':<8}{'variant':<10}{'ms/grid':>9}{'peak RSS MB':>13}{'PSNR vs legacy':>16}")
+        for count in (2, 4):
+            outputs = {}
+            for variant in VARIANTS:
+                outputs[variant] = os.path.join(tmp_dir, f"out_{variant}_{count}.jpg")
+                stdout = subprocess.run(
+                    [sys.executable, __file__, "--variant", variant, "--fixtures", tmp_dir, "--count", str(count),
+                     "--repeat", str(args.repeat), "--output", outputs[variant]],
+                    check=True, capture_output=True, text=True).stdout
+                result = json.loads(stdout.strip().splitlines()[-1])
+                quality = "" if variant == "legacy" else f"{psnr(outputs['legacy'], outputs[variant]):.1f} dB"
+                print(f"{count:<8}{variant:<10}{result['ms']:>9.0f}{result['rss_mb']:>13.0f}{quality:>16}")
+
+if __name__ == "__main__":
+    main()
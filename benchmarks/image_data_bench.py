@@ -0,0 +1,127 @@
+"""图片上传路径(_get_image_data)的耗时和峰值内存基准
+
+对比旧实现(读取后base64编码，调用方再解码为字节)和当前实现(直接返回原始字节)
+处理一张约10MB照片的耗时和进程峰值RSS。每种实现在独立子进程中运行，峰值RSS互不影响。
+宿主程序可导入时调用插件的_get_image_data，否则按其文件分支读取。
+
+用法:
+    python benchmarks/image_data_bench.py [--image photo.jpg] [--size-mb 10] [--repeat 5]
+生成测试照片需要numpy和Pillow。
+"""
+import argparse
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+def _peak_rss_mb():
+    """进程峰值RSS，Linux下读取VmHWM(ru_maxrss在exec后可能沿用父进程的值)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS下ru_maxrss单位为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def make_photo(path, size_mb=10):
+    """生成一张约size_mb大小的JPEG照片(带噪点的平滑图像，接近手机原图的压缩率)"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    side = 2048
+    while True:
+        base = Image.fromarray(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8)).resize(
+            (side * 4 // 3, side), Image.BICUBIC)
+        noise = rng.normal(0, 12, (side, side * 4 // 3, 3))
+        pixels = np.clip(np.asarray(base, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+        Image.fromarray(pixels).save(path, "JPEG", quality=95)
+        if os.path.getsize(path) >= size_mb * 1024 * 1024 or side >= 8192:
+            return
+        side = int(side * 1.25)
+
+def _load_get_image_data():
+    """在宿主程序环境中导入插件的_get_image_data"""
+    try:
+        from plugins.doubao.doubao import DoubaoPlugin
+        return DoubaoPlugin._get_image_data
+    except Exception:
+        return None
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def run_variant(mode, path, repeat):
+    """在当前进程中运行一种实现
+    Returns:
+        tuple: (中位耗时ms, 峰值RSS增量MB, 是否调用了插件方法)
+    """
+    get_image_data = _load_get_image_data()
+
+    class _Msg:
+        image_data = None
+
+    def current():
+        if get_image_data is not None:
+            return get_image_data(None, _Msg(), path)
+        return _read_file(path)
+
+    def legacy():
+        # 旧实现返回base64字符串，上传前再解码为字节
+        encoded = base64.b64encode(_read_file(path)).decode("utf-8")
+        return base64.b64decode(encoded)
+
+    func = current if mode == "raw" else legacy
+    baseline = _peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = func()
+        times.append(time.perf_counter() - start)
+        del data
+    times.sort()
+    return times[len(times) // 2] * 1000, _peak_rss_mb() - baseline, get_image_data is not None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", help="测试照片路径，不指定时生成")
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--variant", choices=["raw", "base64"], help=argparse.SUPPRESS)
+    parser.add_argument("--make", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.make:
+        make_photo(args.make, args.size_mb)
+        return
+
+    if args.variant:
+        ms, rss, real = run_variant(args.variant, args.image, args.repeat)
+        print(f"{ms:.1f} {rss:.1f} {int(real)}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.image
+        if not path:
+            path = os.path.join(tmp_dir, "photo.jpg")
+            # 在子进程中生成，避免生成过程的内存计入结果
+            subprocess.run([sys.executable, __file__, "--make", path, "--size-mb", str(args.size_mb)], check=True)
+        print(f"image: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+        print(f"{'variant':<10}{'ms':>10}{'peak RSS +MB':>16}")
+        for variant in ("base64", "raw"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--variant", variant, "--image", path, "--repeat", str(args.repeat)],
+                check=True, capture_output=True, text=True).stdout.split()
+            ms, rss, real = float(output[0]), float(output[1]), output[2] == "1"
+            note = "" if variant == "base64" or real else "  (host not available, file branch emulated)"
+            print(f"{variant:<10}{ms:>10.1f}{rss:>16.1f}{note}")
+
+if __name__ == "__main__":
+    main()
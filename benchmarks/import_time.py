@@ -0,0 +1,108 @@
+"""插件导入耗时基准
+
+在新的解释器中以python -X importtime导入插件，按顶层包汇总累计耗时，
+并检查cv2、numpy、PIL、sklearn等重型依赖是否在导入阶段被加载(应在用到时才加载)。
+宿主程序可导入时导入doubao.py，否则导入doubao.py引用的module下各模块。
+
+用法:
+    python benchmarks/import_time.py [--top 15]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.join(ROOT, "tests")
+# 只应在处理图片时加载的依赖
+HEAVY_MODULES = ("cv2", "numpy", "PIL", "sklearn")
+# 宿主程序提供的模块，其导入耗时不计入插件
+HOST_MODULES = ("common.log", "config", "bridge.context", "bridge.reply", "plugins")
+
+def plugin_modules():
+    """doubao.py引用的module下的模块名"""
+    with open(os.path.join(ROOT, "doubao.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [node.module.split(".", 1)[1] for node in tree.body
+            if isinstance(node, ast.ImportFrom) and node.level == 1
+            and node.module and node.module.startswith("module.")]
+
+_IMPORT_CODE = """
+import importlib, json, sys, time
+sys.path.insert(0, {tests_dir!r})
+import plugin_env
+package = plugin_env.install()
+for name in {host_modules!r}:
+    try:
+        importlib.import_module(name)
+    except Exception:
+        pass
+before = set(sys.modules)
+start = time.perf_counter()
+mode = "doubao.py"
+try:
+    importlib.import_module(package + ".doubao")
+except Exception as e:
+    # 宿主程序不可用(或插件本身无法导入)时只导入各模块
+    mode = "modules ({{}}: {{}})".format(type(e).__name__, e)
+    for name in {modules!r}:
+        importlib.import_module(package + ".module." + name)
+elapsed = time.perf_counter() - start
+loaded = sorted(set(sys.modules) - before)
+print(json.dumps({{"mode": mode, "seconds": elapsed, "loaded": loaded}}))
+"""
+
+def import_code():
+    return _IMPORT_CODE.format(tests_dir=TESTS_DIR, host_modules=HOST_MODULES, modules=plugin_modules())
+
+def measure(importtime=False, env=None):
+    """在子进程中导入插件
+    Returns:
+        dict: mode(导入方式)、seconds(导入耗时)、loaded(新加载的模块)、heavy(加载的重型依赖)，
+              importtime为True时另含importtime(-X importtime的stderr输出)
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", import_code()]
+    process = subprocess.run(command, capture_output=True, text=True, env=env, check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["heavy"] = sorted({name.split(".")[0] for name in result["loaded"]} & set(HEAVY_MODULES))
+    if importtime:
+        result["importtime"] = process.stderr
+    return result
+
+def summarize(importtime_output, loaded):
+    """解析-X importtime输出，只保留插件导入阶段新加载的模块
+    Returns:
+        list: (模块名, 自身耗时微秒, 累计耗时微秒)，按累计耗时从高到低
+    """
+    loaded = set(loaded)
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].strip()
+        if name in loaded:
+            rows.append((name, self_us, cumulative_us))
+    return sorted(rows, key=lambda row: -row[2])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    result = measure(importtime=True)
+    print(f"imported: {result['mode']}")
+    print(f"import time: {result['seconds'] * 1000:.1f} ms, {len(result['loaded'])} new modules")
+    print(f"heavy modules loaded: {', '.join(result['heavy']) or 'none'}")
+    print(f"{'module':<40}{'self ms':>10}{'cumulative ms':>15}")
+    for name, self_us, cumulative_us in summarize(result["importtime"], result["loaded"])[:args.top]:
+        print(f"{name:<40}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""重绘蒙版生成的耗时和精度基准
+
+对比原分辨率(mask.max_side=0)和缩小工作分辨率计算圈选蒙版、涂抹蒙版的耗时，
+并给出缩小后结果与原分辨率结果、真实标记区域的交并比(IoU)。
+
+用法:
+    python benchmarks/mask_bench.py [--max-side 1024] [--repeat 5]
+需要numpy、opencv-python和Pillow。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+import plugin_env
+import image_fixtures
+
+SIZES = [(1024, 768), (2048, 1536), (4000, 3000)]
+
+def measure(processor, method, original, marked, repeat):
+    """每次运行前清空解码缓存，耗时包含解码
+    Returns:
+        tuple: (中位耗时ms, 蒙版)
+    """
+    times = []
+    for _ in range(repeat):
+        processor.decoded_cache.clear()
+        start = time.perf_counter()
+        mask = method(original, marked)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, image_fixtures.decode_mask(mask)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-side", type=int, default=1024, help="缩小后的工作分辨率上限")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image_processor = plugin_env.load_module("image_processor")
+    print(f"{'size':<11}{'mask':<8}{'full ms':>9}{'reduced ms':>12}{'IoU vs full':>13}{'IoU vs truth':>14}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        full = image_processor.ImageProcessor(tmp_dir, mask_max_side=0)
+        reduced = image_processor.ImageProcessor(tmp_dir, mask_max_side=args.max_side)
+        for width, height in SIZES:
+            fixture = image_fixtures.make_mark_fixture(width, height, seed=width)
+            for name, marked, region in (("circle", fixture["circle"], fixture["circle_region"]),
+                                         ("brush", fixture["brush"], fixture["brush_region"])):
+                method = "create_mask_from_circle_selection" if name == "circle" else "create_mask_from_marked_image"
+                full_ms, full_mask = measure(full, getattr(full, method), fixture["original"], marked, args.repeat)
+                reduced_ms, mask = measure(reduced, getattr(reduced, method), fixture["original"], marked, args.repeat)
+                print(f"{f'{width}x{height}':<11}{name:<8}{full_ms:>9.0f}{reduced_ms:>12.0f}"
+                      f"{image_fixtures.iou(mask, full_mask):>13.4f}{image_fixtures.iou(mask, region):>14.4f}")
+
+if __name__ == "__main__":
+    main()
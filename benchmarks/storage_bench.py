@@ -0,0 +1,182 @@
+"""图片记录存储的吞吐基准
+
+对比每次调用新建连接、默认回滚日志的旧实现与当前各存储后端的每秒操作数：
+store为写入一条编辑记录(每条以上一条为父图片)，get为按ID读取，history为读取完整操作历史。
+
+用法:
+    python benchmarks/storage_bench.py [-n 2000] [--backends legacy,sqlite,batched,memory,redis]
+redis后端需要安装fakeredis，或通过--redis-url连接真实服务。
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+import plugin_env
+
+class LegacyImageStorage:
+    """旧实现：每次调用新建连接，每条记录复制父记录的编辑链和操作历史"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''CREATE TABLE IF NOT EXISTS images
+                        (id TEXT PRIMARY KEY,
+                         urls TEXT NOT NULL,
+                         operation_type TEXT NOT NULL,
+                         operation_params TEXT,
+                         parent_id TEXT,
+                         edit_chain TEXT,
+                         operation_history TEXT,
+                         created_at INTEGER)''')
+        conn.commit()
+        conn.close()
+
+    def store_image(self, img_id, image_info):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            c = conn.cursor()
+            edit_chain = []
+            operation_history = []
+            parent_id = image_info.get("parent_id")
+            if parent_id:
+                c.execute('SELECT edit_chain, operation_history FROM images WHERE id = ?', (parent_id,))
+                result = c.fetchone()
+                if result:
+                    edit_chain = json.loads(result[0]) if result[0] else []
+                    operation_history = json.loads(result[1]) if result[1] else []
+                edit_chain.append(parent_id)
+            operation_history.append({
+                'id': img_id,
+                'type': image_info.get("type"),
+                'params': image_info.get("operation_params"),
+                'timestamp': image_info.get("create_time", int(time.time()))
+            })
+            c.execute('''INSERT INTO images
+                         (id, urls, operation_type, operation_params, parent_id, edit_chain, operation_history, created_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (img_id, json.dumps(image_info.get("urls", [])), image_info.get("type"),
+                       json.dumps(image_info.get("operation_params", {})), parent_id,
+                       json.dumps(edit_chain), json.dumps(operation_history),
+                       image_info.get("create_time", int(time.time()))))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_image(self, img_id):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('''SELECT id, urls, operation_type, operation_params,
+                                         parent_id, edit_chain, operation_history, created_at
+                                  FROM images WHERE id = ?''', (img_id,)).fetchone()
+            if not row:
+                return None
+            return {
+                'id': row[0],
+                'urls': json.loads(row[1]),
+                'type': row[2],
+                'operation_params': json.loads(row[3]),
+                'parent_id': row[4],
+                'edit_chain': json.loads(row[5]) if row[5] else [],
+                'operation_history': json.loads(row[6]) if row[6] else [],
+                'create_time': row[7]
+            }
+        finally:
+            conn.close()
+
+    def get_history(self, img_id):
+        image_info = self.get_image(img_id)
+        return image_info["operation_history"] if image_info else []
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def make_record(i, parent_id, chain_length=20):
+    """第i条测试记录，每chain_length条开始一条新的编辑链"""
+    return {
+        "urls": [f"https://example.com/{i}/{n}.png" for n in range(4)],
+        "type": "generate" if i % chain_length == 0 else "edit",
+        "operation_params": {"prompt": f"prompt {i}", "conversation_id": f"conv-{i % 8}"},
+        "parent_id": None if i % chain_length == 0 else parent_id,
+        "create_time": int(time.time()),
+        "user_id": f"user-{i % 16}"
+    }
+
+def run(storage, n=2000):
+    """测量一个存储后端的吞吐
+    Args:
+        storage: 存储后端实例
+        n: 写入和读取的记录数
+    Returns:
+        dict: store、get、history的每秒操作数
+    """
+    ids = [f"bench-{i:06d}" for i in range(n)]
+    start = time.perf_counter()
+    for i, img_id in enumerate(ids):
+        storage.store_image(img_id, make_record(i, ids[i - 1] if i else None))
+    storage.flush()
+    store_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for img_id in ids:
+        storage.get_image(img_id)
+    get_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for img_id in ids:
+        storage.get_history(img_id)
+    history_time = time.perf_counter() - start
+
+    return {
+        "store": n / store_time,
+        "get": n / get_time,
+        "history": n / history_time
+    }
+
+def create_backend(name, tmp_dir, redis_url=None):
+    if name == "legacy":
+        return LegacyImageStorage(os.path.join(tmp_dir, "legacy.db"))
+    if name in ("sqlite", "batched"):
+        image_storage = plugin_env.load_module("image_storage")
+        durability = "batched" if name == "batched" else "immediate"
+        return image_storage.ImageStorage(os.path.join(tmp_dir, f"{name}.db"), durability=durability)
+    if name == "memory":
+        return plugin_env.load_module("memory_storage").MemoryImageStorage()
+    if name == "redis":
+        redis_storage = plugin_env.load_module("redis_storage")
+        if redis_url:
+            return redis_storage.RedisImageStorage(url=redis_url, prefix="doubao-bench")
+        import fakeredis
+        return redis_storage.RedisImageStorage(client=fakeredis.FakeRedis(decode_responses=True))
+    raise ValueError(f"unknown backend: {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="记录数")
+    parser.add_argument("--backends", default="legacy,sqlite,batched,memory,redis")
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'store/s':>12}{'get/s':>12}{'history/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.backends.split(","):
+            try:
+                storage = create_backend(name, tmp_dir, args.redis_url)
+            except ImportError as e:
+                print(f"{name:<10}skipped ({e})")
+                continue
+            try:
+                result = run(storage, args.n)
+            finally:
+                storage.close()
+            print(f"{name:<10}{result['store']:>12.0f}{result['get']:>12.0f}{result['history']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,30 @@
+import atexit
 import json
 import os
 import time
 import uuid
-import base64
-import requests
+import io
 from bridge.context import ContextType
 from bridge.reply import Reply, ReplyType
 from plugins import Plugin, Event, EventAction, EventContext, register
 from common.log import logger
+from config import conf
 from .module.token_manager import TokenManager
 from .module.api_client import ApiClient
-from .module.image_storage import ImageStorage
+from .module.async_api_client import BlockingApiClient
+from .module.storage_backend import create_image_storage
 from .module.image_processor import ImageProcessor
+from .module.image_encoder import create_image_encoder
 from .module.image_uploader import ImageUploader
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from .module.http_session import HttpSessionPool
+from .module.job_scheduler import JobScheduler, JobContext, QueueFullError
+from .module.sse_parser import StreamEvent
+from .module.image_downloader import ImageDownloader
+from .module.image_cache import ImageCache
+from .module.decoded_cache import DecodedImageCache
+from .module.id_generator import IdGenerator, normalize_image_id
+from .module.session_manager import SessionManager
+from .module.pending_store import PendingStore
 
 @register(
     name="Doubao",
@@ -24,8 +34,15 @@ from urllib3.util.retry import Retry
     desire_priority=0
 )
 class DoubaoPlugin(Plugin):
+    # 当前生效的实例，插件重新加载时用于释放旧实例的资源
+    _active_instance = None
+
     def __init__(self):
         super().__init__()
+        self._closed = False
+        previous = DoubaoPlugin._active_instance
+        if previous is not None:
+            previous.close()
         try:
             # 加载配置
             self.config = self._load_config()
@@ -45,41 +62,110 @@ class DoubaoPlugin(Plugin):
                 os.makedirs(temp_dir)
             
             # 初始化各个模块
-            self.image_storage = ImageStorage(
-                os.path.join(storage_dir, "images.db"),
-                retention_days=retention_days
+            storage_config = self.config.get("storage", {})
+            # 按storage.backend选择存储后端(sqlite/memory/redis)
+            self.image_storage = create_image_storage(storage_config, storage_dir)
+            # 后台按批清理超过保留天数的记录
+            self.image_storage.start_retention_worker(
+                interval=storage_config.get("cleanup_interval", 3600),
+                batch_size=storage_config.get("cleanup_batch_size", 500)
             )
             
-            # 初始化token管理器和API客户端
-            self.token_manager = TokenManager(self.config)
-            self.api_client = ApiClient(self.token_manager)
+            # 初始化图片ID生成器，多台机器共享存储时需配置不同的node_id
+            self.id_generator = IdGenerator(self.config.get("id", {}).get("node_id"))
+            
+            # 初始化共享HTTP连接池、token管理器和API客户端
+            self.http_pool = HttpSessionPool(self.config)
+            self.token_manager = TokenManager(self.config, self.http_pool)
+            api_config = self.config.get("api", {})
+            if api_config.get("async", False):
+                # 异步客户端：所有生成请求共享一个后台事件循环
+                self.api_client = BlockingApiClient(
+                    self.token_manager,
+                    max_connections=api_config.get("max_connections", 200),
+                    limit_per_host=api_config.get("limit_per_host", 100),
+                    timeout=api_config.get("timeout", 60)
+                )
+            else:
+                self.api_client = ApiClient(self.token_manager, self.http_pool)
             
             # 初始化图片处理器和上传器
             self.image_uploader = ImageUploader(self.config)
-            self.image_processor = ImageProcessor(temp_dir, self.image_uploader)
+            # 初始化结果图片本地缓存，过期时间与数据保留天数一致
+            cache_config = self.config.get("cache", {})
+            self.image_cache = None
+            if cache_config.get("enabled", True):
+                self.image_cache = ImageCache(
+                    os.path.join(os.path.dirname(__file__), "cache"),
+                    max_bytes=cache_config.get("max_mb", 512) * 1024 * 1024,
+                    ttl_seconds=retention_days * 86400
+                )
+            
+            download_config = self.config.get("download", {})
+            self.image_downloader = ImageDownloader(
+                self.http_pool,
+                max_workers=download_config.get("max_workers", 4),
+                timeout=download_config.get("timeout", 30),
+                max_bytes=download_config.get("max_mb", 20) * 1024 * 1024,
+                retries=download_config.get("retries", 2),
+                backoff_factor=download_config.get("backoff_factor", 0.5),
+                cache=self.image_cache
+            )
+            decode_cache_config = self.config.get("decode_cache", {})
+            self.decoded_cache = DecodedImageCache(decode_cache_config.get("max_mb", 256) * 1024 * 1024)
+            mask_config = self.config.get("mask", {})
+            compose_config = self.config.get("compose", {})
+            self.image_processor = ImageProcessor(
+                temp_dir,
+                self.image_uploader,
+                downloader=self.image_downloader,
+                decoded_cache=self.decoded_cache,
+                mask_max_side=mask_config.get("max_side", 1024),
+                mask_compression=mask_config.get("compression", 1),
+                debug_mask=mask_config.get("debug", False),
+                output=compose_config.get("output", "memory"),
+                resize_quality=compose_config.get("resize_quality", "balanced"),
+                encoder=create_image_encoder(self.config.get("encoder", {}), conf().get("channel_type"))
+            )
             
             # 从配置文件加载支持的风格列表
             self.styles = self.config.get("styles", [])
             
-            # 初始化会话信息
-            self.conversation_id = None
-            self.section_id = None
-            self.reply_id = None
-            
-            # 从数据库恢复上次会话信息
-            self._init_conversation_from_storage()
+            # 按用户/群聊管理会话，会话状态保存在存储后端，重启后按需恢复
+            session_config = self.config.get("session", {})
+            self.session_scope = session_config.get("scope", "user")
+            self.session_manager = SessionManager(
+                self.image_storage,
+                max_sessions=session_config.get("max_sessions", 1000),
+                idle_timeout=session_config.get("idle_timeout", 3600),
+                rotate_after=session_config.get("rotate_after", 50)
+            )
             
-            # 初始化参考图功能相关变量
-            self.waiting_for_reference = {}
-            self.reference_prompts = {}
+            # 初始化参考图、抠图和区域重绘等待图片期间的状态，超时自动清理
+            pending_config = self.config.get("pending", {})
+            self.pending = PendingStore(
+                ttl=pending_config.get("ttl", 600),
+                max_bytes=pending_config.get("max_mb", 64) * 1024 * 1024,
+                spill_dir=os.path.join(temp_dir, "pending") if pending_config.get("spill_to_disk", True) else None,
+                spill_threshold=pending_config.get("spill_threshold_kb", 256) * 1024
+            )
             
-            # 初始化区域重绘相关变量
-            self.waiting_for_inpaint = {}
-            self.inpaint_prompts = {}
-            self.inpaint_images = {}
+            # 初始化任务调度器，耗时命令在工作线程中执行
+            scheduler_config = self.config.get("scheduler", {})
+            self.job_scheduler = None
+            if scheduler_config.get("enabled", True):
+                self.job_scheduler = JobScheduler(
+                    max_workers=scheduler_config.get("max_workers", 4),
+                    per_user_limit=scheduler_config.get("per_user_limit", 1),
+                    max_queue=scheduler_config.get("max_queue", 100)
+                )
             
             # 注册事件处理器
             self.handlers[Event.ON_HANDLE_CONTEXT] = self.on_handle_context
+
+            # 插件重新加载时由新实例调用close，进程退出时由atexit调用
+            DoubaoPlugin._active_instance = self
+            atexit.register(self.close)
             
             logger.info(f"[Doubao] plugin initialized with {retention_days} days data retention")
             
@@ -87,6 +173,129 @@ class DoubaoPlugin(Plugin):
             logger.error(f"[Doubao] Failed to initialize plugin: {e}")
             raise e
 
+    def close(self):
+        """释放插件资源：停止任务调度器并关闭网络连接，可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if DoubaoPlugin._active_instance is self:
+            DoubaoPlugin._active_instance = None
+
+        job_scheduler = getattr(self, "job_scheduler", None)
+        if job_scheduler:
+            logger.info(f"[Doubao] Job scheduler stats: {job_scheduler.get_stats()}")
+            # 已取出的任务执行完成后工作线程退出，排队中的任务丢弃
+            job_scheduler.shutdown(wait=True, timeout=5)
+        image_storage = getattr(self, "image_storage", None)
+        if image_storage is not None:
+            # 落盘batched模式下尚未提交的记录并停止清理线程
+            image_storage.close()
+        image_cache = getattr(self, "image_cache", None)
+        if image_cache is not None:
+            logger.info(f"[Doubao] Image cache stats: {image_cache.get_stats()}")
+        decoded_cache = getattr(self, "decoded_cache", None)
+        if decoded_cache is not None:
+            logger.info(f"[Doubao] Decoded image cache stats: {decoded_cache.get_stats()}")
+        image_downloader = getattr(self, "image_downloader", None)
+        if image_downloader is not None:
+            logger.info(f"[Doubao] Image download timings: {image_downloader.get_timings()['hosts']}")
+            image_downloader.close()
+        image_processor = getattr(self, "image_processor", None)
+        if image_processor is not None:
+            image_processor.close()
+        api_client = getattr(self, "api_client", None)
+        if api_client is not None and hasattr(api_client, "close"):
+            api_client.close()
+        http_pool = getattr(self, "http_pool", None)
+        if http_pool is not None:
+            logger.info(f"[Doubao] Http pool stats: {http_pool.get_stats()}")
+            http_pool.close()
+        logger.info("[Doubao] plugin closed")
+
+    def _get_status_text(self):
+        """插件运行状态：任务队列及待处理命令"""
+        sections = [self._get_scheduler_status_text()]
+        pending_stats = self.pending.get_stats()
+        by_kind = "，".join(f"{kind} {count}" for kind, count in pending_stats["by_kind"].items()) or "无"
+        sections.append(
+            f"待处理命令\n"
+            f"等待中: {pending_stats['active']} ({by_kind})，内存 {pending_stats['memory_bytes'] / 1024 / 1024:.1f}MB\n"
+            f"已完成: {pending_stats['completed']}，过期: {pending_stats['expired']}，"
+            f"淘汰: {pending_stats['evicted']}，落盘: {pending_stats['spilled']}"
+        )
+        sections.append(self._get_http_status_text())
+        sections.append(self._get_download_status_text())
+        sections.append(self._get_cache_status_text())
+        return "\n\n".join(sections)
+
+    def _get_scheduler_status_text(self):
+        """任务队列状态：排队深度、运行数及等待/执行耗时"""
+        if not self.job_scheduler:
+            return "任务队列未启用"
+        stats = self.job_scheduler.get_stats()
+        return (
+            f"任务队列状态\n"
+            f"排队: {stats['queue_depth']} (峰值 {stats['max_queue_depth']})\n"
+            f"运行: {stats['running']}/{stats['workers']}\n"
+            f"已完成: {stats['completed']}，失败: {stats['failed']}，拒绝: {stats['rejected']}\n"
+            f"等待耗时: 平均 {stats['avg_wait']}s，最长 {stats['max_wait']}s\n"
+            f"执行耗时: 平均 {stats['avg_run']}s，最长 {stats['max_run']}s"
+        )
+
+    def _get_http_status_text(self):
+        """HTTP连接池状态：请求数、连接复用率及各主机连接数"""
+        stats = self.http_pool.get_stats()
+        lines = [
+            f"HTTP连接池\n"
+            f"请求: {stats['requests']}，失败: {stats['errors']}，会话: {stats['sessions']}\n"
+            f"连接: {stats['connections']}，复用率: {stats['reuse_rate'] * 100:.1f}%"
+        ]
+        for host, host_stats in stats["hosts"].items():
+            lines.append(
+                f"{host}: 请求 {host_stats['requests']}，连接 {host_stats['connections']}，空闲 {host_stats['idle']}"
+            )
+        return "\n".join(lines)
+
+    def _get_download_status_text(self):
+        """图片下载状态：各主机平均/最大耗时及最近的慢请求"""
+        timings = self.image_downloader.get_timings()
+        if not timings["hosts"]:
+            return "图片下载\n暂无下载记录"
+        lines = ["图片下载"]
+        for host, host_stats in timings["hosts"].items():
+            lines.append(
+                f"{host}: {host_stats['count']} 次，失败 {host_stats['failed']}，"
+                f"平均 {host_stats['avg_time']}s，最长 {host_stats['max_time']}s"
+            )
+        slowest = sorted(timings["recent"], key=lambda t: t["elapsed"], reverse=True)[:3]
+        for timing in slowest:
+            state = "" if timing["ok"] else "，失败"
+            lines.append(f"慢请求 {timing['elapsed']}s ({timing['attempts']} 次{state}): {timing['url']}")
+        return "\n".join(lines)
+
+    def _get_cache_status_text(self):
+        """图片缓存状态：磁盘缓存命中率、节省的下载量及解码缓存命中率"""
+        if self.image_cache:
+            stats = self.image_cache.get_stats()
+            text = (
+                f"图片缓存\n"
+                f"文件: {stats['entries']}，占用 {stats['bytes'] / 1024 / 1024:.1f}MB\n"
+                f"命中: {stats['hits']}，未命中: {stats['misses']}，命中率: {stats['hit_ratio'] * 100:.1f}%\n"
+                f"节省下载: {stats['bytes_saved'] / 1024 / 1024:.1f}MB"
+            )
+        else:
+            text = "图片缓存未启用"
+        decoded_stats = self.decoded_cache.get_stats()
+        return (
+            f"{text}\n\n"
+            f"解码缓存\n"
+            f"图片: {decoded_stats['entries']}，内存 {decoded_stats['bytes'] / 1024 / 1024:.1f}MB"
+            f"/{decoded_stats['max_bytes'] / 1024 / 1024:.0f}MB\n"
+            f"命中: {decoded_stats['hits']}，未命中: {decoded_stats['misses']}，"
+            f"命中率: {decoded_stats['hit_ratio'] * 100:.1f}%"
+        )
+
     def _load_config(self):
         """加载配置文件"""
         try:
@@ -105,6 +314,7 @@ class DoubaoPlugin(Plugin):
         draw_command = commands.get('draw', '豆包') if isinstance(commands, dict) else '豆包'
         help_text += f"{draw_command} : 新建会话\n"
         help_text += f"{draw_command}新建会话 : 强制新建会话\n"
+        help_text += f"{draw_command}状态 : 查看任务队列状态\n"
         help_text += f"{draw_command} [提示词] [-风格] [-比例]: 生成图片\n"
         help_text += "支持的风格: " + ", ".join(self.styles) + "\n"
         help_text += "支持的比例: " + ", ".join(self.config.get("params", {}).get("ratios", ["4:3"])) + "\n"
@@ -121,8 +331,24 @@ class DoubaoPlugin(Plugin):
         help_text += "重新生成: $r 图片ID\n"
         return help_text
 
-    def _create_new_conversation(self):
-        """创建新的图像生成会话"""
+    def _get_session(self, e_context):
+        """获取当前消息所属的会话
+        私聊按用户区分；群聊按session.scope配置整个群共用一个会话(group)或群内每个用户各自一个会话(user)
+        """
+        context = e_context["context"]
+        msg = context["msg"]
+        if context.get("isgroup", False):
+            group_id = msg.other_user_id
+            if self.session_scope == "group":
+                key = f"group:{group_id}"
+            else:
+                key = f"group:{group_id}:{msg.actual_user_id}"
+        else:
+            key = f"user:{msg.from_user_id}"
+        return self.session_manager.get(key)
+
+    def _create_new_conversation(self, e_context):
+        """创建新的图像生成会话，当前用户/群聊的下一次请求将开启新的上游会话"""
         try:
             # 构建图像生成会话请求数据
             data = {
@@ -143,20 +369,8 @@ class DoubaoPlugin(Plugin):
                     self.styles = [category["category_name"] for category in category_list]
                     logger.info(f"[Doubao] Loaded {len(self.styles)} styles from API")
                 
-                # 获取历史会话列表
-                history_data = {
-                    "request_list": [{
-                        "conversation_id": "0"
-                    }]
-                }
-                history_result = self.api_client.send_request(history_data, "/alice/conversation/latest_messagelist")
-                if history_result and "data" in history_result and "message_map" in history_result["data"]:
-                    # 找到最新的图像生成会话
-                    for conv_id, messages in history_result["data"]["message_map"].items():
-                        if messages and len(messages) > 0:
-                            self.conversation_id = conv_id
-                            self.section_id = messages[0].get("section_id")
-                            break
+                # 清空当前会话，不再沿用账号下其他聊天的会话
+                self.session_manager.reset(self._get_session(e_context).key)
                 
                 return True
             return False
@@ -238,6 +452,73 @@ class DoubaoPlugin(Plugin):
         if e_context["context"].type != ContextType.TEXT and e_context["context"].type != ContextType.IMAGE:
             return
 
+        if self.job_scheduler and self._is_job_command(e_context):
+            self._enqueue_job(e_context)
+            return
+
+        self._handle_context(e_context)
+
+    def _is_job_command(self, e_context) -> bool:
+        """判断消息是否会触发耗时的生成/上传流程"""
+        context_type = e_context["context"].type
+        content = e_context["context"].content
+        msg = e_context["context"]["msg"]
+
+        if context_type == ContextType.IMAGE:
+            if self.pending.get("reference", msg.from_user_id) is not None:
+                return True
+            # 区域重绘只有第二张图片才会触发处理
+            return self.pending.has_payload("inpaint", msg.from_user_id, "original")
+
+        commands = self.config.get('commands', {})
+        draw_command = commands.get('draw', '豆包') if isinstance(commands, dict) else '豆包'
+        if content.startswith("$"):
+            return len(content.split()) >= 2
+        if content.startswith(draw_command):
+            return content.strip() not in (draw_command, f"{draw_command}新建会话", f"{draw_command}状态")
+        return False
+
+    @staticmethod
+    def _job_user_id(e_context):
+        """单用户并发限制使用的用户ID，群聊中按发言人区分，而不是整个群"""
+        context = e_context["context"]
+        msg = context["msg"]
+        if context.get("isgroup", False) and msg.actual_user_id:
+            return f"{msg.other_user_id}:{msg.actual_user_id}"
+        return msg.from_user_id
+
+    def _enqueue_job(self, e_context):
+        """将命令加入任务队列，立即返回确认"""
+        user_id = self._job_user_id(e_context)
+        job_context = JobContext(e_context)
+        try:
+            stats = self.job_scheduler.get_stats()
+            # 队列深度包含被单用户并发上限阻塞的任务，不代表执行顺序，只提示确定排在前面的本人任务
+            user_pending = self.job_scheduler.user_pending(user_id)
+            self.job_scheduler.submit(user_id, self._run_job, job_context, name="doubao")
+            if user_pending > 0:
+                e_context["reply"] = Reply(ReplyType.INFO, f"任务已加入队列，将在你之前的 {user_pending} 个任务完成后处理，请稍候...")
+            elif stats["running"] >= stats["workers"]:
+                e_context["reply"] = Reply(ReplyType.INFO, "任务已加入队列，请稍候...")
+            else:
+                e_context["reply"] = Reply(ReplyType.INFO, "已收到，正在处理，请稍候...")
+        except QueueFullError:
+            logger.warning("[Doubao] Job queue is full, rejecting command")
+            e_context["reply"] = Reply(ReplyType.ERROR, "当前任务过多，请稍后再试")
+        e_context.action = EventAction.BREAK_PASS
+
+    def _run_job(self, job_context):
+        """在工作线程中执行命令并通过channel发送结果"""
+        try:
+            self._handle_context(job_context)
+        except Exception as e:
+            logger.error(f"[Doubao] Error running job: {e}")
+            job_context["reply"] = Reply(ReplyType.ERROR, "处理命令失败")
+        reply = job_context["reply"]
+        if reply:
+            job_context["channel"].send(reply, job_context["context"])
+
+    def _handle_context(self, e_context):
         content = e_context["context"].content
         msg = e_context["context"]["msg"]
         
@@ -248,8 +529,7 @@ class DoubaoPlugin(Plugin):
         # 处理抠图命令
         if e_context["context"].type == ContextType.TEXT and content == "抠图":
             # 记录用户ID和等待状态
-            self.waiting_for_reference[msg.from_user_id] = True
-            self.reference_prompts[msg.from_user_id] = {"type": "koutu"}
+            self.pending.set("reference", msg.from_user_id, {"type": "koutu"})
             e_context["reply"] = Reply(ReplyType.TEXT, "请发送需要抠图的图片")
             e_context.action = EventAction.BREAK_PASS
             return
@@ -272,18 +552,31 @@ class DoubaoPlugin(Plugin):
                 return
             
             # 记录用户ID和完整参数
-            self.waiting_for_reference[msg.from_user_id] = True
-            self.reference_prompts[msg.from_user_id] = {
+            self.pending.set("reference", msg.from_user_id, {
                 "prompt": prompt,
                 "style": style,
                 "ratio": ratio
-            }
+            })
             e_context["reply"] = Reply(ReplyType.TEXT, "请发送需要编辑的参考图片")
             e_context.action = EventAction.BREAK_PASS
             return
         
+        # 等待的图片超时后提示用户重新发送命令
+        if e_context["context"].type == ContextType.IMAGE:
+            if self.pending.pop_expired("inpaint", msg.from_user_id):
+                e_context["reply"] = Reply(ReplyType.ERROR, "重绘等待超时，请重新发送重绘命令")
+                e_context.action = EventAction.BREAK_PASS
+                return
+            if self.pending.pop_expired("reference", msg.from_user_id):
+                e_context["reply"] = Reply(ReplyType.ERROR, "等待图片超时，请重新发送参考图或抠图命令")
+                e_context.action = EventAction.BREAK_PASS
+                return
+        
         # 处理参考图片上传
-        if e_context["context"].type == ContextType.IMAGE and msg.from_user_id in self.waiting_for_reference:
+        reference_params = None
+        if e_context["context"].type == ContextType.IMAGE:
+            reference_params = self.pending.get("reference", msg.from_user_id)
+        if reference_params is not None:
             try:
                 # 获取图片数据
                 logger.info("[Doubao] 开始获取图片数据...")
@@ -294,8 +587,7 @@ class DoubaoPlugin(Plugin):
                     return
                 
                 # 根据类型处理图片
-                params = self.reference_prompts.get(msg.from_user_id, {})
-                if params.get("type") == "koutu":
+                if reference_params.get("type") == "koutu":
                     # 处理抠图
                     self._process_koutu(image_data, msg, e_context)
                 else:
@@ -308,10 +600,7 @@ class DoubaoPlugin(Plugin):
                 
             finally:
                 # 清除等待状态
-                if msg.from_user_id in self.waiting_for_reference:
-                    del self.waiting_for_reference[msg.from_user_id]
-                if msg.from_user_id in self.reference_prompts:
-                    del self.reference_prompts[msg.from_user_id]
+                self.pending.pop("reference", msg.from_user_id)
             
             e_context.action = EventAction.BREAK_PASS
             return
@@ -349,14 +638,16 @@ class DoubaoPlugin(Plugin):
                 return
             
             # 记录用户ID和等待状态
-            self.waiting_for_inpaint[msg.from_user_id] = True
-            self.inpaint_prompts[msg.from_user_id] = {"prompt": prompt, "mode": mode, "is_invert": is_invert}
+            self.pending.set("inpaint", msg.from_user_id, {"prompt": prompt, "mode": mode, "is_invert": is_invert})
             e_context["reply"] = Reply(ReplyType.TEXT, "请发送需要重绘的原图")
             e_context.action = EventAction.BREAK_PASS
             return
         
         # 处理区域重绘的图片上传
-        if e_context["context"].type == ContextType.IMAGE and msg.from_user_id in self.waiting_for_inpaint:
+        inpaint_params = None
+        if e_context["context"].type == ContextType.IMAGE:
+            inpaint_params = self.pending.get("inpaint", msg.from_user_id)
+        if inpaint_params is not None:
             try:
                 # 获取图片数据
                 image_data = self._get_image_data(msg, content)
@@ -364,11 +655,12 @@ class DoubaoPlugin(Plugin):
                     e_context["reply"] = Reply(ReplyType.ERROR, "获取图片数据失败，请重试")
                     return
                 
-                if msg.from_user_id not in self.inpaint_images:
+                original_image = self.pending.get_payload("inpaint", msg.from_user_id, "original")
+                if original_image is None:
                     # 第一次上传，保存原图
-                    self.inpaint_images[msg.from_user_id] = {"original": image_data}
+                    self.pending.put_payload("inpaint", msg.from_user_id, "original", image_data)
                     # 根据模式显示不同的提示信息
-                    mode = self.inpaint_prompts[msg.from_user_id].get("mode", "circle")
+                    mode = inpaint_params.get("mode", "circle")
                     if mode == "circle":
                         e_context["reply"] = Reply(ReplyType.TEXT, "请发送在需要重绘区域画圈的图片")
                     else:  # brush mode
@@ -376,10 +668,7 @@ class DoubaoPlugin(Plugin):
                 else:
                     try:
                         # 第二次上传，处理重绘
-                        original_image = self.inpaint_images[msg.from_user_id]["original"]
-                        prompt = self.inpaint_prompts[msg.from_user_id]["prompt"]
-                        mode = self.inpaint_prompts[msg.from_user_id]["mode"]
-                        is_invert = self.inpaint_prompts[msg.from_user_id]["is_invert"]
+                        prompt = inpaint_params["prompt"]
                         
                         # 处理区域重绘
                         self._process_inpaint(original_image, image_data, prompt, msg, e_context)
@@ -388,12 +677,7 @@ class DoubaoPlugin(Plugin):
                         e_context["reply"] = Reply(ReplyType.ERROR, "处理图片失败，请重试")
                     finally:
                         # 清理状态
-                        if msg.from_user_id in self.waiting_for_inpaint:
-                            del self.waiting_for_inpaint[msg.from_user_id]
-                        if msg.from_user_id in self.inpaint_prompts:
-                            del self.inpaint_prompts[msg.from_user_id]
-                        if msg.from_user_id in self.inpaint_images:
-                            del self.inpaint_images[msg.from_user_id]
+                        self.pending.pop("inpaint", msg.from_user_id)
                     
                 e_context.action = EventAction.BREAK_PASS
                 return
@@ -403,10 +687,7 @@ class DoubaoPlugin(Plugin):
                 e_context["reply"] = Reply(ReplyType.ERROR, "处理图片失败，请重试")
                 
                 # 清理状态
-                if msg.from_user_id in self.waiting_for_inpaint:
-                    del self.waiting_for_inpaint[msg.from_user_id]
-                if msg.from_user_id in self.inpaint_prompts:
-                    del self.inpaint_prompts[msg.from_user_id]
+                self.pending.pop("inpaint", msg.from_user_id)
                 
                 e_context.action = EventAction.BREAK_PASS
                 return
@@ -422,7 +703,7 @@ class DoubaoPlugin(Plugin):
                     return
                     
                 cmd = cmd_parts[0][1:]  # 去掉$前缀
-                img_id = cmd_parts[1]
+                img_id = normalize_image_id(cmd_parts[1])
                 
                 try:
                     if cmd == "u" and len(cmd_parts) == 3:  # 放大命令
@@ -433,7 +714,12 @@ class DoubaoPlugin(Plugin):
                         else:
                             image_data = self.image_storage.get_image(img_id)
                             image_url = image_data["urls"][index - 1]
-                            e_context["reply"] = Reply(ReplyType.IMAGE_URL, image_url)
+                            # 已缓存的图片直接从本地发送，避免重复下载
+                            cached = self.image_cache.get(image_url) if self.image_cache else None
+                            if cached:
+                                e_context["reply"] = Reply(ReplyType.IMAGE, io.BytesIO(cached))
+                            else:
+                                e_context["reply"] = Reply(ReplyType.IMAGE_URL, image_url)
                     
                     elif cmd == "v":  # 编辑命令
                         if len(cmd_parts) < 3:
@@ -522,7 +808,7 @@ class DoubaoPlugin(Plugin):
                             result = self.api_client.send_request(data, "/samantha/chat/completion")
                             if result and "urls" in result:
                                 # 存储编辑后的图片
-                                new_img_id = str(int(time.time()))
+                                new_img_id = self.id_generator.next_id()
                                 operation_params = {
                                     "prompt": edit_prompt,
                                     "conversation_id": conversation_id,
@@ -542,7 +828,8 @@ class DoubaoPlugin(Plugin):
                                     "type": "edit",
                                     "operation_params": operation_params,
                                     "parent_id": img_id,
-                                    "create_time": int(time.time())
+                                    "create_time": int(time.time()),
+                                    "user_id": msg.from_user_id
                                 }
                                 
                                 # 保存到数据库
@@ -703,7 +990,7 @@ class DoubaoPlugin(Plugin):
                             result = self.api_client.send_request(data, "/samantha/chat/completion")
                             if result and "urls" in result:
                                 # 存储扩图后的图片
-                                new_img_id = str(int(time.time()))
+                                new_img_id = self.id_generator.next_id()
                                 operation_params = {
                                     "ratio": ratio,
                                     "conversation_id": conversation_id,
@@ -731,7 +1018,8 @@ class DoubaoPlugin(Plugin):
                                     "type": "outpaint",
                                     "operation_params": operation_params,
                                     "parent_id": img_id,
-                                    "create_time": int(time.time())
+                                    "create_time": int(time.time()),
+                                    "user_id": msg.from_user_id
                                 }
                                 
                                 # 保存到数据库
@@ -773,7 +1061,8 @@ class DoubaoPlugin(Plugin):
                         success, new_img_id, urls, is_multi = self.regenerate_image(
                             image_data,
                             operation_params.get("conversation_id"),
-                            operation_params.get("section_id")
+                            operation_params.get("section_id"),
+                            user_id=msg.from_user_id
                         )
                         
                         if success and urls:
@@ -812,7 +1101,7 @@ class DoubaoPlugin(Plugin):
             if content.startswith(draw_command):
                 # 处理新建会话命令
                 if content == f"{draw_command}新建会话":
-                    if self._create_new_conversation():
+                    if self._create_new_conversation(e_context):
                         style_text = "、".join(self.styles) if self.styles else "暂无可用风格"
                         e_context["reply"] = Reply(ReplyType.INFO, f"已创建新的绘图会话\n支持的风格：{style_text}")
                     else:
@@ -820,9 +1109,15 @@ class DoubaoPlugin(Plugin):
                     e_context.action = EventAction.BREAK_PASS
                     return
                     
+                # 查看任务队列状态
+                if content.strip() == f"{draw_command}状态":
+                    e_context["reply"] = Reply(ReplyType.INFO, self._get_status_text())
+                    e_context.action = EventAction.BREAK_PASS
+                    return
+
                 # 处理其他豆包命令
                 if content.strip() == draw_command:
-                    if self._create_new_conversation():
+                    if self._create_new_conversation(e_context):
                         style_text = "、".join(self.styles) if self.styles else "暂无可用风格"
                         e_context["reply"] = Reply(ReplyType.INFO, f"已创建新的绘图会话\n支持的风格：{style_text}")
                     else:
@@ -851,10 +1146,12 @@ class DoubaoPlugin(Plugin):
                     if ratio and ratio.strip():  # 确保ratio不为空且不只包含空格
                         full_prompt += f"，比例「{ratio}」"
 
-                    # 发送等待消息
-                    e_context["channel"].send(Reply(ReplyType.INFO, "正在生成图片,请稍候..."), e_context["context"])
+                    # 发送等待消息，通过任务队列执行时入队时已确认，不再重复发送
+                    if not isinstance(e_context, JobContext):
+                        e_context["channel"].send(Reply(ReplyType.INFO, "正在生成图片,请稍候..."), e_context["context"])
 
                     # 构建请求数据
+                    session = self._get_session(e_context)
                     local_message_id = str(uuid.uuid1())
                     local_conversation_id = f"local_{int(time.time()*1000)}"
                     
@@ -870,27 +1167,24 @@ class DoubaoPlugin(Plugin):
                         "completion_option": {
                             "is_regen": False,
                             "with_suggest": False,
-                            "need_create_conversation": not bool(self.conversation_id),
+                            "need_create_conversation": not bool(session.conversation_id),
                             "launch_stage": 1,
                             "is_replace": False,
                             "is_delete": False,
                             "message_from": 0,
                             "event_id": "0"
                         },
-                        "conversation_id": self.conversation_id if self.conversation_id else "0",
-                        "section_id": self.section_id,
+                        "conversation_id": session.conversation_id if session.conversation_id else "0",
+                        "section_id": session.section_id,
                         "local_message_id": local_message_id,
                         "local_conversation_id": local_conversation_id
                     }
 
-                    # 生成图片
-                    result = self.api_client.send_request(data, "/samantha/chat/completion")
+                    # 生成图片，图片一出现就开始下载，无需等待全部生成完毕
+                    result = self.api_client.send_request(data, "/samantha/chat/completion", on_event=self._prefetch_stream_image)
                     if result and "urls" in result:
-                        # 更新会话ID
-                        if not self.conversation_id:
-                            self.conversation_id = result.get("conversation_id")
-                            self.section_id = result.get("section_id")
-                            self.reply_id = result.get("reply_id")
+                        # 更新会话信息
+                        self.session_manager.update(session, result.get("conversation_id"), result.get("section_id"), result.get("reply_id"))
 
                         # 提取支持的风格列表
                         if "meta" in result and "option_list" in result["meta"]:
@@ -901,14 +1195,14 @@ class DoubaoPlugin(Plugin):
                                     break
 
                         # 存储图片信息
-                        img_id = str(int(time.time()))
+                        img_id = self.id_generator.next_id()
                         operation_params = {
                             "prompt": prompt,
                             "style": style,
                             "ratio": ratio,
-                            "conversation_id": self.conversation_id,
-                            "section_id": self.section_id,
-                            "reply_id": self.reply_id,
+                            "conversation_id": session.conversation_id,
+                            "section_id": session.section_id,
+                            "reply_id": result.get("reply_id"),
                             "data": result.get("data", []),  # 保存完整的图片数据
                             "image_token": result["urls"][0].split("/")[-1].split("~")[0],  # 保存第一张图片的token
                             "image_url": result["urls"][0]  # 保存第一张图片的url
@@ -920,7 +1214,8 @@ class DoubaoPlugin(Plugin):
                             "type": "generate",
                             "operation_params": operation_params,
                             "parent_id": None,
-                            "create_time": int(time.time())
+                            "create_time": int(time.time()),
+                            "user_id": msg.from_user_id
                         }
                         
                         # 保存到数据库
@@ -953,31 +1248,33 @@ class DoubaoPlugin(Plugin):
                     logger.error(f"[Doubao] Error generating image: {e}")
                     e_context["reply"] = Reply(ReplyType.ERROR, "图片生成失败")
                     
-                finally:
-                    self.image_processor.cleanup_temp_files()
-                    
                 e_context.action = EventAction.BREAK_PASS
 
+    def _prefetch_stream_image(self, event):
+        """生成流中解析到图片时提前下载，用于后续拼图"""
+        if event.type == StreamEvent.IMAGE:
+            self.image_downloader.prefetch(event.url)
+
     def _get_image_data(self, msg, content):
         """获取图片数据
         Args:
             msg: 消息对象
             content: 图片内容或路径
         Returns:
-            str: base64编码的图片数据
+            bytes: 原始图片数据，直接传给上传和蒙版处理，不做base64转换
         """
         try:
             # 1. 优先使用消息中的图片数据
             if hasattr(msg, 'image_data') and msg.image_data:
                 logger.info("[Doubao] 使用消息中的图片数据")
-                return base64.b64encode(msg.image_data).decode('utf-8')
+                return bytes(msg.image_data) if not isinstance(msg.image_data, bytes) else msg.image_data
 
             # 2. 如果content是具体文件路径,直接读取
             if isinstance(content, str) and os.path.isfile(content):
                 logger.info("[Doubao] 正在读取指定图片文件")
                 try:
                     with open(content, 'rb') as f:
-                        return base64.b64encode(f.read()).decode('utf-8')
+                        return f.read()
                 except Exception as e:
                     logger.error(f"[Doubao] 读取指定图片文件失败: {e}")
 
@@ -992,7 +1289,7 @@ class DoubaoPlugin(Plugin):
                     if hasattr(msg, 'content') and os.path.isfile(msg.content):
                         logger.info(f"[Doubao] 图片已下载到: {msg.content}")
                         with open(msg.content, 'rb') as f:
-                            return base64.b64encode(f.read()).decode('utf-8')
+                            return f.read()
                 except Exception as e:
                     logger.error(f"[Doubao] 下载图片文件失败: {e}")
 
@@ -1000,22 +1297,16 @@ class DoubaoPlugin(Plugin):
             if isinstance(content, str) and (content.startswith('http://') or content.startswith('https://')):
                 try:
                     logger.info("[Doubao] 正在从URL下载图片")
-                    session = requests.Session()
-                    retry = Retry(total=3, backoff_factor=0.5)
-                    adapter = HTTPAdapter(max_retries=retry)
-                    session.mount('http://', adapter)
-                    session.mount('https://', adapter)
-                    
-                    response = session.get(content, timeout=30)
+                    response = self.http_pool.get(content, timeout=30)
                     if response.status_code == 200:
-                        return base64.b64encode(response.content).decode('utf-8')
+                        return response.content
                 except Exception as e:
                     logger.error(f"[Doubao] 从URL下载图片失败: {e}")
 
             # 5. 如果content是二进制数据
-            if isinstance(content, bytes):
+            if isinstance(content, (bytes, bytearray, memoryview)):
                 logger.info("[Doubao] 使用二进制图片数据")
-                return base64.b64encode(content).decode('utf-8')
+                return bytes(content)
 
             # 如果所有方法都失败了,记录错误
             logger.error("[Doubao] 未找到可用的图片数据")
@@ -1028,8 +1319,10 @@ class DoubaoPlugin(Plugin):
     def _process_image(self, image_data, msg, e_context):
         """处理参考图片的上传和编辑"""
         try:
+            session = self._get_session(e_context)
+            
             # 获取完整参数
-            params = self.reference_prompts.get(msg.from_user_id)
+            params = self.pending.get("reference", msg.from_user_id)
             if not params:
                 logger.error("[Doubao] 未找到编辑参数")
                 e_context["reply"] = Reply(ReplyType.ERROR, "未找到编辑参数，请重新发送参考图命令")
@@ -1042,16 +1335,8 @@ class DoubaoPlugin(Plugin):
             # 发送等待消息
             e_context["channel"].send(Reply(ReplyType.INFO, "正在处理图片..."), e_context["context"])
 
-            # 将 base64 字符串转换为字节
-            try:
-                image_bytes = base64.b64decode(image_data)
-            except Exception as e:
-                logger.error(f"[Doubao] Base64解码失败: {e}")
-                e_context["reply"] = Reply(ReplyType.ERROR, "图片数据处理失败，请重试")
-                return
-
             # 上传图片到豆包服务器
-            result = self.image_uploader.upload_and_process_image(image_bytes)
+            result = self.image_uploader.upload_and_process_image(image_data)
             
             if not result or not result.get('success'):
                 error_msg = result.get('error') if result else "未知错误"
@@ -1102,15 +1387,15 @@ class DoubaoPlugin(Plugin):
                 "completion_option": {
                     "is_regen": False,
                     "with_suggest": False,
-                    "need_create_conversation": not bool(self.conversation_id),
+                    "need_create_conversation": not bool(session.conversation_id),
                     "launch_stage": 1,
                     "is_replace": False,
                     "is_delete": False,
                     "message_from": 0,
                     "event_id": "0"
                 },
-                "section_id": self.section_id,
-                "conversation_id": self.conversation_id,
+                "section_id": session.section_id,
+                "conversation_id": session.conversation_id,
                 "local_message_id": local_message_id
             }
 
@@ -1119,17 +1404,14 @@ class DoubaoPlugin(Plugin):
             
             if result and "urls" in result and len(result["urls"]) > 0:
                 # 更新会话信息
-                if result.get("conversation_id"):
-                    self.conversation_id = result["conversation_id"]
-                if result.get("section_id"):
-                    self.section_id = result["section_id"]
+                self.session_manager.update(session, result.get("conversation_id"), result.get("section_id"), result.get("reply_id"))
                 
                 # 存储编辑后的图片
-                img_id = str(int(time.time()))
+                img_id = self.id_generator.next_id()
                 operation_params = {
                     "prompt": prompt,
-                    "conversation_id": self.conversation_id,
-                    "section_id": self.section_id,
+                    "conversation_id": session.conversation_id,
+                    "section_id": session.section_id,
                     "reply_id": result.get("reply_id"),
                     "original_key": image_key,
                     "image_token": result["urls"][0].split("/")[-1].split("~")[0],
@@ -1148,7 +1430,8 @@ class DoubaoPlugin(Plugin):
                     "type": "edit",
                     "operation_params": operation_params,
                     "parent_id": None,
-                    "create_time": int(time.time())
+                    "create_time": int(time.time()),
+                    "user_id": msg.from_user_id
                 }
                 
                 # 保存到数据库
@@ -1167,32 +1450,23 @@ class DoubaoPlugin(Plugin):
             e_context["reply"] = Reply(ReplyType.ERROR, "处理参考图失败，请重试")
         finally:
             # 清除等待状态
-            if msg.from_user_id in self.waiting_for_reference:
-                del self.waiting_for_reference[msg.from_user_id]
-            if msg.from_user_id in self.reference_prompts:
-                del self.reference_prompts[msg.from_user_id]
+            self.pending.pop("reference", msg.from_user_id)
 
     def _process_koutu(self, image_data, msg, e_context):
         """处理抠图功能
         Args:
-            image_data: base64编码的图片数据
+            image_data: 图片字节数据
             msg: 消息对象
             e_context: 事件上下文
         """
         try:
+            session = self._get_session(e_context)
+            
             # 发送等待消息
             e_context["channel"].send(Reply(ReplyType.INFO, "正在处理图片..."), e_context["context"])
 
-            # 将 base64 字符串转换为字节
-            try:
-                image_bytes = base64.b64decode(image_data)
-            except Exception as e:
-                logger.error(f"[Doubao] Base64解码失败: {e}")
-                e_context["reply"] = Reply(ReplyType.ERROR, "图片数据处理失败，请重试")
-                return
-
             # 上传图片到豆包服务器
-            result = self.image_uploader.upload_and_process_image(image_bytes)
+            result = self.image_uploader.upload_and_process_image(image_data)
             
             if not result or not result.get('success'):
                 error_msg = result.get('error') if result else "未知错误"
@@ -1218,11 +1492,11 @@ class DoubaoPlugin(Plugin):
                 return
 
             # 存储抠图结果
-            img_id = str(int(time.time()))
+            img_id = self.id_generator.next_id()
             operation_params = {
                 "image_key": image_key,
-                "conversation_id": self.conversation_id,
-                "section_id": self.section_id,
+                "conversation_id": session.conversation_id,
+                "section_id": session.section_id,
                 "image_token": image_key.split("/")[-1].split(".")[0],
                 "image_url": main_url,  # 使用原始图片URL
                 "original_url": main_url,
@@ -1236,7 +1510,8 @@ class DoubaoPlugin(Plugin):
                 "type": "koutu",
                 "operation_params": operation_params,
                 "parent_id": None,
-                "create_time": int(time.time())
+                "create_time": int(time.time()),
+                "user_id": msg.from_user_id
             }
 
             # 保存到数据库
@@ -1262,12 +1537,13 @@ class DoubaoPlugin(Plugin):
             e_context["reply"] = Reply(ReplyType.ERROR, "处理抠图失败，请重试")
             return
 
-    def regenerate_image(self, image_data: dict, conversation_id: str, section_id: str):
+    def regenerate_image(self, image_data: dict, conversation_id: str, section_id: str, user_id: str = None):
         """重新生成图片
         Args:
             image_data: 图片数据
             conversation_id: 会话ID
             section_id: 会话分段ID
+            user_id: 发起请求的用户ID
         Returns:
             tuple: (success, new_img_id, urls, is_multi_images)
         """
@@ -1332,11 +1608,11 @@ class DoubaoPlugin(Plugin):
                 "reply_id": reply_id
             }
             
-            # 发送重新生成请求
-            result = self.api_client.send_request(data, "/samantha/chat/completion")
+            # 发送重新生成请求，图片一出现就开始下载
+            result = self.api_client.send_request(data, "/samantha/chat/completion", on_event=self._prefetch_stream_image)
             if result and "urls" in result:
                 # 存储图片信息
-                new_img_id = str(int(time.time()))
+                new_img_id = self.id_generator.next_id()
                 new_operation_params = operation_params.copy()
                 new_operation_params.update({
                     "conversation_id": conversation_id,
@@ -1357,7 +1633,8 @@ class DoubaoPlugin(Plugin):
                     "type": operation_type,
                     "operation_params": new_operation_params,
                     "parent_id": image_data.get("id"),
-                    "create_time": int(time.time())
+                    "create_time": int(time.time()),
+                    "user_id": user_id
                 }
                 
                 # 保存到数据库
@@ -1387,14 +1664,6 @@ class DoubaoPlugin(Plugin):
             parent_id: 父图片ID
         """
         try:
-            # 更新会话信息
-            if operation_params.get("conversation_id"):
-                self.conversation_id = operation_params["conversation_id"]
-            if operation_params.get("section_id"):
-                self.section_id = operation_params["section_id"]
-            if operation_params.get("reply_id"):
-                self.reply_id = operation_params["reply_id"]
-            
             # 获取第一张图片的token和url
             if urls and len(urls) > 0:
                 first_url = urls[0]
@@ -1404,10 +1673,7 @@ class DoubaoPlugin(Plugin):
                 # 更新操作参数
                 operation_params.update({
                     "image_token": image_token,
-                    "image_url": first_url,
-                    "conversation_id": self.conversation_id,
-                    "section_id": self.section_id,
-                    "reply_id": self.reply_id
+                    "image_url": first_url
                 })
                 
                 # 从响应中提取图片尺寸信息
@@ -1486,23 +1752,6 @@ class DoubaoPlugin(Plugin):
             logger.error(f"[Doubao] Error storing image info: {e}")
             raise e
 
-    def _init_conversation_from_storage(self):
-        '''从数据库初始化会话信息'''
-        try:
-            # 从数据库获取最新的一条记录
-            latest_image = self.image_storage.get_latest_image()
-            if latest_image:
-                params = latest_image.get("operation_params", {})
-                self.conversation_id = params.get("conversation_id")
-                self.section_id = params.get("section_id")
-                self.reply_id = params.get("reply_id")
-                logger.info(f"[Doubao] 已从历史记录恢复会话信息: conversation_id={self.conversation_id}")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"[Doubao] 从数据库恢复会话信息失败: {e}")
-            return False
-
     def _get_help_text(self, img_id, is_multi=False):
         """获取帮助文本
         Args:
@@ -1531,23 +1780,21 @@ class DoubaoPlugin(Plugin):
         help_text += f"重新生成: $r {img_id}"
         return help_text
 
-    def _process_inpaint(self, original_image_data, mask_image_data, prompt, msg, e_context):
+    def _process_inpaint(self, original_image_bytes, mask_image_bytes, prompt, msg, e_context):
         """处理区域重绘
         Args:
-            original_image_data: base64编码的原图数据
-            mask_image_data: base64编码的标记图片数据
+            original_image_bytes: 原图字节数据
+            mask_image_bytes: 标记图片字节数据
             prompt: 重绘描述词
             msg: 消息对象
             e_context: 事件上下文
         """
         try:
+            session = self._get_session(e_context)
+            
             # 发送等待消息
             e_context["channel"].send(Reply(ReplyType.INFO, "正在处理图片..."), e_context["context"])
             
-            # 将base64数据转换为字节
-            original_image_bytes = base64.b64decode(original_image_data)
-            mask_image_bytes = base64.b64decode(mask_image_data)
-            
             # 上传原图到服务器
             result = self.image_uploader.upload_and_process_image(original_image_bytes)
             if not result or not result.get('success'):
@@ -1565,7 +1812,7 @@ class DoubaoPlugin(Plugin):
                 return
             
             # 获取用户的重绘参数
-            inpaint_params = self.inpaint_prompts.get(msg.from_user_id, {})
+            inpaint_params = self.pending.get("inpaint", msg.from_user_id) or {}
             mode = inpaint_params.get("mode", "circle")  # 默认使用圈选模式
             is_invert = inpaint_params.get("is_invert", False)  # 获取是否反选
             
@@ -1608,15 +1855,15 @@ class DoubaoPlugin(Plugin):
                 "completion_option": {
                     "is_regen": False,
                     "with_suggest": False,
-                    "need_create_conversation": not bool(self.conversation_id),
+                    "need_create_conversation": not bool(session.conversation_id),
                     "launch_stage": 1,
                     "is_replace": False,
                     "is_delete": False,
                     "message_from": 0,
                     "event_id": "0"
                 },
-                "conversation_id": self.conversation_id if self.conversation_id else "0",
-                "section_id": self.section_id,
+                "conversation_id": session.conversation_id if session.conversation_id else "0",
+                "section_id": session.section_id,
                 "local_message_id": local_message_id
             }
             
@@ -1625,17 +1872,14 @@ class DoubaoPlugin(Plugin):
             if result and "urls" in result:
                 try:
                     # 更新会话信息
-                    if result.get("conversation_id"):
-                        self.conversation_id = result["conversation_id"]
-                    if result.get("section_id"):
-                        self.section_id = result["section_id"]
+                    self.session_manager.update(session, result.get("conversation_id"), result.get("section_id"), result.get("reply_id"))
                     
                     # 存储重绘后的图片
-                    img_id = str(int(time.time()))
+                    img_id = self.id_generator.next_id()
                     operation_params = {
                         "prompt": prompt,
-                        "conversation_id": self.conversation_id,
-                        "section_id": self.section_id,
+                        "conversation_id": session.conversation_id,
+                        "section_id": session.section_id,
                         "reply_id": result.get("reply_id"),
                         "image_token": result["urls"][0].split("/")[-1].split("~")[0],
                         "image_url": result["urls"][0],
@@ -1652,7 +1896,8 @@ class DoubaoPlugin(Plugin):
                         "type": "inpaint",
                         "operation_params": operation_params,
                         "parent_id": None,
-                        "create_time": int(time.time())
+                        "create_time": int(time.time()),
+                        "user_id": msg.from_user_id
                     }
                     
                     # 保存到数据库
@@ -1,12 +1,14 @@
 import json
-import requests
 from common.log import logger
 import uuid
 import time
+from .http_session import HttpSessionPool
+from .sse_parser import CompletionStreamParser
 
 class ApiClient:
-    def __init__(self, token_manager):
+    def __init__(self, token_manager, http_pool=None):
         self.token_manager = token_manager
+        self.http_pool = http_pool or HttpSessionPool(token_manager.config)
         self.base_url = "https://www.doubao.com"
 
     def _get_headers(self):
@@ -53,83 +55,72 @@ class ApiClient:
             "a_bogus": auth.get("a_bogus", "")
         }
 
-    def send_request(self, data, endpoint="/samantha/chat/completion"):
-        """发送请求"""
+    def _prepare_request(self, data, endpoint):
+        """预处理请求数据，返回请求URL"""
+        # 如果是图像生成请求，需要特殊处理
+        if endpoint == "/samantha/chat/completion" and "messages" in data:
+            # 确保content是正确的JSON字符串格式
+            if isinstance(data["messages"][0]["content"], dict):
+                data["messages"][0]["content"] = json.dumps(data["messages"][0]["content"])
+        return self.base_url + endpoint
+
+    def _dispatch_event(self, event, on_event):
+        """调用事件回调，回调异常不影响流的解析"""
+        if not on_event:
+            return
         try:
-            url = self.base_url + endpoint
-            headers = self._get_headers()
-            
-            # 如果是图像生成请求，需要特殊处理
-            if endpoint == "/samantha/chat/completion" and "messages" in data:
-                # 确保content是正确的JSON字符串格式
-                if isinstance(data["messages"][0]["content"], dict):
-                    data["messages"][0]["content"] = json.dumps(data["messages"][0]["content"])
-            
-            response = requests.post(
+            on_event(event)
+        except Exception as e:
+            logger.error(f"[Doubao] Error in stream event callback: {e}")
+
+    def iter_completion(self, data, parser=None):
+        """发送生成请求并按到达顺序产出StreamEvent
+        Args:
+            data: 请求数据
+            parser: 流解析器，流结束后可通过parser.result获取汇总结果，不传时新建
+        Returns:
+            generator: 产出StreamEvent，请求失败时抛出异常，生成器结束或关闭时释放连接
+        """
+        parser = parser or CompletionStreamParser()
+        url = self._prepare_request(data, "/samantha/chat/completion")
+        response = self.http_pool.post(
+            url,
+            json=data,
+            headers=self._get_headers(),
+            params=self._get_params(),
+            stream=True,
+            timeout=60
+        )
+        # 解析出错或调用方提前关闭生成器时也要关闭响应，流式连接才能归还连接池
+        with response:
+            response.raise_for_status()
+            yield from parser.parse(response.iter_lines())
+
+    def send_request(self, data, endpoint="/samantha/chat/completion", on_event=None):
+        """发送请求
+        Args:
+            data: 请求数据
+            endpoint: 接口路径
+            on_event: 流式响应的事件回调，每解析出一个StreamEvent立即调用
+        """
+        try:
+            # 流式响应
+            if endpoint == "/samantha/chat/completion":
+                parser = CompletionStreamParser()
+                for event in self.iter_completion(data, parser):
+                    self._dispatch_event(event, on_event)
+                return parser.result
+
+            url = self._prepare_request(data, endpoint)
+            response = self.http_pool.post(
                 url,
                 json=data,
-                headers=headers,
+                headers=self._get_headers(),
                 params=self._get_params(),
-                stream=endpoint == "/samantha/chat/completion",
                 timeout=60
             )
-            
-            response.raise_for_status()
-            
-            # 如果是流式响应
-            if endpoint == "/samantha/chat/completion":
-                image_urls = []
-                conversation_id = None
-                section_id = None
-                reply_id = None
-                
-                for line in response.iter_lines():
-                    if not line:
-                        continue
-                        
-                    line = line.decode('utf-8')
-                    if not line.startswith("data:"):
-                        continue
-                        
-                    try:
-                        data = json.loads(line[5:])
-                        event_data = json.loads(data.get("event_data", "{}"))
-                        logger.debug(f"[Doubao] Response event_data: {event_data}")
-                        
-                        if "conversation_id" in event_data:
-                            conversation_id = event_data["conversation_id"]
-                            section_id = event_data.get("section_id")
-                            logger.info(f"[Doubao] Found conversation info: id={conversation_id}, section={section_id}")
-                            # 从event_data中提取reply_id
-                            if "reply_id" in event_data:
-                                reply_id = event_data["reply_id"]
-                                logger.info(f"[Doubao] Found reply_id: {reply_id}")
-                        
-                        if "message" in event_data:
-                            message = event_data["message"]
-                            logger.debug(f"[Doubao] Message data: {message}")
-                            if message.get("content_type") == 2010:  # 图片响应
-                                content = json.loads(message["content"])
-                                if "data" in content:
-                                    for img_data in content["data"]:
-                                        if "image_raw" in img_data:
-                                            url = img_data["image_raw"]["url"]
-                                            image_urls.append(url)
-                                            logger.info(f"[Doubao] Found image URL: {url}")
-                                            
-                    except json.JSONDecodeError:
-                        continue
-                    except Exception as e:
-                        logger.error(f"[Doubao] Error processing response: {e}")
-                        continue
-                
-                return {
-                    "urls": image_urls,
-                    "conversation_id": conversation_id,
-                    "section_id": section_id,
-                    "reply_id": reply_id
-                }
-            else:
+            with response:
+                response.raise_for_status()
                 # 非流式响应直接返回JSON
                 return response.json()
             
@@ -137,42 +128,108 @@ class ApiClient:
             logger.error(f"[Doubao] Error sending request: {e}")
             return None
 
+    def _build_edit_data(self, image_url: str, edit_prompt: str, conversation_id: str, section_id: str, reply_id: str):
+        """构建编辑图片请求"""
+        # 从图片URL中提取token
+        image_token = image_url.split("/")[-1].split("~")[0]
+        
+        return {
+            "messages": [{
+                "content": json.dumps({
+                    "text": edit_prompt,
+                    "edit_image": {
+                        "edit_image_url": image_url,
+                        "edit_image_token": image_token,
+                        "description": "",  # 描述可以为空
+                        "outline_id": None
+                    }
+                }),
+                "content_type": 2009,
+                "attachments": []
+            }],
+            "completion_option": {
+                "is_regen": False,
+                "with_suggest": False,
+                "need_create_conversation": False,
+                "launch_stage": 1,
+                "is_replace": False,
+                "is_delete": False,
+                "message_from": 0,
+                "event_id": "0"
+            },
+            "section_id": section_id,
+            "conversation_id": conversation_id,
+            "local_message_id": str(uuid.uuid1()),
+            "reply_id": reply_id
+        }
+
+    def _build_outpaint_data(self, image_url, ratio, conversation_id=None, section_id=None, reply_id=None):
+        """构建扩展图片请求，不支持的比例返回None"""
+        # 计算扩展比例
+        expand_ratio = 0.3888889  # 7/18，用于将1:1扩展到16:9
+        max_expand = 0.5  # 最大扩展比例
+        
+        # 根据不同比例设置扩展参数
+        if ratio == "16:9":
+            left = right = expand_ratio
+            top = bottom = 0
+        elif ratio == "9:16":
+            left = right = 0
+            top = bottom = expand_ratio
+        elif ratio == "4:3":
+            left = right = 0.166667  # 1/6
+            top = bottom = 0
+        elif ratio == "1:1":
+            left = right = top = bottom = 0
+        elif ratio == "max":
+            left = right = top = bottom = max_expand
+        else:
+            return None
+        
+        data = {
+            "messages": [{
+                "content": json.dumps({
+                    "text": "按新尺寸生成图片",
+                    "edit_image": {
+                        "edit_image_url": image_url,
+                        "edit_image_token": image_url.split("/")[-1].split("~")[0],
+                        "description": "扩展图片",
+                        "ability": "outpainting",
+                        "top": top,
+                        "bottom": bottom,
+                        "left": left,
+                        "right": right,
+                        "is_edit_local_image": False,
+                        "is_edit_local_image_v2": "false"
+                    }
+                }),
+                "content_type": 2009,
+                "attachments": []
+            }],
+            "completion_option": {
+                "is_regen": False,
+                "with_suggest": False,
+                "need_create_conversation": not bool(conversation_id),
+                "launch_stage": 1,
+                "is_replace": False,
+                "is_delete": False,
+                "message_from": 0,
+                "event_id": "0"
+            }
+        }
+        
+        if conversation_id:
+            data["conversation_id"] = conversation_id
+            data["section_id"] = section_id
+            data["local_message_id"] = str(uuid.uuid1())
+            if reply_id:
+                data["reply_id"] = reply_id
+        return data
+
     def edit_image(self, image_url: str, edit_prompt: str, conversation_id: str, section_id: str, reply_id: str):
         """编辑图片"""
         try:
-            # 从图片URL中提取token
-            image_token = image_url.split("/")[-1].split("~")[0]
-            
-            # 构建编辑请求
-            data = {
-                "messages": [{
-                    "content": json.dumps({
-                        "text": edit_prompt,
-                        "edit_image": {
-                            "edit_image_url": image_url,
-                            "edit_image_token": image_token,
-                            "description": "",  # 描述可以为空
-                            "outline_id": None
-                        }
-                    }),
-                    "content_type": 2009,
-                    "attachments": []
-                }],
-                "completion_option": {
-                    "is_regen": False,
-                    "with_suggest": False,
-                    "need_create_conversation": False,
-                    "launch_stage": 1,
-                    "is_replace": False,
-                    "is_delete": False,
-                    "message_from": 0,
-                    "event_id": "0"
-                },
-                "section_id": section_id,
-                "conversation_id": conversation_id,
-                "local_message_id": str(uuid.uuid1()),
-                "reply_id": reply_id
-            }
+            data = self._build_edit_data(image_url, edit_prompt, conversation_id, section_id, reply_id)
             
             result = self.send_request(data)
             if result and "urls" in result:
@@ -186,69 +243,13 @@ class ApiClient:
     def outpaint_image(self, image_url, ratio, conversation_id=None, section_id=None, reply_id=None):
         """扩展图片"""
         try:
-            # 计算扩展比例
-            expand_ratio = 0.3888889  # 7/18，用于将1:1扩展到16:9
-            max_expand = 0.5  # 最大扩展比例
-            
-            # 根据不同比例设置扩展参数
-            if ratio == "16:9":
-                left = right = expand_ratio
-                top = bottom = 0
-            elif ratio == "9:16":
-                left = right = 0
-                top = bottom = expand_ratio
-            elif ratio == "4:3":
-                left = right = 0.166667  # 1/6
-                top = bottom = 0
-            elif ratio == "1:1":
-                left = right = top = bottom = 0
-            elif ratio == "max":
-                left = right = top = bottom = max_expand
-            else:
+            data = self._build_outpaint_data(image_url, ratio, conversation_id, section_id, reply_id)
+            if data is None:
                 return None
             
-            data = {
-                "messages": [{
-                    "content": json.dumps({
-                        "text": "按新尺寸生成图片",
-                        "edit_image": {
-                            "edit_image_url": image_url,
-                            "edit_image_token": image_url.split("/")[-1].split("~")[0],
-                            "description": "扩展图片",
-                            "ability": "outpainting",
-                            "top": top,
-                            "bottom": bottom,
-                            "left": left,
-                            "right": right,
-                            "is_edit_local_image": False,
-                            "is_edit_local_image_v2": "false"
-                        }
-                    }),
-                    "content_type": 2009,
-                    "attachments": []
-                }],
-                "completion_option": {
-                    "is_regen": False,
-                    "with_suggest": False,
-                    "need_create_conversation": not bool(conversation_id),
-                    "launch_stage": 1,
-                    "is_replace": False,
-                    "is_delete": False,
-                    "message_from": 0,
-                    "event_id": "0"
-                }
-            }
-            
-            if conversation_id:
-                data["conversation_id"] = conversation_id
-                data["section_id"] = section_id
-                data["local_message_id"] = str(uuid.uuid1())
-                if reply_id:
-                    data["reply_id"] = reply_id
-            
             result = self.send_request(data)
             return result["urls"] if result else None
             
         except Exception as e:
             logger.error(f"[Doubao] Error outpainting image: {e}")
-            return None
\ No newline at end of file
+            return None
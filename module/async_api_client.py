@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from common.log import logger
+from .api_client import ApiClient
+from .sse_parser import CompletionStreamParser
+
+class AsyncApiClient(ApiClient):
+    """基于asyncio的API客户端
+
+    请求构建和SSE解析逻辑与ApiClient共用，网络层使用aiohttp，
+    流式响应按行边读边解析，单个事件循环即可同时承载大量生成请求。
+    """
+
+    def __init__(self, token_manager, max_connections=200, limit_per_host=100, timeout=60):
+        # 不调用父类初始化，异步客户端不需要requests连接池
+        self.token_manager = token_manager
+        self.base_url = "https://www.doubao.com"
+        self.max_connections = max_connections
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self._session = None
+
+    async def _get_session(self):
+        """获取aiohttp会话，首次使用时创建"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=30
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def send_request(self, data, endpoint="/samantha/chat/completion", on_event=None):
+        """发送请求
+        Args:
+            data: 请求数据
+            endpoint: 接口路径
+            on_event: 流式响应的事件回调，在事件循环线程中调用
+        """
+        try:
+            url = self._prepare_request(data, endpoint)
+            session = await self._get_session()
+
+            async with session.post(
+                url,
+                json=data,
+                headers=self._get_headers(),
+                params=self._get_params()
+            ) as response:
+                response.raise_for_status()
+
+                # 非流式响应直接返回JSON
+                if endpoint != "/samantha/chat/completion":
+                    return await response.json(content_type=None)
+
+                # 流式响应按行解析，不等待整个响应体
+                parser = CompletionStreamParser()
+                buffer = b""
+                async for chunk in response.content.iter_any():
+                    buffer += chunk
+                    while b"\n" in buffer:
+                        line, buffer = buffer.split(b"\n", 1)
+                        for event in parser.feed(line.rstrip(b"\r")):
+                            self._dispatch_event(event, on_event)
+                if buffer:
+                    for event in parser.feed(buffer.rstrip(b"\r")):
+                        self._dispatch_event(event, on_event)
+                return parser.result
+
+        except Exception as e:
+            logger.error(f"[Doubao] Error sending async request: {e}")
+            return None
+
+    async def edit_image(self, image_url: str, edit_prompt: str, conversation_id: str, section_id: str, reply_id: str):
+        """编辑图片"""
+        try:
+            data = self._build_edit_data(image_url, edit_prompt, conversation_id, section_id, reply_id)
+
+            result = await self.send_request(data)
+            if result and "urls" in result:
+                return result["urls"]
+            logger.debug(f"[Doubao] Edit image result: {result}")
+            return None
+        except Exception as e:
+            logger.error(f"[Doubao] Error in async edit_image: {e}")
+            return None
+
+    async def outpaint_image(self, image_url, ratio, conversation_id=None, section_id=None, reply_id=None):
+        """扩展图片"""
+        try:
+            data = self._build_outpaint_data(image_url, ratio, conversation_id, section_id, reply_id)
+            if data is None:
+                return None
+
+            result = await self.send_request(data)
+            return result["urls"] if result else None
+
+        except Exception as e:
+            logger.error(f"[Doubao] Error outpainting image async: {e}")
+            return None
+
+    async def close(self):
+        """关闭aiohttp会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class BlockingApiClient:
+    """AsyncApiClient的同步包装
+
+    在后台线程运行一个事件循环，同步调用方(如on_handle_context)通过
+    与ApiClient相同的接口提交请求并等待结果，所有请求共享同一个事件循环。
+    """
+
+    def __init__(self, token_manager, **kwargs):
+        self.token_manager = token_manager
+        self.async_client = AsyncApiClient(token_manager, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="doubao-api-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coro):
+        """提交协程到后台事件循环
+        Returns:
+            concurrent.futures.Future: 协程执行结果
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def send_request(self, data, endpoint="/samantha/chat/completion", on_event=None):
+        return self.submit(self.async_client.send_request(data, endpoint, on_event)).result()
+
+    def edit_image(self, image_url: str, edit_prompt: str, conversation_id: str, section_id: str, reply_id: str):
+        return self.submit(self.async_client.edit_image(image_url, edit_prompt, conversation_id, section_id, reply_id)).result()
+
+    def outpaint_image(self, image_url, ratio, conversation_id=None, section_id=None, reply_id=None):
+        return self.submit(self.async_client.outpaint_image(image_url, ratio, conversation_id, section_id, reply_id)).result()
+
+    def close(self, timeout=5):
+        """关闭会话，停止事件循环并等待后台线程退出后关闭事件循环
+        Args:
+            timeout: 关闭会话和等待线程退出的最长时间(秒)
+        """
+        if self._loop.is_closed():
+            return
+        try:
+            self.submit(self.async_client.close()).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"[Doubao] Failed to close async api client: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # 事件循环仍在运行时不能关闭，交由守护线程随进程退出
+            logger.warning("[Doubao] Async api loop did not stop in time, leaving it to exit with the process")
+            return
+
+        # 取消尚未完成的请求，避免关闭事件循环时报告任务被销毁
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
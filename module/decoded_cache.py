@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class DecodedImageCache:
+    """进程内已解码图片的LRU缓存
+
+    以图片内容哈希和解码方式为键，保存解码后的NumPy数组或PIL图片，
+    按内存预算淘汰最久未使用项。缓存对象为只读共享，调用方不得原地修改。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def content_key(data):
+        """计算图片内容哈希"""
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _sizeof(value):
+        """估算解码结果占用的内存"""
+        nbytes = getattr(value, "nbytes", None)
+        if nbytes is not None:
+            return nbytes
+        if hasattr(value, "size") and hasattr(value, "getbands"):
+            width, height = value.size
+            return width * height * len(value.getbands())
+        return 0
+
+    def get_or_decode(self, data, kind, decoder):
+        """获取解码结果，未命中时调用decoder解码并缓存
+        Args:
+            data: 图片字节数据
+            kind: 解码方式标识，如"cv_bgr"、"pil_rgb"
+            decoder: 解码函数，参数为图片字节数据
+        Returns:
+            解码结果
+        """
+        key = (self.content_key(data), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        value = decoder(data)
+        if value is None:
+            return None
+        if hasattr(value, "setflags"):
+            # 防止调用方意外原地修改共享数组
+            value.setflags(write=False)
+
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self._total_bytes += size
+                while self._total_bytes > self.max_bytes and self._entries:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._total_bytes -= evicted_size
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,148 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from common.log import logger
+
+class HttpSessionPool:
+    """共享的HTTP连接池
+
+    所有线程共用同一个HTTPAdapter(底层urllib3连接池是线程安全的)，
+    每个线程持有自己的Session对象，避免Session内部状态的并发问题，
+    同时复用到同一主机的keep-alive连接。已结束线程的Session在下次创建Session时清理。
+    """
+
+    def __init__(self, config=None):
+        http_config = (config or {}).get("http", {})
+        self.pool_connections = http_config.get("pool_connections", 10)  # 缓存的主机连接池数量
+        self.pool_maxsize = http_config.get("pool_maxsize", 20)  # 每个主机的最大连接数
+        self.pool_block = http_config.get("pool_block", False)  # 连接数达到上限时是否等待
+        self.timeout = http_config.get("timeout", 60)
+        self.keep_alive = http_config.get("keep_alive", True)
+
+        retry_config = http_config.get("retry", {})
+        self.retry = Retry(
+            total=retry_config.get("total", 3),
+            connect=retry_config.get("connect", 3),
+            read=retry_config.get("read", 2),
+            backoff_factor=retry_config.get("backoff_factor", 0.5),
+            status_forcelist=retry_config.get("status_forcelist", [429, 500, 502, 503, 504]),
+            allowed_methods=frozenset(["GET", "HEAD"]),  # POST请求只重试连接错误，避免重复生成
+            raise_on_status=False
+        )
+
+        self._adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.retry,
+            pool_block=self.pool_block
+        )
+        # 自行实现重试的调用方(如图片下载)使用不重试的适配器，避免两套重试叠加
+        self._no_retry_adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=Retry(total=0, connect=0, read=0, redirect=5, raise_on_status=False),
+            pool_block=self.pool_block
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = {}  # (线程, 是否重试) -> Session
+        self._request_count = 0
+        self._error_count = 0
+
+    def _get_session(self, retry=True):
+        """获取当前线程的Session"""
+        attr = "session" if retry else "session_no_retry"
+        session = getattr(self._local, attr, None)
+        if session is None:
+            adapter = self._adapter if retry else self._no_retry_adapter
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+            setattr(self._local, attr, session)
+            with self._lock:
+                # 短生命周期的工作线程结束后只丢弃引用，Session共用适配器，不能逐个close
+                for key in [k for k in self._sessions if not k[0].is_alive()]:
+                    del self._sessions[key]
+                self._sessions[(threading.current_thread(), retry)] = session
+        return session
+
+    def request(self, method, url, retry=True, **kwargs):
+        """发送请求，未指定timeout时使用默认超时
+        Args:
+            retry: 是否使用连接池的重试策略，调用方自行重试时传False
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self._request_count += 1
+        try:
+            return self._get_session(retry).request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self._error_count += 1
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self):
+        """获取连接池统计信息
+        Returns:
+            dict: 请求数、新建连接数、连接复用率及各主机的连接池状态
+        """
+        hosts = {}
+        total_connections = 0
+        total_pool_requests = 0
+        try:
+            for adapter in (self._adapter, self._no_retry_adapter):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                    stats = hosts.setdefault(host, {"connections": 0, "requests": 0, "idle": 0})
+                    stats["connections"] += pool.num_connections
+                    stats["requests"] += pool.num_requests
+                    # 队列中预先填充了None占位，只统计实际空闲的连接
+                    stats["idle"] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+                    total_connections += pool.num_connections
+                    total_pool_requests += pool.num_requests
+        except Exception as e:
+            logger.warning(f"[Doubao] Failed to collect http pool stats: {e}")
+
+        with self._lock:
+            request_count = self._request_count
+            error_count = self._error_count
+            session_count = len(self._sessions)
+
+        reuse_rate = 0.0
+        if total_pool_requests:
+            reuse_rate = max(0.0, 1 - total_connections / total_pool_requests)
+
+        return {
+            "requests": request_count,
+            "errors": error_count,
+            "sessions": session_count,
+            "connections": total_connections,
+            "reuse_rate": round(reuse_rate, 4),
+            "hosts": hosts
+        }
+
+    def close(self):
+        """关闭所有Session和连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+        self._adapter.close()
+        self._no_retry_adapter.close()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+_EPOCH = 1704067200  # 2024-01-01 00:00:00 UTC
+_TIME_BITS = 30  # 秒级时间戳，可用约34年
+_NODE_BITS = 22  # 节点号，默认取进程号(Linux pid_max上限为2^22)
+_SEQ_BITS = 10  # 每个节点每秒最多1024个ID
+_ID_LENGTH = 12  # 36^12 > 2^62，固定长度保证字符串顺序与时间顺序一致
+
+class IdGenerator:
+    """单调递增、按时间排序的图片ID生成器
+
+    ID由秒级时间、节点号和秒内序号组成，编码为固定12位的小写base36字符串。
+    同一进程内由锁保证唯一，不同进程使用不同节点号(默认进程号，
+    多台机器共享存储时应在配置中指定各自的node_id)。
+    """
+
+    def __init__(self, node_id=None):
+        if node_id is None:
+            node_id = os.getpid()
+        self.node_id = int(node_id) & ((1 << _NODE_BITS) - 1)
+        self._lock = threading.Lock()
+        self._last_ts = 0
+        self._seq = 0
+
+    def _encode(self, value):
+        chars = []
+        while value:
+            value, rem = divmod(value, 36)
+            chars.append(_ALPHABET[rem])
+        return "".join(reversed(chars)).rjust(_ID_LENGTH, "0")
+
+    def next_id(self):
+        """生成新的图片ID
+        Returns:
+            str: 12位base36字符串
+        """
+        with self._lock:
+            ts = max(int(time.time()) - _EPOCH, self._last_ts)  # 时钟回拨时沿用上次时间
+            if ts == self._last_ts:
+                self._seq += 1
+                if self._seq >= (1 << _SEQ_BITS):
+                    # 当前秒序号用尽，等待下一秒
+                    while int(time.time()) - _EPOCH <= self._last_ts:
+                        time.sleep(0.001)
+                    ts = int(time.time()) - _EPOCH
+                    self._seq = 0
+            else:
+                self._seq = 0
+            self._last_ts = ts
+            value = (ts << (_NODE_BITS + _SEQ_BITS)) | (self.node_id << _SEQ_BITS) | self._seq
+        return self._encode(value)
+
+_default_generator = None
+_default_lock = threading.Lock()
+
+def generate_image_id():
+    """使用进程级默认生成器生成图片ID"""
+    global _default_generator
+    with _default_lock:
+        if _default_generator is None or _default_generator.node_id != os.getpid() & ((1 << _NODE_BITS) - 1):
+            # 首次使用或fork后的子进程，按当前进程号重建
+            _default_generator = IdGenerator()
+        return _default_generator.next_id()
+
+def normalize_image_id(img_id):
+    """规范化用户输入的图片ID，兼容旧的纯数字ID
+    Args:
+        img_id: 用户输入的图片ID
+    Returns:
+        str: 去除空白并转为小写的ID
+    """
+    return str(img_id).strip().lower()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from common.log import logger
+
+def image_token_from_url(url):
+    """从豆包CDN图片URL中提取图片token"""
+    return url.split("/")[-1].split("~")[0]
+
+class ImageCache:
+    """以图片token为键的本地磁盘缓存
+
+    同一张结果图片的不同尺寸/格式URL共享同一token，因此重复访问直接命中本地文件。
+    按总大小做LRU淘汰，写入后超过保留时间的文件视为过期(与storage.retention_days一致，访问不会延长)，
+    写入使用临时文件加原子替换。文件修改时间即写入时间，重启后据此恢复过期时间。
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, ttl_seconds=7 * 86400):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (size, 写入时间)，按访问顺序排列
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _key(self, token):
+        return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".img")
+
+    def _load_index(self):
+        """从磁盘重建缓存索引"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                # 上次异常退出残留的临时文件
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".img"):
+                continue
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            except OSError:
+                continue
+        for mtime, key, size in sorted(entries):
+            self._entries[key] = (size, mtime)
+            self._total_bytes += size
+        self._evict()
+        logger.info(f"[Doubao] Image cache loaded: {len(self._entries)} files, {self._total_bytes} bytes")
+
+    def _remove(self, key):
+        """删除缓存项，调用方需持有锁"""
+        size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """淘汰过期项和超出容量的最久未使用项，调用方需持有锁"""
+        now = time.time()
+        for key in [k for k, (_, t) in self._entries.items() if now - t > self.ttl_seconds]:
+            self._remove(key)
+        while self._entries and self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def get(self, url):
+        """读取缓存
+        Args:
+            url: 图片URL
+        Returns:
+            bytes: 缓存的图片数据，未命中返回None
+        """
+        key = self._key(image_token_from_url(url))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+            # 只调整LRU顺序，过期时间仍从写入时算起
+            self._entries.move_to_end(key)
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+            self._bytes_saved += len(data)
+        return data
+
+    def put(self, url, data):
+        """写入缓存
+        Args:
+            url: 图片URL
+            data: 图片数据
+        """
+        if not data or len(data) > self.max_bytes:
+            return
+        key = self._key(image_token_from_url(url))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"[Doubao] Failed to write image cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except (OSError, UnboundLocalError):
+                pass
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[0]
+            self._entries[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._evict()
+
+    def get_stats(self):
+        """获取缓存统计信息
+        Returns:
+            dict: 命中率、节省的下载字节数及缓存占用
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self._bytes_saved
+            }
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from common.log import logger
+
+class DownloadResult:
+    """单张图片的下载结果"""
+
+    def __init__(self, url, content=None, error=None, elapsed=0.0, attempts=0):
+        self.url = url
+        self.content = content
+        self.error = error
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.content is not None
+
+class ImageDownloader:
+    """并发图片下载器
+
+    多张图片并行下载并按原顺序返回，单张失败不影响其他图片。
+    支持超时、大小限制、带退避的重试，并记录每个URL的耗时。
+    重试只由这里的retries/backoff_factor控制，请求时不使用连接池的重试策略。
+    """
+
+    def __init__(self, http_pool=None, max_workers=4, timeout=30, max_bytes=20 * 1024 * 1024,
+                 retries=2, backoff_factor=0.5, prefetch_ttl=300, cache=None):
+        self.http_pool = http_pool
+        self.cache = cache  # 可选的ImageCache本地磁盘缓存
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.prefetch_ttl = prefetch_ttl  # 未被使用的预取结果保留时间(秒)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="doubao-download")
+        self._lock = threading.Lock()
+        self._prefetched = {}  # url -> (提交时间, Future)
+        self._timings = deque(maxlen=200)  # 最近的下载记录
+        self._host_stats = {}
+
+    def _fetch(self, url):
+        """下载一次，超过大小限制时抛出异常"""
+        if self.http_pool:
+            response = self.http_pool.get(url, retry=False, timeout=self.timeout, stream=True)
+        else:
+            response = requests.get(url, timeout=self.timeout, stream=True)
+        try:
+            response.raise_for_status()
+            length = response.headers.get("content-length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise ValueError(f"image too large: {length} bytes")
+
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ValueError(f"image exceeds {self.max_bytes} bytes")
+                chunks.append(chunk)
+            return b"".join(chunks)
+        finally:
+            response.close()
+
+    def download(self, url):
+        """下载单张图片，失败时按退避策略重试
+        Returns:
+            DownloadResult: 下载结果
+        """
+        start = time.time()
+        if self.cache:
+            content = self.cache.get(url)
+            if content is not None:
+                return DownloadResult(url, content=content, elapsed=time.time() - start, attempts=0)
+
+        error = None
+        attempts = 0
+        for attempt in range(self.retries + 1):
+            attempts = attempt + 1
+            try:
+                content = self._fetch(url)
+                if self.cache:
+                    self.cache.put(url, content)
+                result = DownloadResult(url, content=content, elapsed=time.time() - start, attempts=attempts)
+                self._record(result)
+                return result
+            except ValueError as e:
+                # 超过大小限制，重试没有意义
+                error = e
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    delay = self.backoff_factor * (2 ** attempt)
+                    logger.warning(f"[Doubao] Download failed for {url} ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+        result = DownloadResult(url, error=error, elapsed=time.time() - start, attempts=attempts)
+        self._record(result)
+        logger.error(f"[Doubao] Error downloading image {url}: {error}")
+        return result
+
+    def prefetch(self, url):
+        """在后台提前下载图片，后续download_all会直接使用结果"""
+        now = time.time()
+        with self._lock:
+            expired = [u for u, (t, _) in self._prefetched.items() if now - t > self.prefetch_ttl]
+            for u in expired:
+                del self._prefetched[u]
+            if url not in self._prefetched:
+                self._prefetched[url] = (now, self._executor.submit(self.download, url))
+
+    def _submit(self, url):
+        """获取下载任务，优先复用预取任务"""
+        with self._lock:
+            entry = self._prefetched.pop(url, None)
+        if entry:
+            return entry[1]
+        return self._executor.submit(self.download, url)
+
+    def download_all(self, urls):
+        """并发下载多张图片
+        Args:
+            urls: 图片URL列表
+        Returns:
+            list: 与urls顺序一致的DownloadResult列表
+        """
+        futures = [self._submit(url) for url in urls]
+        results = []
+        for url, future in zip(urls, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(DownloadResult(url, error=e))
+        return results
+
+    def _record(self, result):
+        """记录下载耗时"""
+        host = urlparse(result.url).netloc
+        with self._lock:
+            self._timings.append({
+                "url": result.url,
+                "host": host,
+                "elapsed": round(result.elapsed, 3),
+                "attempts": result.attempts,
+                "bytes": len(result.content) if result.ok else 0,
+                "ok": result.ok
+            })
+            stats = self._host_stats.setdefault(host, {"count": 0, "failed": 0, "total_time": 0.0, "max_time": 0.0})
+            stats["count"] += 1
+            stats["total_time"] += result.elapsed
+            stats["max_time"] = max(stats["max_time"], result.elapsed)
+            if not result.ok:
+                stats["failed"] += 1
+        logger.debug(f"[Doubao] Downloaded {result.url} in {result.elapsed:.3f}s ({result.attempts} attempts)")
+
+    def close(self):
+        """停止下载线程池，丢弃未使用的预取任务"""
+        with self._lock:
+            futures = [future for _, future in self._prefetched.values()]
+            self._prefetched.clear()
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def get_timings(self):
+        """获取最近下载记录和按主机汇总的耗时
+        Returns:
+            dict: recent为最近的单URL记录，hosts为各CDN主机的平均/最大耗时
+        """
+        with self._lock:
+            hosts = {
+                host: {
+                    "count": s["count"],
+                    "failed": s["failed"],
+                    "avg_time": round(s["total_time"] / s["count"], 3) if s["count"] else 0.0,
+                    "max_time": round(s["max_time"], 3)
+                }
+                for host, s in self._host_stats.items()
+            }
+            return {"recent": list(self._timings), "hosts": hosts}
@@ -0,0 +1,123 @@
+import io
+import time
+from common.log import logger
+
+# 格式 -> (PIL格式名, 扩展名)
+_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp")
+}
+
+class ImageEncoder:
+    """发送给用户的图片编码器
+
+    支持JPEG和WebP，可设置目标大小，此时在min_quality和quality之间二分查找不超过目标大小的最高质量。
+    JPEG可开启渐进式编码、优化霍夫曼表并指定色度抽样。
+    """
+
+    def __init__(self, format="jpeg", quality=95, target_kb=0, min_quality=50,
+                 progressive=False, optimize=False, subsampling=None, method=4):
+        """
+        Args:
+            format: "jpeg"或"webp"
+            quality: 编码质量(1-100)，设置target_kb时为最高质量
+            target_kb: 目标大小(KB)，0表示不限制
+            min_quality: 目标大小模式下的最低质量，仍超过目标时使用该质量
+            progressive: JPEG是否使用渐进式编码
+            optimize: JPEG是否优化霍夫曼表
+            subsampling: JPEG色度抽样，如"4:4:4"、"4:2:2"、"4:2:0"，None表示使用默认值
+            method: WebP压缩方法(0-6)，越大体积越小、编码越慢
+        """
+        format = format.lower()
+        if format == "jpg":
+            format = "jpeg"
+        if format not in _FORMATS:
+            raise ValueError(f"unsupported image format: {format}")
+        self.format = format
+        self.quality = int(quality)
+        self.target_bytes = int(target_kb * 1024) if target_kb else 0
+        self.min_quality = min(int(min_quality), self.quality)
+        self.progressive = progressive
+        self.optimize = optimize
+        self.subsampling = subsampling
+        self.method = method
+
+    @property
+    def extension(self):
+        return _FORMATS[self.format][1]
+
+    def _save_options(self, quality):
+        options = {"format": _FORMATS[self.format][0], "quality": quality}
+        if self.format == "jpeg":
+            if self.progressive:
+                options["progressive"] = True
+            if self.optimize:
+                options["optimize"] = True
+            if self.subsampling is not None:
+                options["subsampling"] = self.subsampling
+        else:
+            options["method"] = self.method
+        return options
+
+    def _encode_at(self, image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, **self._save_options(quality))
+        return buffer.getvalue()
+
+    def encode(self, image):
+        """编码图片
+        Args:
+            image: RGB模式的PIL图片
+        Returns:
+            tuple: (编码后的字节数据, 统计信息dict，包含format、quality、bytes、encode_ms、attempts)
+        """
+        start = time.perf_counter()
+        data = self._encode_at(image, self.quality)
+        quality = self.quality
+        attempts = 1
+
+        if self.target_bytes and len(data) > self.target_bytes:
+            # 二分查找不超过目标大小的最高质量
+            low, high = self.min_quality, self.quality - 1
+            best = None
+            while low <= high:
+                mid = (low + high) // 2
+                candidate = self._encode_at(image, mid)
+                attempts += 1
+                fits = len(candidate) <= self.target_bytes
+                # 最低质量仍超过目标时使用最低质量的结果
+                if fits or mid == self.min_quality:
+                    best = (candidate, mid)
+                if fits:
+                    low = mid + 1
+                else:
+                    high = mid - 1
+            if best is not None:
+                data, quality = best
+
+        stats = {
+            "format": self.format,
+            "quality": quality,
+            "bytes": len(data),
+            "encode_ms": round((time.perf_counter() - start) * 1000, 1),
+            "attempts": attempts
+        }
+        return data, stats
+
+
+def create_image_encoder(encoder_config: dict, channel_type: str = None) -> ImageEncoder:
+    """按配置创建编码器，channels中与当前通道同名的配置覆盖默认配置
+    Args:
+        encoder_config: config.json中的encoder配置
+        channel_type: 当前通道类型，如"wx"、"wechatmp"
+    Returns:
+        ImageEncoder: 编码器实例
+    """
+    options = {k: v for k, v in encoder_config.items() if k != "channels"}
+    if channel_type:
+        options.update(encoder_config.get("channels", {}).get(channel_type, {}))
+    try:
+        return ImageEncoder(**options)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"[Doubao] Invalid encoder config {options}: {e}, using defaults")
+        return ImageEncoder()
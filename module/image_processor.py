@@ -1,32 +1,138 @@
 import os
 import time
-import requests
-import cv2
-import numpy as np
-from PIL import Image, ImageDraw, ImageFilter
 import io
 import base64
-from sklearn.cluster import KMeans
+import threading
+from collections import OrderedDict
+# cv2、numpy、PIL较重，在用到的方法内导入，插件加载和只使用文本功能时不需要加载
 from common.log import logger
+from .image_downloader import ImageDownloader
+from .decoded_cache import DecodedImageCache
+from .id_generator import generate_image_id
+from .temp_files import TempFileRegistry
+from .image_encoder import ImageEncoder
 
 class ImageProcessor:
-    def __init__(self, temp_dir, uploader=None):
+    def __init__(self, temp_dir, uploader=None, http_pool=None, downloader=None, decoded_cache=None,
+                 mask_max_side=1024, mask_compression=1, debug_mask=False, output="memory",
+                 resize_quality="balanced", encoder=None):
         self.temp_dir = temp_dir
+        self.resize_quality = resize_quality  # 拼图缩略图的缩放方式："high"、"balanced"或"fast"
+        self.encoder = encoder or ImageEncoder()
+        self.output = output  # 拼图结果形式："memory"返回内存缓冲区，"file"返回用后即删的临时文件
+        self.mask_max_side = mask_max_side  # 蒙版计算的工作分辨率上限(长边像素)，0表示使用原图分辨率
+        self.mask_compression = mask_compression  # 蒙版PNG压缩级别(0-9)
+        self.debug_mask = debug_mask  # 是否将每次生成的蒙版写入临时目录以便排查
+        self._black_masks = OrderedDict()  # (宽, 高) -> 全黑蒙版的data URL
+        self._black_masks_lock = threading.Lock()
         self.uploader = uploader
+        self.downloader = downloader or ImageDownloader(http_pool)
+        self.decoded_cache = decoded_cache or DecodedImageCache()
         self.image_data = {}
         self._ensure_temp_dir()
+        self.temp_files = TempFileRegistry(temp_dir)
+
+    def close(self):
+        """清理尚未释放的临时文件"""
+        self.temp_files.close()
 
     def _ensure_temp_dir(self):
         """确保临时目录存在"""
         os.makedirs(self.temp_dir, exist_ok=True)
 
     def _bytes_to_cv(self, image_bytes):
-        """字节数据转OpenCV格式"""
+        """字节数据转OpenCV格式，结果为只读的共享数组"""
+        return self.decoded_cache.get_or_decode(image_bytes, "cv_bgr", self._decode_cv)
+
+    @staticmethod
+    def _decode_cv(image_bytes):
+        import cv2
+        import numpy as np
         np_arr = np.frombuffer(image_bytes, np.uint8)
         return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
+    @staticmethod
+    def _image_size(image_bytes):
+        """只读取文件头获取图片尺寸(宽, 高)，按EXIF方向修正"""
+        from PIL import Image
+        img = Image.open(io.BytesIO(image_bytes))
+        width, height = img.size
+        try:
+            orientation = img.getexif().get(0x0112, 1)
+        except Exception:
+            orientation = 1
+        # 5-8表示图片需旋转90度，解码后宽高互换
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+        return width, height
+
+    def _bytes_to_cv_reduced(self, image_bytes, factor, cache=True):
+        """以1/factor分辨率解码，JPEG可在解码时直接缩小，无需先解码完整图片
+        Args:
+            cache: 是否使用共享解码缓存，只使用一次的图片(如用户的标记图)不缓存，避免挤出常用图片
+        """
+        import cv2
+        import numpy as np
+        full_decode = self._bytes_to_cv if cache else self._decode_cv
+        if factor == 1:
+            return full_decode(image_bytes)
+        flag = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+        decode = lambda data: cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if cache:
+            image = self.decoded_cache.get_or_decode(image_bytes, f"cv_bgr_r{factor}", decode)
+        else:
+            image = decode(image_bytes)
+        return image if image is not None else full_decode(image_bytes)
+
+    def _mask_inputs(self, original_image_bytes, marked_image_bytes):
+        """准备蒙版计算的输入，原图和标记图缩小到同一工作尺寸
+        Returns:
+            tuple: (原图, 标记图, 原图尺寸(宽, 高), 缩放比例)
+        """
+        import cv2
+        width, height = self._image_size(original_image_bytes)
+        scale = 1.0
+        if self.mask_max_side and max(width, height) > self.mask_max_side:
+            scale = self.mask_max_side / max(width, height)
+
+        # 选择不低于工作尺寸的最大解码缩小倍数
+        factor = 1
+        for candidate in (8, 4, 2):
+            if scale * candidate <= 1:
+                factor = candidate
+                break
+        orig_cv = self._bytes_to_cv_reduced(original_image_bytes, factor)
+        marked_cv = self._bytes_to_cv_reduced(marked_image_bytes, factor, cache=False)
+        if factor == 1:
+            # 以实际解码尺寸为准
+            height, width = orig_cv.shape[:2]
+
+        work_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if (orig_cv.shape[1], orig_cv.shape[0]) != work_size:
+            orig_cv = cv2.resize(orig_cv, work_size, interpolation=cv2.INTER_AREA)
+        if (marked_cv.shape[1], marked_cv.shape[0]) != work_size:
+            marked_cv = cv2.resize(marked_cv, work_size, interpolation=cv2.INTER_AREA)
+        return orig_cv, marked_cv, (width, height), scale
+
+    def _bytes_to_pil_rgb(self, image_bytes):
+        """字节数据转RGB模式的PIL图片，结果为共享对象"""
+        return self.decoded_cache.get_or_decode(image_bytes, "pil_rgb", self._decode_pil_rgb)
+
+    @staticmethod
+    def _decode_pil_rgb(image_bytes):
+        from PIL import Image
+        img = Image.open(io.BytesIO(image_bytes))
+        # 统一转换为RGB模式
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        else:
+            img.load()
+        return img
+
     def _strict_red_mask(self, image_cv):
         """精准红色标记检测"""
+        import cv2
+        import numpy as np
         hsv = cv2.cvtColor(image_cv, cv2.COLOR_BGR2HSV)
         
         # 精确红色范围（避免检测到橙色或粉色）
@@ -46,6 +152,8 @@ class ImageProcessor:
 
     def _exact_contour_mask(self, red_mask):
         """生成精准轮廓蒙版"""
+        import cv2
+        import numpy as np
         # 精准轮廓查找
         contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if not contours:
@@ -74,22 +182,23 @@ class ImageProcessor:
         1张图片：直接返回原图
         2张图片：左右对称布局，中间白线分割
         3-4张图片：3:1布局，不足4张用白色填充
+        Returns:
+            file: 按output配置返回io.BytesIO或临时文件句柄，调用方用完后关闭，失败返回None
         """
-        temp_path = None
+        from PIL import Image
         try:
-            # 下载所有图片
+            # 并发下载所有图片，结果与URL顺序一致，失败的图片跳过
+            # 此处只读取文件头获取尺寸，需要缩小的图片在缩放时再按目标尺寸解码
             images = []
-            for url in image_urls:  # 处理所有提供的图片
+            contents = []
+            for result in self.downloader.download_all(image_urls):
+                if not result.ok:
+                    continue
                 try:
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    img = Image.open(io.BytesIO(response.content))
-                    # 统一转换为RGB模式
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    images.append(img)
+                    images.append(Image.open(io.BytesIO(result.content)))
+                    contents.append(result.content)
                 except Exception as e:
-                    logger.error(f"[Doubao] Error downloading image {url}: {e}")
+                    logger.error(f"[Doubao] Error decoding image {result.url}: {e}")
                     continue
 
             if not images:
@@ -98,10 +207,7 @@ class ImageProcessor:
 
             # 如果只有一张图片，直接返回
             if len(images) == 1:
-                temp_path = os.path.join(self.temp_dir, f"single_{int(time.time())}.jpg")
-                images[0].save(temp_path, format='JPEG', quality=95)
-                logger.info(f"[Doubao] Successfully saved single image to {temp_path}")
-                return self._safe_open_file(temp_path)
+                return self._output_image(self._bytes_to_pil_rgb(contents[0]), "single")
 
             # 获取第一张图片的尺寸作为基准
             base_width = images[0].width
@@ -137,7 +243,7 @@ class ImageProcessor:
                         new_height = int(new_width / img_ratio)
                     
                     # 缩放图片
-                    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    resized_img = self._thumbnail(contents[i], (new_width, new_height))
                     
                     # 计算粘贴位置（水平居中）
                     x = i * (target_width + line_width) + (target_width - new_width) // 2
@@ -156,7 +262,7 @@ class ImageProcessor:
                 canvas = Image.new('RGB', (total_width, total_height), 'white')
 
                 # 粘贴大图到左侧
-                canvas.paste(images[0], (0, 0))
+                canvas.paste(self._bytes_to_pil_rgb(contents[0]), (0, 0))
 
                 # 创建一个白色的填充图片
                 blank_image = Image.new('RGB', (small_width, small_height), 'white')
@@ -168,61 +274,52 @@ class ImageProcessor:
                     
                     if i < len(images):
                         # 如果有实际的图片，使用实际图片
-                        small_img = images[i].resize((small_width, small_height), Image.Resampling.LANCZOS)
+                        small_img = self._thumbnail(contents[i], (small_width, small_height))
                         canvas.paste(small_img, (x, y))
                     else:
                         # 如果没有实际的图片，使用白色填充图片
                         canvas.paste(blank_image, (x, y))
 
-            # 保存为临时文件
-            temp_path = os.path.join(self.temp_dir, f"combined_{int(time.time())}.jpg")
-            canvas.save(temp_path, format='JPEG', quality=95)
-            logger.info(f"[Doubao] Successfully saved combined image to {temp_path}")
-
-            return self._safe_open_file(temp_path)
+            return self._output_image(canvas, "combined")
 
         except Exception as e:
             logger.error(f"[Doubao] Error in combine_images: {e}")
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
             return None
 
-    def _safe_open_file(self, file_path):
-        """安全地打开文件，如果文件被占用则等待并重试"""
-        max_retries = 3
-        retry_delay = 1  # 秒
-        
-        for i in range(max_retries):
-            try:
-                return open(file_path, 'rb')
-            except IOError as e:
-                if i < max_retries - 1:
-                    logger.warning(f"[Doubao] Failed to open file {file_path}, retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    logger.error(f"[Doubao] Failed to open file after {max_retries} retries: {e}")
-                    return None
-
-    def cleanup_temp_files(self):
-        """清理临时文件"""
-        try:
-            for file in os.listdir(self.temp_dir):
-                file_path = os.path.join(self.temp_dir, file)
-                if os.path.isfile(file_path):
-                    try:
-                        os.remove(file_path)
-                    except Exception as e:
-                        logger.warning(f"[Doubao] Failed to remove temp file {file_path}: {e}")
-            logger.info("[Doubao] Cleaned up temporary files")
-        except Exception as e:
-            logger.error(f"[Doubao] Error cleaning up temp files: {e}")
+    def _thumbnail(self, image_bytes, size):
+        """按目标尺寸缩放图片
+        high：完整解码后直接LANCZOS缩放
+        balanced：JPEG按接近目标的比例直接缩小解码，再用reduce()整数倍缩小到目标的3倍以内，最后LANCZOS缩放
+        fast：同上，但缩小到目标的2倍以内后用双线性缩放
+        """
+        from PIL import Image
+        if self.resize_quality == "high":
+            return self._bytes_to_pil_rgb(image_bytes).resize(size, Image.Resampling.LANCZOS)
+
+        img = Image.open(io.BytesIO(image_bytes))
+        # 只对JPEG生效，解码结果不小于目标尺寸
+        img.draft('RGB', size)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if self.resize_quality == "fast":
+            return img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    def _output_image(self, image, prefix):
+        """按编码器配置编码，并按output配置返回内存缓冲区或临时文件句柄"""
+        data, stats = self.encoder.encode(image)
+        logger.info(
+            f"[Doubao] Encoded {prefix} image {image.width}x{image.height}: {stats['format']} q={stats['quality']}, "
+            f"{stats['bytes'] / 1024:.0f}KB in {stats['encode_ms']}ms ({stats['attempts']} attempts)"
+        )
+        if self.output == "file":
+            # 部分通道只接受文件路径，句柄关闭后文件即被删除
+            return self.temp_files.open(data, prefix, self.encoder.extension)
+        return io.BytesIO(data)
 
     def store_image_data(self, image_urls, operation_type, parent_id=None):
         """存储图片信息"""
-        img_id = str(int(time.time()))
+        img_id = generate_image_id()
         self.image_data[img_id] = {
             "urls": image_urls,
             "timestamp": time.time(),
@@ -247,23 +344,91 @@ class ImageProcessor:
             return False, f"图片索引超出范围，当前只有{len(image_data['urls'])}张图片"
         return True, None
 
-    def _get_dominant_colors(self, image_cv, n_clusters=3):
-        """获取图像的主色调"""
-        pixels = image_cv.reshape(-1, 3)
-        kmeans = KMeans(n_clusters=n_clusters, n_init=10)
-        kmeans.fit(pixels)
-        return kmeans.cluster_centers_.astype(int)
+    @staticmethod
+    def _sample_pixels(image_cv, max_pixels=65536):
+        """按均匀网格抽样像素，保持各区域的比例
+        Returns:
+            ndarray: (N, 3)的像素数组
+        """
+        import numpy as np
+        height, width = image_cv.shape[:2]
+        step = max(1, int(np.ceil(np.sqrt(height * width / max_pixels))))
+        return image_cv[step // 2::step, step // 2::step].reshape(-1, 3)
+
+    @staticmethod
+    def _weighted_kmeans(points, weights, centers, max_iter):
+        """加权Lloyd迭代
+        Returns:
+            tuple: (聚类中心, 各簇权重, 加权误差平方和)
+        """
+        import numpy as np
+        k = len(centers)
+        for _ in range(max_iter):
+            dist = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            labels = dist.argmin(axis=1)
+            totals = np.bincount(labels, weights=weights, minlength=k)
+            new_centers = np.stack([np.bincount(labels, weights=weights * points[:, ch], minlength=k)
+                                    for ch in range(3)], axis=1)
+            # 空簇保持原位置
+            new_centers = np.where(totals[:, None] > 0, new_centers / np.maximum(totals, 1)[:, None], centers)
+            converged = np.allclose(new_centers, centers, atol=0.5)
+            centers = new_centers
+            if converged:
+                break
+        dist = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = dist.argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        inertia = float((dist[np.arange(len(points)), labels] * weights).sum())
+        return centers, totals, inertia
+
+    def _get_dominant_colors(self, image_cv, n_clusters=3, bits=5, n_init=4, max_iter=20):
+        """获取图像的主色调
+        对抽样像素按每通道bits位量化为三维直方图，再以各格子的像素数为权重做加权k-means，
+        计算量只与非空格子数有关，与图片尺寸无关
+        Returns:
+            ndarray: (n_clusters, 3)的颜色数组，按占比从高到低排列
+        """
+        import numpy as np
+        pixels = self._sample_pixels(image_cv).astype(np.int64)
+        q = pixels >> (8 - bits)
+        bins = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+        counts = np.bincount(bins, minlength=1 << (3 * bits))
+        occupied = np.nonzero(counts)[0]
+        weights = counts[occupied].astype(np.float64)
+        # 每个格子取其中像素的平均颜色，避免量化误差
+        points = np.stack([np.bincount(bins, weights=pixels[:, ch], minlength=counts.size)[occupied]
+                           for ch in range(3)], axis=1) / weights[:, None]
+
+        k = min(n_clusters, len(points))
+        # 固定随机种子，相同图片结果一致
+        rng = np.random.default_rng(0)
+        best = None
+        for _ in range(n_init):
+            # k-means++初始化，按像素数加权
+            centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+            dist = ((points - centers[0]) ** 2).sum(axis=1)
+            for _ in range(1, k):
+                prob = dist * weights
+                if prob.sum() <= 0:
+                    break
+                centers.append(points[rng.choice(len(points), p=prob / prob.sum())])
+                dist = np.minimum(dist, ((points - centers[-1]) ** 2).sum(axis=1))
+            result = self._weighted_kmeans(points, weights, np.array(centers), max_iter)
+            if best is None or result[2] < best[2]:
+                best = result
+
+        centers, totals, _ = best
+        order = np.argsort(-totals)
+        return np.rint(centers[order]).astype(int)
 
     def _find_contrast_color(self, image_cv):
         """自动寻找最佳对比色"""
-        # 转换为LAB颜色空间
-        lab = cv2.cvtColor(image_cv, cv2.COLOR_BGR2LAB)
+        import cv2
+        import numpy as np
+        # 在抽样像素上转换为LAB颜色空间
+        lab = cv2.cvtColor(self._sample_pixels(image_cv).reshape(-1, 1, 3), cv2.COLOR_BGR2LAB)
         l, a, b = cv2.split(lab)
         
-        # 获取主色调
-        dominant_colors = self._get_dominant_colors(image_cv)
-        main_color = dominant_colors[0]
-        
         # 在LAB空间计算对比色
         target_l = 255 - l.mean()
         target_a = 128 + (128 - a.mean())
@@ -278,8 +443,13 @@ class ImageProcessor:
         target_lab = np.uint8([[[target_l, target_a, target_b]]])
         return cv2.cvtColor(target_lab, cv2.COLOR_LAB2BGR)[0][0]
 
-    def _dynamic_color_mask(self, orig_cv, marked_cv):
-        """动态颜色差异蒙版"""
+    def _dynamic_color_mask(self, orig_cv, marked_cv, scale=1.0):
+        """动态颜色差异蒙版
+        Args:
+            scale: 输入相对原图的缩放比例，缩小较多时缩放本身已平滑噪点，跳过开运算以免断开细线
+        """
+        import cv2
+        import numpy as np
         # 计算图像差异
         diff = cv2.absdiff(orig_cv, marked_cv)
         diff_gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
@@ -290,101 +460,110 @@ class ImageProcessor:
         # 形态学处理以减少噪点
         kernel = np.ones((3,3), np.uint8)
         diff_mask = cv2.morphologyEx(diff_mask, cv2.MORPH_CLOSE, kernel, iterations=2)
-        diff_mask = cv2.morphologyEx(diff_mask, cv2.MORPH_OPEN, kernel, iterations=1)
+        if scale >= 0.5:
+            diff_mask = cv2.morphologyEx(diff_mask, cv2.MORPH_OPEN, kernel, iterations=1)
         
         return diff_mask
 
     def create_mask_from_marked_image(self, original_image_bytes, marked_image_bytes):
         """增强版蒙版生成，支持动态颜色检测"""
+        import cv2
         try:
-            # 转换并统一尺寸
-            orig_cv = self._bytes_to_cv(original_image_bytes)
-            marked_cv = self._bytes_to_cv(marked_image_bytes)
-            
-            if orig_cv.shape != marked_cv.shape:
-                marked_cv = cv2.resize(marked_cv, (orig_cv.shape[1], orig_cv.shape[0]))
+            # 在缩小后的工作尺寸上计算
+            orig_cv, marked_cv, (width, height), scale = self._mask_inputs(original_image_bytes, marked_image_bytes)
 
             # 生成动态差异蒙版
-            mask = self._dynamic_color_mask(orig_cv, marked_cv)
-            
-            # 转换为PIL图像并保持为灰度图
-            pil_mask = Image.fromarray(mask).convert('L')
-            
-            # 保存调试图片
-            debug_path = os.path.join(self.temp_dir, "debug_mask.png")
-            pil_mask.save(debug_path)
-            logger.info(f"[Doubao] Updated mask at: {debug_path}")
+            mask = self._dynamic_color_mask(orig_cv, marked_cv, scale)
+            if scale != 1.0:
+                # 放大回原图尺寸并重新二值化
+                mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_LINEAR)
+                _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
 
-            # 转换为RGB并编码返回
-            rgb_mask = pil_mask.convert('RGB')
-            buffer = io.BytesIO()
-            rgb_mask.save(buffer, format="PNG")
-            return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+            return self._encode_mask(mask)
 
         except Exception as e:
             logger.error(f"[Doubao] Enhanced mask error: {str(e)}")
-            return self._black_mask(orig_cv.shape if 'orig_cv' in locals() else (512,512,3))
+            return self._black_mask((height, width) if 'width' in locals() else (512,512,3))
 
     def create_mask_from_circle_selection(self, original_image_bytes, marked_image_bytes, invert=False):
         """增强版精准圈选，支持动态颜色"""
+        import cv2
+        import numpy as np
         try:
-            # 转换并统一尺寸
-            marked_cv = self._bytes_to_cv(marked_image_bytes)
-            orig_cv = self._bytes_to_cv(original_image_bytes)
-            
-            if orig_cv.shape[:2] != marked_cv.shape[:2]:
-                marked_cv = cv2.resize(marked_cv, (orig_cv.shape[1], orig_cv.shape[0]))
+            # 在缩小后的工作尺寸上计算
+            orig_cv, marked_cv, (width, height), scale = self._mask_inputs(original_image_bytes, marked_image_bytes)
 
             # 生成动态差异蒙版
-            mask = self._dynamic_color_mask(orig_cv, marked_cv)
+            mask = self._dynamic_color_mask(orig_cv, marked_cv, scale)
             
             # 获取精准轮廓
             contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             if not contours:
-                return self._black_mask(orig_cv.shape)
+                return self._black_mask((height, width))
 
-            # 找到最大有效轮廓
+            # 找到最大有效轮廓，面积阈值按原图尺寸换算
+            min_area = 50 * scale * scale
             main_contour = max(
-                [c for c in contours if cv2.contourArea(c) > 50],
+                [c for c in contours if cv2.contourArea(c) > min_area],
                 key=cv2.contourArea,
                 default=None
             )
             if main_contour is None:
-                return self._black_mask(orig_cv.shape)
+                return self._black_mask((height, width))
 
-            # 创建轮廓蒙版
-            mask = np.zeros(orig_cv.shape[:2], dtype=np.uint8)
+            if scale != 1.0:
+                # 轮廓坐标映射回原图尺寸，以像素中心为基准缩放
+                main_contour = np.round((main_contour.astype(np.float32) + 0.5) / scale - 0.5).astype(np.int32)
+
+            # 在原图尺寸上填充轮廓
+            mask = np.zeros((height, width), dtype=np.uint8)
             cv2.drawContours(mask, [main_contour], -1, 255, -1)
 
             # 反选处理 - 确保圈选区域为黑色(0)，外部为白色(255)
             if invert:
                 mask = cv2.bitwise_not(mask)
 
-            # 转换为PIL图像
-            pil_mask = Image.fromarray(mask).convert('L')
-            
-            # 保存调试图片
-            debug_path = os.path.join(self.temp_dir, "debug_mask.png")
-            pil_mask.save(debug_path)
-            logger.info(f"[Doubao] Updated mask at: {debug_path}")
-            
-            # 转换为RGB并编码返回
-            rgb_mask = pil_mask.convert('RGB')
-            buffer = io.BytesIO()
-            rgb_mask.save(buffer, format="PNG")
-            return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+            return self._encode_mask(mask)
 
         except Exception as e:
             logger.error(f"[Doubao] Enhanced circle mask error: {str(e)}")
-            return self._black_mask(orig_cv.shape if 'orig_cv' in locals() else (512,512,3))
+            return self._black_mask((height, width) if 'width' in locals() else (512,512,3))
+
+    def _encode_mask(self, mask):
+        """将单通道蒙版数组直接编码为PNG data URL
+        Args:
+            mask: uint8单通道数组，255表示修改区域
+        Returns:
+            str: data:image/png;base64格式的蒙版
+        """
+        import cv2
+        ok, buffer = cv2.imencode(".png", mask, [cv2.IMWRITE_PNG_COMPRESSION, int(self.mask_compression)])
+        if not ok:
+            raise ValueError("failed to encode mask")
+        if self.debug_mask:
+            debug_path = os.path.join(self.temp_dir, "debug_mask.png")
+            with open(debug_path, "wb") as f:
+                f.write(buffer.tobytes())
+            logger.info(f"[Doubao] Updated mask at: {debug_path}")
+        return f"data:image/png;base64,{base64.b64encode(buffer).decode()}"
 
     def _black_mask(self, shape):
-        """生成全黑蒙版（表示无修改区域）"""
-        if isinstance(shape, tuple) and len(shape) >= 2:
-            height, width = shape[:2]
-        else:
-            height, width = shape[0], shape[1]
-        mask = Image.new('L', (width, height), 0)  # 使用'L'模式创建灰度图
-        buffer = io.BytesIO()
-        mask.save(buffer, format="PNG")
-        return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+        """生成全黑蒙版（表示无修改区域），同一尺寸只编码一次"""
+        import cv2
+        import numpy as np
+        height, width = shape[:2]
+        key = (width, height)
+        with self._black_masks_lock:
+            data_url = self._black_masks.get(key)
+            if data_url is not None:
+                self._black_masks.move_to_end(key)
+                return data_url
+        ok, buffer = cv2.imencode(".png", np.zeros((height, width), dtype=np.uint8),
+                                  [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        data_url = f"data:image/png;base64,{base64.b64encode(buffer).decode()}"
+        with self._black_masks_lock:
+            self._black_masks[key] = data_url
+            # 全黑蒙版压缩后很小，只保留最近使用的少量尺寸
+            while len(self._black_masks) > 16:
+                self._black_masks.popitem(last=False)
+        return data_url
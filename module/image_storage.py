@@ -2,88 +2,500 @@ import sqlite3
 import json
 import time
 import os
+import atexit
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
 from common.log import logger
+from .storage_backend import StorageBackend
 
-class ImageStorage:
-    def __init__(self, db_path, retention_days=7):
+# 固定的SQL文本，配合连接级语句缓存复用已编译语句
+# edit_chain和operation_history为旧版本遗留列，不再写入和读取
+_INSERT_IMAGE_SQL = '''INSERT INTO images 
+                        (id, urls, operation_type, operation_params, parent_id, created_at,
+                         conversation_id, user_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+_SELECT_IMAGE_SQL = '''SELECT id, urls, operation_type, operation_params, 
+                               parent_id, created_at 
+                        FROM images WHERE id = ?'''
+_SELECT_SUMMARY_COLUMNS = 'id, urls, operation_type, operation_params, parent_id, created_at'
+# 沿parent_id向上查找祖先(含自身)，depth为与起点的距离
+_SELECT_ANCESTORS_SQL = '''
+                WITH RECURSIVE ancestors(id, parent_id, depth) AS (
+                    SELECT id, parent_id, 0 FROM images WHERE id = ?
+                    UNION ALL
+                    SELECT i.id, i.parent_id, a.depth + 1
+                    FROM images i JOIN ancestors a ON i.id = a.parent_id
+                    WHERE a.depth < ?
+                )
+                SELECT i.id, i.operation_type, i.operation_params, i.created_at, a.depth
+                FROM ancestors a JOIN images i ON i.id = a.id
+                ORDER BY a.depth DESC
+            '''
+# 沿parent_id向下查找所有后代(不含自身)
+_SELECT_DESCENDANTS_SQL = '''
+                WITH RECURSIVE descendants(id, depth) AS (
+                    SELECT id, 1 FROM images WHERE parent_id = ?
+                    UNION ALL
+                    SELECT i.id, d.depth + 1
+                    FROM images i JOIN descendants d ON i.parent_id = d.id
+                    WHERE d.depth < ?
+                )
+                SELECT i.id, i.operation_type, i.parent_id, i.created_at, d.depth
+                FROM descendants d JOIN images i ON i.id = d.id
+                ORDER BY d.depth, i.created_at
+            '''
+# 防止异常数据形成环时无限递归
+_MAX_LINEAGE_DEPTH = 1000
+# 删除一批过期记录，仍被未过期记录(直接或间接)作为祖先引用的记录保留
+_DELETE_EXPIRED_SQL = '''
+                WITH RECURSIVE keep(id) AS (
+                    SELECT parent_id FROM images WHERE created_at >= ? AND parent_id IS NOT NULL
+                    UNION
+                    SELECT i.parent_id FROM images i JOIN keep k ON i.id = k.id
+                    WHERE i.parent_id IS NOT NULL
+                )
+                DELETE FROM images WHERE id IN (
+                    SELECT id FROM images
+                    WHERE created_at < ? AND id NOT IN (SELECT id FROM keep WHERE id IS NOT NULL)
+                    ORDER BY created_at
+                    LIMIT ?
+                )
+            '''
+# 父记录已不存在的血缘指针置空
+_PRUNE_ORPHANS_SQL = '''
+                UPDATE images SET parent_id = NULL
+                WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM images)
+            '''
+
+# 清理批次删除记录后，回收不再被引用的blob
+_PRUNE_BLOB_LINKS_SQL = '''
+                DELETE FROM image_blobs WHERE image_id NOT IN (SELECT id FROM images)
+            '''
+_PRUNE_BLOBS_SQL = '''
+                DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM image_blobs)
+            '''
+
+# operation_params中体积较大的字段(蒙版data URL、完整图片数据)单独存储
+_BLOB_KEYS = ("mask", "data")
+_BLOB_MIN_BYTES = 256  # 序列化后小于该值的字段仍内联存储
+_BLOB_REF = "$blob"
+
+def _is_blob_ref(value):
+    return isinstance(value, dict) and len(value) == 1 and _BLOB_REF in value
+
+def _put_blob(c, value):
+    """按内容哈希写入blob，已存在时直接复用
+    Returns:
+        str: blob哈希，值过小不需要单独存储时返回None
+    """
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) < _BLOB_MIN_BYTES:
+        return None
+    blob_hash = hashlib.sha256(raw).hexdigest()
+    c.execute('''INSERT OR IGNORE INTO blobs (hash, data, size, created_at)
+                 VALUES (?, ?, ?, ?)''',
+              (blob_hash, zlib.compress(raw, 6), len(raw), int(time.time())))
+    return blob_hash
+
+def _externalize_blobs(c, img_id, params):
+    """把operation_params中的大字段替换为blob引用并记录引用关系
+    Returns:
+        dict: 替换后的operation_params
+    """
+    if not params:
+        return params
+    result = dict(params)
+    for key in _BLOB_KEYS:
+        value = dict.get(params, key)
+        if not value:
+            continue
+        blob_hash = value[_BLOB_REF] if _is_blob_ref(value) else _put_blob(c, value)
+        if blob_hash is None:
+            continue
+        result[key] = {_BLOB_REF: blob_hash}
+        c.execute('INSERT OR IGNORE INTO image_blobs (image_id, hash) VALUES (?, ?)', (img_id, blob_hash))
+    return result
+
+def _table_columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in c.fetchall()}
+
+def _migration_1_base(c):
+    """基础表结构"""
+    # 创建图片表，增加edit_chain和operation_history字段
+    c.execute('''CREATE TABLE IF NOT EXISTS images
+                (id TEXT PRIMARY KEY,
+                 urls TEXT NOT NULL,
+                 operation_type TEXT NOT NULL,
+                 operation_params TEXT,
+                 parent_id TEXT,
+                 edit_chain TEXT,
+                 operation_history TEXT,
+                 created_at INTEGER)''')
+    # 血缘查询(后代)按parent_id查找
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_parent_id ON images(parent_id)')
+
+def _migration_2_query_indexes(c):
+    """会话/用户列及查询索引"""
+    columns = _table_columns(c, "images")
+    if "conversation_id" not in columns:
+        c.execute('ALTER TABLE images ADD COLUMN conversation_id TEXT')
+    if "user_id" not in columns:
+        c.execute('ALTER TABLE images ADD COLUMN user_id TEXT')
+
+    # 从operation_params回填会话ID
+    c.execute('SELECT id, operation_params FROM images WHERE conversation_id IS NULL AND operation_params IS NOT NULL')
+    updates = []
+    for img_id, params in c.fetchall():
+        try:
+            conversation_id = json.loads(params).get("conversation_id")
+        except Exception:
+            continue
+        if conversation_id:
+            updates.append((conversation_id, img_id))
+    c.executemany('UPDATE images SET conversation_id = ? WHERE id = ?', updates)
+
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_created_at ON images(created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_type_created ON images(operation_type, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_conversation_created ON images(conversation_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_user_created ON images(user_id, created_at)')
+
+def _migration_3_blob_store(c):
+    """大字段移入blob表"""
+    c.execute('''CREATE TABLE IF NOT EXISTS blobs
+                (hash TEXT PRIMARY KEY,
+                 data BLOB NOT NULL,
+                 size INTEGER NOT NULL,
+                 created_at INTEGER)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS image_blobs
+                (image_id TEXT NOT NULL,
+                 hash TEXT NOT NULL,
+                 PRIMARY KEY (image_id, hash)) WITHOUT ROWID''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_image_blobs_hash ON image_blobs(hash)')
+
+    # 改写已有记录，只处理可能包含大字段的行
+    c.execute("""SELECT id, operation_params FROM images
+                 WHERE operation_params LIKE '%"mask"%' OR operation_params LIKE '%"data"%'""")
+    rewritten = 0
+    for img_id, params in c.fetchall():
+        try:
+            params = json.loads(params)
+        except Exception:
+            continue
+        if not isinstance(params, dict):
+            continue
+        new_params = _externalize_blobs(c, img_id, params)
+        if new_params != params:
+            c.execute('UPDATE images SET operation_params = ? WHERE id = ?', (json.dumps(new_params), img_id))
+            rewritten += 1
+    if rewritten:
+        logger.info(f"[Doubao] Moved large operation params of {rewritten} images to blob store")
+
+def _migration_4_sessions(c):
+    """会话状态表"""
+    c.execute('''CREATE TABLE IF NOT EXISTS sessions
+                (key TEXT PRIMARY KEY,
+                 data TEXT NOT NULL,
+                 updated_at INTEGER NOT NULL)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)')
+
+def _migration_5_drop_lineage_copies(c):
+    """清空旧版本复制存储的编辑链和操作历史"""
+    # 血缘由parent_id在读取时生成，旧副本中还内联了各祖先的蒙版等大字段
+    c.execute('''UPDATE images SET edit_chain = NULL, operation_history = NULL
+                 WHERE edit_chain IS NOT NULL OR operation_history IS NOT NULL''')
+    if c.rowcount > 0:
+        logger.info(f"[Doubao] Cleared legacy lineage copies of {c.rowcount} images")
+
+# 按版本顺序执行的迁移，版本号记录在PRAGMA user_version中
+_MIGRATIONS = [
+    (1, _migration_1_base),
+    (2, _migration_2_query_indexes),
+    (3, _migration_3_blob_store),
+    (4, _migration_4_sessions),
+    (5, _migration_5_drop_lineage_copies),
+]
+
+class ImageRecord(dict):
+    """图片记录
+
+    edit_chain和operation_history不再随每条记录复制存储，
+    在首次通过[]、get或in访问时才按parent_id链从数据库物化。
+    """
+    _LAZY_KEYS = ("edit_chain", "operation_history")
+
+    def __init__(self, data, loader):
+        super().__init__(data)
+        self._loader = loader
+
+    def _materialize(self, key):
+        value = self._loader(key)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __missing__(self, key):
+        if key in self._LAZY_KEYS:
+            return self._materialize(key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._LAZY_KEYS and not dict.__contains__(self, key):
+            return self._materialize(key)
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return key in self._LAZY_KEYS or dict.__contains__(self, key)
+
+class BlobParams(dict):
+    """操作参数
+
+    mask、data等大字段以{"$blob": hash}引用形式存储，通过[]或get访问时
+    才从blob表加载并解压。遍历或copy得到的是引用本身，原样存回时会复用同一blob。
+    """
+
+    def __init__(self, data, loader):
+        super().__init__(data)
+        self._loader = loader
+
+    def _resolve(self, key, value):
+        if _is_blob_ref(value):
+            value = self._loader(value[_BLOB_REF])
+            dict.__setitem__(self, key, value)
+        return value
+
+    def __getitem__(self, key):
+        return self._resolve(key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        if not dict.__contains__(self, key):
+            return default
+        return self[key]
+
+class ImageStorage(StorageBackend):
+    """基于本地SQLite文件的存储后端"""
+
+    def __init__(self, db_path, retention_days=7, busy_timeout=5.0, cache_size_kb=8192,
+                 durability="immediate", batch_max_delay=0.2, batch_size=100):
+        super().__init__(retention_days)
         self.db_path = db_path
-        self.retention_days = retention_days
+        self.busy_timeout = busy_timeout  # 数据库被锁定时的等待时间(秒)
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
         self._init_db()
+
+        # batched模式下写入先进入队列，由后台线程合并为批量事务提交
+        self.durability = durability
+        self.batch_max_delay = batch_max_delay
+        self.batch_size = batch_size
+        self._pending = OrderedDict()  # img_id -> image_info，尚未落盘的记录
+        self._pending_cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer_thread = None
+        self._writer_stop = False
+        if self.durability == "batched":
+            self._writer_thread = threading.Thread(target=self._run_writer, name="doubao-storage-writer", daemon=True)
+            self._writer_thread.start()
+            atexit.register(self.flush)
+
+    def _connect(self):
+        """创建并配置数据库连接"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=128
+        )
+        # 新数据库启用增量vacuum，清理后可逐步归还空闲页而无需全库VACUUM(对已有表的数据库无效)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL模式下读写互不阻塞，synchronous=NORMAL在WAL下仍能保证一致性
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _get_conn(self):
+        """获取当前线程的数据库连接，每个线程复用同一个连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        """落盘待写入记录并关闭所有线程的数据库连接"""
+        self.stop_retention_worker()
+        if self._writer_thread:
+            with self._pending_cond:
+                self._writer_stop = True
+                self._pending_cond.notify_all()
+            self._writer_thread.join(5)
+            self._writer_thread = None
+            atexit.unregister(self.flush)
+        self.flush()
+        with self._pending_cond:
+            remaining = len(self._pending)
+        if remaining:
+            logger.error(f"[Doubao] {remaining} image records could not be written before close")
+        with self._conns_lock:
+            conns = self._conns
+            self._conns = []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
         
     def _init_db(self):
-        """初始化数据库表结构"""
-        conn = sqlite3.connect(self.db_path)
+        """初始化数据库表结构，按顺序执行尚未应用的迁移"""
+        conn = self._get_conn()
         c = conn.cursor()
         
-        # 创建图片表，增加edit_chain和operation_history字段
-        c.execute('''CREATE TABLE IF NOT EXISTS images
-                    (id TEXT PRIMARY KEY,
-                     urls TEXT NOT NULL,
-                     operation_type TEXT NOT NULL,
-                     operation_params TEXT,
-                     parent_id TEXT,
-                     edit_chain TEXT,
-                     operation_history TEXT,
-                     created_at INTEGER)''')
+        c.execute("PRAGMA user_version")
+        if c.fetchone()[0] >= _MIGRATIONS[-1][0]:
+            return
         
-        conn.commit()
-        conn.close()
+        # IMMEDIATE事务保证多个进程同时启动时迁移只执行一次
+        conn.isolation_level = None
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("PRAGMA user_version")
+            version = c.fetchone()[0]
+            for target, migration in _MIGRATIONS:
+                if version < target:
+                    migration(c)
+                    c.execute(f"PRAGMA user_version = {target}")
+                    logger.info(f"[Doubao] Applied storage migration {target}: {migration.__doc__}")
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        finally:
+            conn.isolation_level = ""
         
     def store_image(self, img_id: str, image_info: dict):
         """存储图片信息
+        batched模式下只加入写入队列立即返回，由后台线程批量提交
         Args:
             img_id: 图片ID
             image_info: 图片信息，包含urls、type、operation_params等
         """
-        conn = sqlite3.connect(self.db_path)
+        if self._writer_thread is None:
+            self._write_batch([(img_id, image_info)])
+            return
+
+        with self._pending_cond:
+            self._pending[img_id] = image_info
+            # 第一条记录唤醒写入线程开始计时，队列满时提前提交
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._pending_cond.notify_all()
+
+    def _write_batch(self, items):
+        """在一个事务中写入多条图片记录"""
+        conn = self._get_conn()
         c = conn.cursor()
         
         try:
-            # 获取父图片的编辑链
-            edit_chain = []
-            operation_history = []
-            parent_id = image_info.get("parent_id")
-            
-            if parent_id:
-                c.execute('SELECT edit_chain, operation_history FROM images WHERE id = ?', (parent_id,))
-                result = c.fetchone()
-                if result:
-                    edit_chain = json.loads(result[0]) if result[0] else []
-                    operation_history = json.loads(result[1]) if result[1] else []
-            
-            # 更新编辑链
-            if parent_id:
-                edit_chain.append(parent_id)
-            
-            # 更新操作历史
-            operation_history.append({
-                'id': img_id,
-                'type': image_info.get("type"),
-                'params': image_info.get("operation_params"),
-                'timestamp': image_info.get("create_time", int(time.time()))
-            })
-            
-            # 存储图片信息
-            c.execute('''INSERT INTO images 
-                        (id, urls, operation_type, operation_params, parent_id, edit_chain, operation_history, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                     (img_id, 
-                      json.dumps(image_info.get("urls", [])),
-                      image_info.get("type"),
-                      json.dumps(image_info.get("operation_params", {})),
-                      parent_id,
-                      json.dumps(edit_chain),
-                      json.dumps(operation_history),
-                      image_info.get("create_time", int(time.time()))))
+            for img_id, image_info in items:
+                # 血缘关系只记录parent_id，编辑链和操作历史在读取时按需生成
+                parent_id = image_info.get("parent_id")
+                
+                # 大字段写入blob表，记录中只保留引用
+                operation_params = _externalize_blobs(c, img_id, image_info.get("operation_params", {}))
+                
+                # 存储图片信息
+                c.execute(_INSERT_IMAGE_SQL,
+                         (img_id, 
+                          json.dumps(image_info.get("urls", [])),
+                          image_info.get("type"),
+                          json.dumps(operation_params),
+                          parent_id,
+                          image_info.get("create_time", int(time.time())),
+                          (image_info.get("operation_params") or {}).get("conversation_id"),
+                          image_info.get("user_id")))
             
             conn.commit()
             
         except Exception as e:
+            conn.rollback()
             logger.error(f"[Doubao] Error storing image info: {e}")
             raise e
-        finally:
-            conn.close()
-        
+
+    def _run_writer(self):
+        """后台写入线程：队列达到batch_size或最早的记录等待超过batch_max_delay时提交"""
+        while True:
+            with self._pending_cond:
+                if not self._pending and not self._writer_stop:
+                    self._pending_cond.wait()
+                if self._writer_stop:
+                    return
+                if len(self._pending) < self.batch_size:
+                    # 等待更多记录合并到同一事务
+                    self._pending_cond.wait(self.batch_max_delay)
+                if self._writer_stop:
+                    return
+            if not self._flush_pending():
+                # 暂时性错误，记录保留在队列中，等待一段时间后重试
+                with self._pending_cond:
+                    if not self._writer_stop:
+                        self._pending_cond.wait(max(self.batch_max_delay, 1.0))
+
+    def flush(self):
+        """立即提交队列中所有待写入的记录"""
+        self._flush_pending()
+
+    def _discard_pending(self, items):
+        """从队列中移除已处理的记录，期间被同ID新记录覆盖的保留"""
+        with self._pending_cond:
+            for img_id, image_info in items:
+                if self._pending.get(img_id) is image_info:
+                    del self._pending[img_id]
+
+    def _flush_pending(self):
+        """提交队列中的记录
+        数据库锁定、磁盘已满等暂时性错误(OperationalError)时记录保留在队列中，
+        其他错误说明记录本身无法写入(如ID重复)，整批回退为逐条提交，只丢弃失败的记录。
+        Returns:
+            bool: 队列中的记录是否都已处理
+        """
+        with self._flush_lock:
+            with self._pending_cond:
+                items = list(self._pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                try:
+                    self._write_batch(batch)
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"[Doubao] Deferring {len(items) - start} image records: {e}")
+                    return False
+                except Exception:
+                    for index, item in enumerate(batch):
+                        try:
+                            self._write_batch([item])
+                        except sqlite3.OperationalError as e:
+                            self._discard_pending(batch[:index])
+                            logger.warning(f"[Doubao] Deferring {len(items) - start - index} image records: {e}")
+                            return False
+                        except Exception as e:
+                            logger.error(f"[Doubao] Dropping image record {item[0]}: {e}")
+                self._discard_pending(batch)
+            return True
+
+    def _flush_if_pending(self):
+        """查询前落盘待写入记录，保证能读到刚写入的数据"""
+        with self._pending_cond:
+            pending = bool(self._pending)
+        if pending:
+            self.flush()
+
     def get_image(self, img_id: str) -> dict:
         """获取图片信息
         Args:
@@ -91,26 +503,37 @@ class ImageStorage:
         Returns:
             dict: 图片信息
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        with self._pending_cond:
+            pending = self._pending.get(img_id)
+        if pending is not None:
+            # 尚未落盘的记录直接从队列返回，血缘信息在落盘后再查询
+            def _load_pending_lineage(key):
+                self.flush()
+                return self._load_lineage(img_id, key)
+            return ImageRecord({
+                'id': img_id,
+                'urls': list(pending.get("urls", [])),
+                'type': pending.get("type"),
+                'operation_params': dict(pending.get("operation_params") or {}),
+                'parent_id': pending.get("parent_id"),
+                'create_time': pending.get("create_time", int(time.time()))
+            }, _load_pending_lineage)
+
+        c = self._get_conn().cursor()
         
         try:
-            c.execute('''SELECT id, urls, operation_type, operation_params, 
-                               parent_id, edit_chain, operation_history, created_at 
-                        FROM images WHERE id = ?''', (img_id,))
+            c.execute(_SELECT_IMAGE_SQL, (img_id,))
             result = c.fetchone()
             
             if result:
-                image_info = {
+                image_info = ImageRecord({
                     'id': result[0],
                     'urls': json.loads(result[1]),
                     'type': result[2],
-                    'operation_params': json.loads(result[3]),
+                    'operation_params': BlobParams(json.loads(result[3]) if result[3] else {}, self.get_blob),
                     'parent_id': result[4],
-                    'edit_chain': json.loads(result[5]) if result[5] else [],
-                    'operation_history': json.loads(result[6]) if result[6] else [],
-                    'create_time': result[7]
-                }
+                    'create_time': result[5]
+                }, lambda key: self._load_lineage(result[0], key))
                 return image_info
                 
             return None
@@ -118,63 +541,227 @@ class ImageStorage:
         except Exception as e:
             logger.error(f"[Doubao] Error getting image info: {e}")
             return None
-        finally:
-            conn.close()
         
-    def validate_image_index(self, img_id: str, index: int) -> tuple:
-        """验证图片序号是否有效
+    def save_session(self, key: str, data: dict):
+        conn = self._get_conn()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO sessions (key, data, updated_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(data), int(time.time())))
+
+    def load_session(self, key: str) -> dict:
+        row = self._get_conn().execute('SELECT data FROM sessions WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_blob(self, blob_hash: str):
+        """读取blob内容
+        Args:
+            blob_hash: blob哈希
+        Returns:
+            解压并反序列化后的值，不存在时返回None
+        """
+        try:
+            c = self._get_conn().cursor()
+            c.execute('SELECT data FROM blobs WHERE hash = ?', (blob_hash,))
+            row = c.fetchone()
+            if not row:
+                logger.warning(f"[Doubao] Blob not found: {blob_hash}")
+                return None
+            return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        except Exception as e:
+            logger.error(f"[Doubao] Error loading blob {blob_hash}: {e}")
+            return None
+
+    def _load_lineage(self, img_id: str, key: str):
+        """物化编辑链或操作历史"""
+        if key == "edit_chain":
+            return self.get_ancestors(img_id)
+        return self.get_history(img_id)
+
+    def _query_ancestors(self, img_id: str) -> list:
+        """查询祖先链(根在前，含自身)"""
+        self._flush_if_pending()
+        c = self._get_conn().cursor()
+        c.execute(_SELECT_ANCESTORS_SQL, (img_id, _MAX_LINEAGE_DEPTH))
+        return c.fetchall()
+
+    def get_ancestors(self, img_id: str) -> list:
+        """获取图片的祖先ID列表
         Args:
             img_id: 图片ID
-            index: 图片序号(1-4)
         Returns:
-            tuple: (是否有效, 错误信息)
+            list: 从最早的祖先到直接父图片的ID，不含自身
         """
         try:
-            image_data = self.get_image(img_id)
-            if not image_data:
-                return False, "找不到对应的图片ID"
-                
-            if not isinstance(index, int):
-                return False, "图片序号必须是数字"
-                
-            if index < 1 or index > 4:
-                return False, "图片序号必须是1-4之间的数字"
-                
-            urls = image_data.get("urls", [])
-            if not urls or len(urls) < index:
-                return False, "图片序号超出范围"
-                
-            return True, None
-            
+            return [row[0] for row in self._query_ancestors(img_id) if row[4] > 0]
         except Exception as e:
-            logger.error(f"[Doubao] Error validating image index: {e}")
-            return False, "验证图片序号时出错"
-            
-    def get_latest_image(self):
-        '''获取最新的一条图片记录'''
+            logger.error(f"[Doubao] Error getting ancestors: {e}")
+            return []
+
+    def get_history(self, img_id: str) -> list:
+        """获取图片的完整操作历史
+        Args:
+            img_id: 图片ID
+        Returns:
+            list: 从最早的祖先到自身的操作记录，每项包含id、type、params、timestamp，
+                params中的大字段在访问时从blob表加载
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, urls, operation_type, operation_params, parent_id, created_at 
-                FROM images 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            ''')
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'id': row[0],
-                    'urls': json.loads(row[1]),
-                    'type': row[2],
-                    'operation_params': json.loads(row[3]) if row[3] else {},
-                    'parent_id': row[4],
-                    'created_at': row[5]
-                }
-            return None
+            return [{
+                'id': row[0],
+                'type': row[1],
+                'params': BlobParams(json.loads(row[2]) if row[2] else {}, self.get_blob),
+                'timestamp': row[3]
+            } for row in self._query_ancestors(img_id)]
         except Exception as e:
-            logger.error(f"[ImageStorage] Error getting latest image: {e}")
-            return None
-        finally:
-            if 'conn' in locals():
-                conn.close() 
\ No newline at end of file
+            logger.error(f"[Doubao] Error getting history: {e}")
+            return []
+
+    def get_descendants(self, img_id: str) -> list:
+        """获取图片的所有后代
+        Args:
+            img_id: 图片ID
+        Returns:
+            list: 按层级排序的后代信息，每项包含id、type、parent_id、create_time、depth
+        """
+        try:
+            self._flush_if_pending()
+            c = self._get_conn().cursor()
+            c.execute(_SELECT_DESCENDANTS_SQL, (img_id, _MAX_LINEAGE_DEPTH))
+            return [{
+                'id': row[0],
+                'type': row[1],
+                'parent_id': row[2],
+                'create_time': row[3],
+                'depth': row[4]
+            } for row in c.fetchall()]
+        except Exception as e:
+            logger.error(f"[Doubao] Error getting descendants: {e}")
+            return []
+
+    def _build_query(self, conversation_id=None, user_id=None, operation_type=None,
+                     start_time=None, end_time=None, limit=20):
+        """构建带过滤条件的查询，按创建时间倒序"""
+        conditions = []
+        params = []
+        if conversation_id is not None:
+            conditions.append("conversation_id = ?")
+            params.append(conversation_id)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if operation_type is not None:
+            conditions.append("operation_type = ?")
+            params.append(operation_type)
+        if start_time is not None:
+            conditions.append("created_at >= ?")
+            params.append(int(start_time))
+        if end_time is not None:
+            conditions.append("created_at < ?")
+            params.append(int(end_time))
+        sql = f"SELECT {_SELECT_SUMMARY_COLUMNS} FROM images"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(int(limit))
+        return sql, params
+
+    def query_images(self, conversation_id=None, user_id=None, operation_type=None,
+                     start_time=None, end_time=None, limit=20) -> list:
+        """按会话、用户、操作类型或时间范围查询图片记录
+        Args:
+            conversation_id: 会话ID
+            user_id: 用户ID
+            operation_type: 操作类型(generate/edit/outpaint/inpaint/koutu)
+            start_time: 起始时间戳(含)
+            end_time: 结束时间戳(不含)
+            limit: 最大返回条数
+        Returns:
+            list: 按创建时间倒序的图片记录，operation_params中的大字段在访问时从blob表加载
+        """
+        try:
+            self._flush_if_pending()
+            sql, params = self._build_query(conversation_id, user_id, operation_type, start_time, end_time, limit)
+            cursor = self._get_conn().cursor()
+            cursor.execute(sql, params)
+            return [{
+                'id': row[0],
+                'urls': json.loads(row[1]),
+                'type': row[2],
+                'operation_params': BlobParams(json.loads(row[3]) if row[3] else {}, self.get_blob),
+                'parent_id': row[4],
+                'created_at': row[5]
+            } for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"[ImageStorage] Error querying images: {e}")
+            return []
+
+    def query_plan(self, **filters) -> list:
+        """获取query_images对应查询的执行计划，用于确认索引是否生效
+        Returns:
+            list: EXPLAIN QUERY PLAN输出的detail列
+        """
+        sql, params = self._build_query(**filters)
+        cursor = self._get_conn().cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def purge_expired(self, batch_size=500, max_batches=None, pause=0.05, vacuum_pages=1000):
+        """删除超过保留天数的记录
+        每批在独立的短事务中执行，批次之间让出锁，不会长时间阻塞写入。
+        Args:
+            batch_size: 每批删除的最大行数
+            max_batches: 最多执行的批次数，None表示直到没有可删除的记录
+            pause: 批次之间的间隔(秒)
+            vacuum_pages: 每次最多归还给文件系统的空闲页数
+        Returns:
+            dict: 删除行数、修复的孤立血缘数、删除的blob数和回收的空间
+        """
+        stats = {"rows_deleted": 0, "orphans_pruned": 0, "blobs_deleted": 0, "sessions_deleted": 0,
+                 "pages_reclaimed": 0, "bytes_reclaimed": 0}
+        if not self.retention_days or self.retention_days <= 0:
+            return stats
+
+        conn = self._get_conn()
+        cutoff = int(time.time()) - int(self.retention_days * 86400)
+        try:
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                # 以WITH开头的DELETE语句rowcount不可用，改用total_changes计算
+                changes_before = conn.total_changes
+                with conn:
+                    conn.execute(_DELETE_EXPIRED_SQL, (cutoff, cutoff, batch_size))
+                deleted = conn.total_changes - changes_before
+                stats["rows_deleted"] += deleted
+                batches += 1
+                if deleted < batch_size or self._retention_stop.is_set():
+                    break
+                time.sleep(pause)
+
+            if stats["rows_deleted"]:
+                with conn:
+                    stats["orphans_pruned"] = conn.execute(_PRUNE_ORPHANS_SQL).rowcount
+                with conn:
+                    conn.execute(_PRUNE_BLOB_LINKS_SQL)
+                    stats["blobs_deleted"] = conn.execute(_PRUNE_BLOBS_SQL).rowcount
+
+            with conn:
+                stats["sessions_deleted"] = conn.execute(
+                    'DELETE FROM sessions WHERE updated_at < ?', (cutoff,)).rowcount
+
+            # PASSIVE检查点不等待读写方，只合并当前可合并的WAL帧
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # execute只执行一步(回收一页)，executescript会执行到完成
+                conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+                free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                stats["pages_reclaimed"] = max(0, free_before - free_after)
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                stats["bytes_reclaimed"] = stats["pages_reclaimed"] * page_size
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        except Exception as e:
+            logger.error(f"[Doubao] Error purging expired images: {e}")
+
+        if stats["rows_deleted"] or stats["sessions_deleted"]:
+            logger.info(f"[Doubao] Retention cleanup: {stats}")
+        return stats
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque, defaultdict
+from common.log import logger
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+    pass
+
+class Job:
+    """排队执行的任务"""
+
+    def __init__(self, job_id, user_id, func, args, kwargs, name=None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name or getattr(func, "__name__", "job")
+        self.enqueue_time = time.time()
+        self.start_time = None
+        self.end_time = None
+
+class JobScheduler:
+    """有界任务调度器
+
+    任务进入FIFO队列，由固定数量的工作线程执行。
+    调度时跳过已达到单用户并发上限的用户，因此单个用户的任务不会占满工作线程。
+    """
+
+    def __init__(self, max_workers=4, per_user_limit=1, max_queue=100):
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._running_by_user = defaultdict(int)
+        self._running = 0
+        self._next_id = 0
+        self._shutdown = False
+
+        # 统计信息
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._max_run = 0.0
+
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"doubao-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, user_id, func, *args, name=None, **kwargs):
+        """提交任务
+        Args:
+            user_id: 提交任务的用户ID，用于单用户并发限制
+            func: 任务函数
+        Returns:
+            int: 提交后的队列深度，包含被单用户并发上限阻塞的任务，不代表执行顺序
+        Raises:
+            QueueFullError: 队列已满
+        """
+        with self._cond:
+            if self._shutdown:
+                raise QueueFullError("scheduler is shut down")
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(f"queue is full ({self.max_queue})")
+
+            self._next_id += 1
+            job = Job(self._next_id, user_id, func, args, kwargs, name)
+            self._queue.append(job)
+            self._submitted += 1
+            depth = len(self._queue)
+            self._max_depth = max(self._max_depth, depth)
+            self._cond.notify_all()
+
+        logger.debug(f"[Doubao] Job {job.job_id} ({job.name}) queued for {user_id}, depth={depth}")
+        return depth
+
+    def _take_job(self):
+        """取出第一个可执行的任务，调用方需持有锁"""
+        for job in self._queue:
+            if self._running_by_user.get(job.user_id, 0) < self.per_user_limit:
+                self._queue.remove(job)
+                return job
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._shutdown:
+                    job = self._take_job()
+                    if job:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                self._running += 1
+                self._running_by_user[job.user_id] += 1
+                job.start_time = time.time()
+
+            success = True
+            try:
+                job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                success = False
+                logger.error(f"[Doubao] Job {job.job_id} ({job.name}) failed: {e}")
+            finally:
+                job.end_time = time.time()
+                with self._cond:
+                    self._running -= 1
+                    self._running_by_user[job.user_id] -= 1
+                    if self._running_by_user[job.user_id] <= 0:
+                        del self._running_by_user[job.user_id]
+
+                    wait_time = job.start_time - job.enqueue_time
+                    run_time = job.end_time - job.start_time
+                    self._total_wait += wait_time
+                    self._max_wait = max(self._max_wait, wait_time)
+                    self._total_run += run_time
+                    self._max_run = max(self._max_run, run_time)
+                    if success:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                    # 用户并发名额释放后，其排队任务可能已可执行
+                    self._cond.notify_all()
+
+            logger.info(f"[Doubao] Job {job.job_id} ({job.name}) finished in {run_time:.2f}s after waiting {wait_time:.2f}s")
+
+    def user_pending(self, user_id):
+        """获取用户排队和运行中的任务数"""
+        with self._cond:
+            queued = sum(1 for job in self._queue if job.user_id == user_id)
+            return queued + self._running_by_user.get(user_id, 0)
+
+    def get_stats(self):
+        """获取调度统计信息
+        Returns:
+            dict: 队列深度、运行数以及等待/执行耗时
+        """
+        with self._cond:
+            finished = self._completed + self._failed
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_depth,
+                "running": self._running,
+                "workers": self.max_workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait": round(self._total_wait / finished, 3) if finished else 0.0,
+                "max_wait": round(self._max_wait, 3),
+                "avg_run": round(self._total_run / finished, 3) if finished else 0.0,
+                "max_run": round(self._max_run, 3)
+            }
+
+    def shutdown(self, wait=True, timeout=None):
+        """停止接收新任务，工作线程在处理完已取出的任务后退出
+        Args:
+            wait: 是否等待工作线程退出
+            timeout: 每个线程的等待超时(秒)
+        """
+        with self._cond:
+            self._shutdown = True
+            dropped = len(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        if dropped:
+            logger.warning(f"[Doubao] Dropped {dropped} queued jobs on shutdown")
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout)
+
+class JobContext:
+    """在工作线程中代替EventContext
+
+    保存原始消息的context和channel，收集处理函数设置的reply，
+    任务结束后由调用方通过channel发送。
+    """
+
+    def __init__(self, e_context):
+        self.econtext = {
+            "context": e_context["context"],
+            "channel": e_context["channel"],
+            "reply": None
+        }
+        self.action = None
+
+    def __getitem__(self, key):
+        return self.econtext[key]
+
+    def __setitem__(self, key, value):
+        self.econtext[key] = value
+
+    def __contains__(self, key):
+        return key in self.econtext
@@ -0,0 +1,161 @@
+import copy
+import threading
+import time
+from .storage_backend import StorageBackend
+
+# 防止异常数据形成环时无限循环
+_MAX_LINEAGE_DEPTH = 1000
+
+class MemoryImageStorage(StorageBackend):
+    """进程内存存储后端
+
+    记录只保存在当前进程中，重启后丢失，用于测试、基准测试或不需要持久化的部署。
+    """
+
+    def __init__(self, retention_days=7):
+        super().__init__(retention_days)
+        self._lock = threading.RLock()
+        self._records = {}  # img_id -> 记录
+        self._children = {}  # parent_id -> set(子记录ID)
+        self._sessions = {}  # key -> (会话状态, 更新时间)
+
+    def store_image(self, img_id: str, image_info: dict):
+        record = {
+            "id": img_id,
+            "urls": list(image_info.get("urls", [])),
+            "type": image_info.get("type"),
+            "operation_params": copy.deepcopy(image_info.get("operation_params", {})),
+            "parent_id": image_info.get("parent_id"),
+            "create_time": image_info.get("create_time", int(time.time())),
+            "user_id": image_info.get("user_id")
+        }
+        with self._lock:
+            if img_id in self._records:
+                raise ValueError(f"image id already exists: {img_id}")
+            self._records[img_id] = record
+            if record["parent_id"]:
+                self._children.setdefault(record["parent_id"], set()).add(img_id)
+
+    def _public(self, record):
+        return {
+            "id": record["id"],
+            "urls": list(record["urls"]),
+            "type": record["type"],
+            "operation_params": copy.deepcopy(record["operation_params"]),
+            "parent_id": record["parent_id"],
+            "create_time": record["create_time"]
+        }
+
+    def get_image(self, img_id: str) -> dict:
+        with self._lock:
+            record = self._records.get(img_id)
+            if record is None:
+                return None
+            image_info = self._public(record)
+        image_info["edit_chain"] = self.get_ancestors(img_id)
+        image_info["operation_history"] = self.get_history(img_id)
+        return image_info
+
+    def _lineage(self, img_id):
+        """祖先链(根在前，含自身)"""
+        chain = []
+        with self._lock:
+            record = self._records.get(img_id)
+            while record is not None and len(chain) <= _MAX_LINEAGE_DEPTH:
+                chain.append(record)
+                record = self._records.get(record["parent_id"]) if record["parent_id"] else None
+        chain.reverse()
+        return chain
+
+    def get_ancestors(self, img_id: str) -> list:
+        return [record["id"] for record in self._lineage(img_id)[:-1]]
+
+    def get_history(self, img_id: str) -> list:
+        return [{
+            "id": record["id"],
+            "type": record["type"],
+            "params": copy.deepcopy(record["operation_params"]),
+            "timestamp": record["create_time"]
+        } for record in self._lineage(img_id)]
+
+    def get_descendants(self, img_id: str) -> list:
+        result = []
+        with self._lock:
+            level = [img_id]
+            depth = 0
+            while level and depth < _MAX_LINEAGE_DEPTH:
+                depth += 1
+                children = [self._records[c] for p in level for c in self._children.get(p, ()) if c in self._records]
+                children.sort(key=lambda r: r["create_time"])
+                result.extend({
+                    "id": r["id"],
+                    "type": r["type"],
+                    "parent_id": r["parent_id"],
+                    "create_time": r["create_time"],
+                    "depth": depth
+                } for r in children)
+                level = [r["id"] for r in children]
+        return result
+
+    def query_images(self, conversation_id=None, user_id=None, operation_type=None,
+                     start_time=None, end_time=None, limit=20) -> list:
+        with self._lock:
+            matched = [
+                r for r in self._records.values()
+                if (conversation_id is None or r["operation_params"].get("conversation_id") == conversation_id)
+                and (user_id is None or r["user_id"] == user_id)
+                and (operation_type is None or r["type"] == operation_type)
+                and (start_time is None or r["create_time"] >= start_time)
+                and (end_time is None or r["create_time"] < end_time)
+            ]
+            matched.sort(key=lambda r: r["create_time"], reverse=True)
+            return [{
+                "id": r["id"],
+                "urls": list(r["urls"]),
+                "type": r["type"],
+                "operation_params": copy.deepcopy(r["operation_params"]),
+                "parent_id": r["parent_id"],
+                "created_at": r["create_time"]
+            } for r in matched[:int(limit)]]
+
+    def save_session(self, key: str, data: dict):
+        with self._lock:
+            self._sessions[key] = (dict(data), int(time.time()))
+
+    def load_session(self, key: str) -> dict:
+        with self._lock:
+            entry = self._sessions.get(key)
+            return dict(entry[0]) if entry else None
+
+    def purge_expired(self, batch_size=500, max_batches=None, pause=0.05, **kwargs) -> dict:
+        stats = {"rows_deleted": 0, "orphans_pruned": 0, "sessions_deleted": 0}
+        if not self.retention_days or self.retention_days <= 0:
+            return stats
+
+        cutoff = int(time.time()) - int(self.retention_days * 86400)
+        with self._lock:
+            # 从新到旧处理，记录的子记录都已处理完，仍有子记录说明被近期编辑引用
+            expired = sorted(
+                (r for r in self._records.values() if r["create_time"] < cutoff),
+                key=lambda r: r["create_time"],
+                reverse=True
+            )
+            for record in expired:
+                if max_batches is not None and stats["rows_deleted"] >= max_batches * batch_size:
+                    break
+                img_id = record["id"]
+                if any(c in self._records for c in self._children.get(img_id, ())):
+                    continue
+                del self._records[img_id]
+                self._children.pop(img_id, None)
+                parent_children = self._children.get(record["parent_id"])
+                if parent_children:
+                    parent_children.discard(img_id)
+                stats["rows_deleted"] += 1
+
+            # 与图片记录保留相同天数
+            expired_sessions = [key for key, (_, updated_at) in self._sessions.items() if updated_at < cutoff]
+            for key in expired_sessions:
+                del self._sessions[key]
+            stats["sessions_deleted"] = len(expired_sessions)
+        return stats
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from common.log import logger
+
+class _PendingEntry:
+    def __init__(self, data, expires_at):
+        self.data = data
+        self.payloads = {}  # name -> (内存中的数据或None, 落盘文件路径或None, 是否为字符串, 大小)
+        self.expires_at = expires_at
+        self.data_size = len(json.dumps(data, ensure_ascii=False, default=str))
+
+    @property
+    def memory_size(self):
+        return self.data_size + sum(size for value, _, _, size in self.payloads.values() if value is not None)
+
+class PendingStore:
+    """多步命令的待处理状态
+
+    以(类型, 用户ID)为键保存"参考图"、"重绘"等命令在等待用户发送图片期间的参数和图片数据。
+    每项在最后一次更新后ttl秒过期，过期项在下次访问时清理并记录，以便提示用户。
+    内存中的数据总量超过上限时按最早过期的顺序淘汰，超过spill_threshold的图片数据写入磁盘。
+    """
+
+    def __init__(self, ttl=600, max_bytes=64 * 1024 * 1024, spill_dir=None, spill_threshold=256 * 1024,
+                 max_expired=1000):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_threshold = spill_threshold
+        self.max_expired = max_expired
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (kind, user_id) -> _PendingEntry，按过期时间先后排列
+        self._memory_bytes = 0
+        self._expired = OrderedDict()  # 已过期但尚未提示用户的键
+        self._stats = {"created": 0, "completed": 0, "expired": 0, "evicted": 0, "spilled": 0}
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            # 上次运行残留的落盘文件已没有对应的状态
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".pending"):
+                    try:
+                        os.remove(os.path.join(self.spill_dir, name))
+                    except OSError:
+                        pass
+
+    def _drop(self, key, reason):
+        """移除一项并删除落盘文件，调用方需持有锁"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._memory_bytes -= entry.memory_size
+        for _, path, _, _ in entry.payloads.values():
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if reason:
+            self._stats[reason] += 1
+        if reason in ("expired", "evicted"):
+            self._expired[key] = time.time()
+            self._expired.move_to_end(key)
+            while len(self._expired) > self.max_expired:
+                self._expired.popitem(last=False)
+            logger.info(f"[Doubao] Pending {key[0]} for {key[1]} {reason}")
+
+    def _sweep(self):
+        """清理过期项并按内存上限淘汰，调用方需持有锁"""
+        now = time.time()
+        # 条目按过期时间排列，只需从头检查
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._drop(key, "expired")
+        while self._memory_bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)), "evicted")
+
+    def _touch(self, key, entry):
+        """刷新过期时间，调用方需持有锁"""
+        entry.expires_at = time.time() + self.ttl
+        self._entries.move_to_end(key)
+
+    def set(self, kind, user_id, data):
+        """开始一个待处理命令，覆盖该用户同类型的旧状态
+        Args:
+            kind: 命令类型，如"reference"、"inpaint"
+            user_id: 用户ID
+            data: 命令参数
+        """
+        key = (kind, user_id)
+        with self._lock:
+            self._sweep()
+            # 重复发送命令时直接替换旧状态
+            self._drop(key, None)
+            entry = _PendingEntry(dict(data), time.time() + self.ttl)
+            self._entries[key] = entry
+            self._memory_bytes += entry.memory_size
+            self._expired.pop(key, None)
+            self._stats["created"] += 1
+            self._sweep()
+
+    def get(self, kind, user_id):
+        """获取待处理命令的参数
+        Returns:
+            dict: 命令参数，不存在或已过期时返回None
+        """
+        key = (kind, user_id)
+        with self._lock:
+            self._sweep()
+            entry = self._entries.get(key)
+            return dict(entry.data) if entry else None
+
+    def put_payload(self, kind, user_id, name, value):
+        """保存图片等较大的数据，超过spill_threshold时写入磁盘
+        Args:
+            name: 数据名称，如"original"
+            value: bytes或字符串
+        Returns:
+            bool: 对应的待处理命令存在时返回True
+        """
+        key = (kind, user_id)
+        is_text = isinstance(value, str)
+        raw = value.encode("utf-8") if is_text else value
+        path = None
+        if self.spill_dir and len(raw) >= self.spill_threshold:
+            path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.pending")
+            try:
+                with open(path, "wb") as f:
+                    f.write(raw)
+            except OSError as e:
+                logger.warning(f"[Doubao] Failed to spill pending payload: {e}")
+                path = None
+
+        with self._lock:
+            self._sweep()
+            entry = self._entries.get(key)
+            if entry is None:
+                if path:
+                    os.remove(path)
+                return False
+            old_size = entry.memory_size
+            old = entry.payloads.get(name)
+            if old and old[1]:
+                try:
+                    os.remove(old[1])
+                except OSError:
+                    pass
+            if path:
+                entry.payloads[name] = (None, path, is_text, len(raw))
+                self._stats["spilled"] += 1
+            else:
+                entry.payloads[name] = (value, None, is_text, len(raw))
+            self._memory_bytes += entry.memory_size - old_size
+            self._touch(key, entry)
+            self._sweep()
+            return key in self._entries
+
+    def has_payload(self, kind, user_id, name):
+        with self._lock:
+            self._sweep()
+            entry = self._entries.get((kind, user_id))
+            return entry is not None and name in entry.payloads
+
+    def get_payload(self, kind, user_id, name):
+        """读取保存的数据，不存在时返回None"""
+        with self._lock:
+            self._sweep()
+            entry = self._entries.get((kind, user_id))
+            payload = entry.payloads.get(name) if entry else None
+        if payload is None:
+            return None
+        value, path, is_text, _ = payload
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+            except OSError as e:
+                logger.error(f"[Doubao] Failed to read pending payload: {e}")
+                return None
+            return raw.decode("utf-8") if is_text else raw
+        return value
+
+    def pop(self, kind, user_id):
+        """命令完成或失败后清除状态"""
+        with self._lock:
+            self._drop((kind, user_id), "completed")
+
+    def pop_expired(self, kind, user_id):
+        """检查该用户的待处理命令是否已过期且尚未提示
+        Returns:
+            bool: 已过期时返回True，同一次过期只返回一次
+        """
+        key = (kind, user_id)
+        with self._lock:
+            self._sweep()
+            return self._expired.pop(key, None) is not None
+
+    def get_stats(self):
+        """获取统计信息
+        Returns:
+            dict: 当前活跃项数、内存占用、各类型数量及累计创建/完成/过期/淘汰/落盘次数
+        """
+        with self._lock:
+            self._sweep()
+            by_kind = {}
+            for kind, _ in self._entries:
+                by_kind[kind] = by_kind.get(kind, 0) + 1
+            stats = dict(self._stats)
+            stats.update({
+                "active": len(self._entries),
+                "by_kind": by_kind,
+                "memory_bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes
+            })
+            return stats
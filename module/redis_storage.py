@@ -0,0 +1,240 @@
+import json
+import time
+from common.log import logger
+from .storage_backend import StorageBackend
+
+# 防止异常数据形成环时无限循环
+_MAX_LINEAGE_DEPTH = 1000
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+class RedisImageStorage(StorageBackend):
+    """基于Redis的网络存储后端
+
+    多个机器人进程共用同一个Redis时可以互相读取对方生成的图片ID。
+    每条记录以JSON字符串存储，另用有序集合按创建时间维护全局、会话、用户和操作类型索引，
+    用集合记录子图片以支持后代查询和保留祖先的过期清理。
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="doubao", retention_days=7, client=None):
+        super().__init__(retention_days)
+        self.prefix = prefix
+        if client is None:
+            # 仅在使用该后端时才需要安装redis
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + tuple(str(p) for p in parts))
+
+    def _index_keys(self, record):
+        keys = [self._key("idx", "time")]
+        conversation_id = (record.get("operation_params") or {}).get("conversation_id")
+        if conversation_id:
+            keys.append(self._key("idx", "conv", conversation_id))
+        if record.get("user_id"):
+            keys.append(self._key("idx", "user", record["user_id"]))
+        if record.get("type"):
+            keys.append(self._key("idx", "type", record["type"]))
+        return keys
+
+    def store_image(self, img_id: str, image_info: dict):
+        record = {
+            "id": img_id,
+            "urls": image_info.get("urls", []),
+            "type": image_info.get("type"),
+            "operation_params": image_info.get("operation_params", {}),
+            "parent_id": image_info.get("parent_id"),
+            "create_time": image_info.get("create_time", int(time.time())),
+            "user_id": image_info.get("user_id")
+        }
+        # NX保证多个进程之间图片ID不会互相覆盖
+        if not self.client.set(self._key("img", img_id), json.dumps(record), nx=True):
+            raise ValueError(f"image id already exists: {img_id}")
+
+        pipe = self.client.pipeline()
+        if record["parent_id"]:
+            pipe.sadd(self._key("children", record["parent_id"]), img_id)
+        for key in self._index_keys(record):
+            pipe.zadd(key, {img_id: record["create_time"]})
+        pipe.execute()
+
+    def _load(self, img_id):
+        data = self.client.get(self._key("img", img_id))
+        return json.loads(data) if data else None
+
+    def _load_many(self, img_ids):
+        if not img_ids:
+            return []
+        values = self.client.mget([self._key("img", i) for i in img_ids])
+        return [json.loads(v) if v else None for v in values]
+
+    def get_image(self, img_id: str) -> dict:
+        try:
+            record = self._load(img_id)
+        except Exception as e:
+            logger.error(f"[Doubao] Error getting image info: {e}")
+            return None
+        if record is None:
+            return None
+        record.pop("user_id", None)
+        record["edit_chain"] = self.get_ancestors(img_id)
+        record["operation_history"] = self.get_history(img_id)
+        return record
+
+    def _lineage(self, img_id):
+        """祖先链(根在前，含自身)"""
+        chain = []
+        record = self._load(img_id)
+        while record is not None and len(chain) <= _MAX_LINEAGE_DEPTH:
+            chain.append(record)
+            record = self._load(record["parent_id"]) if record.get("parent_id") else None
+        chain.reverse()
+        return chain
+
+    def get_ancestors(self, img_id: str) -> list:
+        try:
+            return [record["id"] for record in self._lineage(img_id)[:-1]]
+        except Exception as e:
+            logger.error(f"[Doubao] Error getting ancestors: {e}")
+            return []
+
+    def get_history(self, img_id: str) -> list:
+        try:
+            return [{
+                "id": record["id"],
+                "type": record["type"],
+                "params": record.get("operation_params") or {},
+                "timestamp": record["create_time"]
+            } for record in self._lineage(img_id)]
+        except Exception as e:
+            logger.error(f"[Doubao] Error getting history: {e}")
+            return []
+
+    def get_descendants(self, img_id: str) -> list:
+        result = []
+        try:
+            level = [img_id]
+            depth = 0
+            while level and depth < _MAX_LINEAGE_DEPTH:
+                depth += 1
+                pipe = self.client.pipeline()
+                for parent in level:
+                    pipe.smembers(self._key("children", parent))
+                child_ids = [_text(c) for members in pipe.execute() for c in members]
+                children = sorted((r for r in self._load_many(child_ids) if r), key=lambda r: r["create_time"])
+                result.extend({
+                    "id": r["id"],
+                    "type": r["type"],
+                    "parent_id": r["parent_id"],
+                    "create_time": r["create_time"],
+                    "depth": depth
+                } for r in children)
+                level = [r["id"] for r in children]
+        except Exception as e:
+            logger.error(f"[Doubao] Error getting descendants: {e}")
+        return result
+
+    def query_images(self, conversation_id=None, user_id=None, operation_type=None,
+                     start_time=None, end_time=None, limit=20) -> list:
+        # 选用最具选择性的索引，其余条件在取回后过滤
+        if conversation_id is not None:
+            index = self._key("idx", "conv", conversation_id)
+        elif user_id is not None:
+            index = self._key("idx", "user", user_id)
+        elif operation_type is not None:
+            index = self._key("idx", "type", operation_type)
+        else:
+            index = self._key("idx", "time")
+        max_score = f"({int(end_time)}" if end_time is not None else "+inf"
+        min_score = int(start_time) if start_time is not None else "-inf"
+
+        result = []
+        offset = 0
+        page = max(int(limit), 1) * 2
+        try:
+            while len(result) < limit:
+                ids = [_text(i) for i in self.client.zrevrangebyscore(index, max_score, min_score, start=offset, num=page)]
+                if not ids:
+                    break
+                offset += len(ids)
+                for r in self._load_many(ids):
+                    if r is None:
+                        continue
+                    if conversation_id is not None and (r.get("operation_params") or {}).get("conversation_id") != conversation_id:
+                        continue
+                    if user_id is not None and r.get("user_id") != user_id:
+                        continue
+                    if operation_type is not None and r.get("type") != operation_type:
+                        continue
+                    result.append({
+                        "id": r["id"],
+                        "urls": r["urls"],
+                        "type": r["type"],
+                        "operation_params": r.get("operation_params") or {},
+                        "parent_id": r.get("parent_id"),
+                        "created_at": r["create_time"]
+                    })
+                    if len(result) >= limit:
+                        break
+        except Exception as e:
+            logger.error(f"[Doubao] Error querying images: {e}")
+        return result
+
+    def save_session(self, key: str, data: dict):
+        # 会话与图片记录保留相同天数，到期由Redis自动删除
+        ttl = int(self.retention_days * 86400) if self.retention_days and self.retention_days > 0 else None
+        self.client.set(self._key("session", key), json.dumps(data), ex=ttl)
+
+    def load_session(self, key: str) -> dict:
+        data = self.client.get(self._key("session", key))
+        return json.loads(data) if data else None
+
+    def purge_expired(self, batch_size=500, max_batches=None, pause=0.05, **kwargs) -> dict:
+        stats = {"rows_deleted": 0, "orphans_pruned": 0}
+        if not self.retention_days or self.retention_days <= 0:
+            return stats
+
+        cutoff = int(time.time()) - int(self.retention_days * 86400)
+        try:
+            # 从新到旧处理，记录的子记录都已处理完，仍有子记录说明被近期编辑引用
+            expired = [_text(i) for i in self.client.zrevrangebyscore(self._key("idx", "time"), f"({cutoff}", "-inf")]
+            batches = 0
+            for start in range(0, len(expired), batch_size):
+                if max_batches is not None and batches >= max_batches:
+                    break
+                if self._retention_stop.is_set() and batches:
+                    break
+                for img_id in expired[start:start + batch_size]:
+                    children = [_text(c) for c in self.client.smembers(self._key("children", img_id))]
+                    if children and self.client.exists(*[self._key("img", c) for c in children]):
+                        continue
+                    record = self._load(img_id)
+                    pipe = self.client.pipeline()
+                    pipe.delete(self._key("img", img_id), self._key("children", img_id))
+                    if record:
+                        if record.get("parent_id"):
+                            pipe.srem(self._key("children", record["parent_id"]), img_id)
+                        for key in self._index_keys(record):
+                            pipe.zrem(key, img_id)
+                    else:
+                        pipe.zrem(self._key("idx", "time"), img_id)
+                    pipe.execute()
+                    stats["rows_deleted"] += 1
+                batches += 1
+                time.sleep(pause)
+        except Exception as e:
+            logger.error(f"[Doubao] Error purging expired images: {e}")
+
+        if stats["rows_deleted"]:
+            logger.info(f"[Doubao] Retention cleanup: {stats}")
+        return stats
+
+    def close(self):
+        super().close()
+        try:
+            self.client.close()
+        except Exception:
+            pass
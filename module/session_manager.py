@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from common.log import logger
+
+class ConversationSession:
+    """单个用户或群聊对应的豆包会话状态"""
+
+    def __init__(self, key, conversation_id=None, section_id=None, reply_id=None, message_count=0):
+        self.key = key
+        self.conversation_id = conversation_id
+        self.section_id = section_id
+        self.reply_id = reply_id
+        self.message_count = message_count
+        self.last_active = time.time()
+        # 保护会话状态的并发修改，不同会话之间互不阻塞
+        self.lock = threading.RLock()
+
+    def reset(self):
+        self.conversation_id = None
+        self.section_id = None
+        self.reply_id = None
+        self.message_count = 0
+
+    def to_dict(self):
+        return {
+            "conversation_id": self.conversation_id,
+            "section_id": self.section_id,
+            "reply_id": self.reply_id,
+            "message_count": self.message_count
+        }
+
+class SessionManager:
+    """按用户/群聊管理会话
+
+    每个会话键对应独立的conversation_id/section_id/reply_id，内存中按LRU保留，
+    空闲超时或超过数量上限时淘汰，状态保存在存储后端，淘汰或重启后可恢复。
+    同一会话的消息数达到rotate_after后自动开始新的上游会话，避免会话无限增长。
+    """
+
+    def __init__(self, storage=None, max_sessions=1000, idle_timeout=3600, rotate_after=50):
+        self.storage = storage
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.rotate_after = rotate_after
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # key -> ConversationSession，按最近使用排序
+
+    def _load(self, key):
+        """从存储后端恢复会话"""
+        data = None
+        if self.storage is not None:
+            try:
+                data = self.storage.load_session(key)
+            except Exception as e:
+                logger.warning(f"[Doubao] Failed to load session {key}: {e}")
+        if data:
+            return ConversationSession(
+                key,
+                conversation_id=data.get("conversation_id"),
+                section_id=data.get("section_id"),
+                reply_id=data.get("reply_id"),
+                message_count=data.get("message_count", 0)
+            )
+        return ConversationSession(key)
+
+    def _save(self, session):
+        if self.storage is None:
+            return
+        try:
+            self.storage.save_session(session.key, session.to_dict())
+        except Exception as e:
+            logger.warning(f"[Doubao] Failed to save session {session.key}: {e}")
+
+    def _evict(self):
+        """淘汰空闲超时和超出数量上限的会话，调用方需持有锁"""
+        now = time.time()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - session.last_active > self.idle_timeout:
+                del self._sessions[key]
+            else:
+                break
+
+    def get(self, key):
+        """获取会话，内存中没有时从存储后端恢复
+        Args:
+            key: 会话键，由用户或群聊ID构成
+        Returns:
+            ConversationSession: 会话对象
+        """
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                # 在管理器锁内加载并放入，避免同一会话并发的首条消息各自创建会话对象
+                session = self._load(key)
+                self._sessions[key] = session
+                self._evict()
+            else:
+                self._sessions.move_to_end(key)
+
+        with session.lock:
+            session.last_active = time.time()
+            if self.rotate_after and session.conversation_id and session.message_count >= self.rotate_after:
+                logger.info(f"[Doubao] Session {key} reached {session.message_count} messages, starting a new conversation")
+                session.reset()
+                self._save(session)
+        return session
+
+    def update(self, session, conversation_id=None, section_id=None, reply_id=None):
+        """记录一次请求的结果并持久化
+        Args:
+            session: 会话对象
+            conversation_id: 响应中的会话ID
+            section_id: 响应中的分段ID
+            reply_id: 响应中的回复ID
+        """
+        with session.lock:
+            if conversation_id and conversation_id != session.conversation_id:
+                session.conversation_id = conversation_id
+                session.message_count = 0
+            if section_id:
+                session.section_id = section_id
+            if reply_id:
+                session.reply_id = reply_id
+            session.message_count += 1
+            session.last_active = time.time()
+            self._save(session)
+
+    def reset(self, key):
+        """清空会话，下一次请求会创建新的上游会话"""
+        session = self.get(key)
+        with session.lock:
+            session.reset()
+            self._save(session)
+        return session
+
+    def get_stats(self):
+        """获取会话统计信息"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions
+            }
@@ -0,0 +1,112 @@
+import json
+import logging
+from common.log import logger
+
+class StreamEvent:
+    """SSE流中解析出的事件"""
+    CONVERSATION = "conversation"  # 会话信息(conversation_id/section_id)
+    REPLY = "reply"  # reply_id
+    IMAGE = "image"  # 单张生成图片
+
+    def __init__(self, type, **fields):
+        self.type = type
+        self.fields = fields
+
+    def __getattr__(self, name):
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return f"StreamEvent({self.type}, {self.fields})"
+
+class CompletionStreamParser:
+    """/samantha/chat/completion 流式响应的增量解析器
+
+    每次输入一行，返回该行产生的事件。与会话信息和图片无关的行在
+    解码JSON前即被跳过；同一图片URL只产生一次事件。
+    解析过程中同时累积与ApiClient.send_request返回值相同结构的结果。
+    """
+
+    def __init__(self):
+        self.result = {
+            "urls": [],
+            "conversation_id": None,
+            "section_id": None,
+            "reply_id": None
+        }
+        self._seen_urls = set()
+
+    def feed(self, line):
+        """解析一行数据
+        Args:
+            line: 原始行数据(bytes或str)
+        Returns:
+            list: 本行产生的StreamEvent列表
+        """
+        if not line:
+            return []
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        if not line.startswith(b"data:"):
+            return []
+        # 只有会话信息和图片消息需要解析，其余事件(文本增量、心跳等)直接跳过
+        if b"conversation_id" not in line and b"image_raw" not in line:
+            return []
+
+        events = []
+        try:
+            data = json.loads(line[5:])
+            event_data = json.loads(data.get("event_data", "{}"))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[Doubao] Response event_data: {event_data}")
+
+            if "conversation_id" in event_data:
+                self.result["conversation_id"] = event_data["conversation_id"]
+                self.result["section_id"] = event_data.get("section_id")
+                logger.info(f"[Doubao] Found conversation info: id={self.result['conversation_id']}, section={self.result['section_id']}")
+                events.append(StreamEvent(
+                    StreamEvent.CONVERSATION,
+                    conversation_id=self.result["conversation_id"],
+                    section_id=self.result["section_id"]
+                ))
+                # 从event_data中提取reply_id
+                if "reply_id" in event_data:
+                    self.result["reply_id"] = event_data["reply_id"]
+                    logger.info(f"[Doubao] Found reply_id: {self.result['reply_id']}")
+                    events.append(StreamEvent(StreamEvent.REPLY, reply_id=self.result["reply_id"]))
+
+            message = event_data.get("message")
+            if message and message.get("content_type") == 2010:  # 图片响应
+                content = json.loads(message["content"])
+                for img_data in content.get("data", []):
+                    if "image_raw" not in img_data:
+                        continue
+                    url = img_data["image_raw"]["url"]
+                    if url in self._seen_urls:
+                        continue
+                    self._seen_urls.add(url)
+                    self.result["urls"].append(url)
+                    logger.info(f"[Doubao] Found image URL: {url}")
+                    events.append(StreamEvent(
+                        StreamEvent.IMAGE,
+                        url=url,
+                        index=len(self.result["urls"]) - 1,
+                        data=img_data
+                    ))
+
+        except json.JSONDecodeError:
+            return events
+        except Exception as e:
+            logger.error(f"[Doubao] Error processing response: {e}")
+        return events
+
+    def parse(self, lines):
+        """逐行解析，按到达顺序产出事件
+        Args:
+            lines: 可迭代的行数据，如response.iter_lines()
+        """
+        for line in lines:
+            for event in self.feed(line):
+                yield event
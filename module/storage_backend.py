@@ -0,0 +1,176 @@
+import os
+import threading
+from common.log import logger
+
+class StorageBackend:
+    """图片记录存储后端基类
+
+    插件只通过这里定义的接口读写图片记录，具体实现可以是本地SQLite文件、
+    进程内存或多个实例共享的网络键值存储，由config.json中的storage.backend选择。
+    子类需实现store_image、get_image、血缘查询、query_images和purge_expired，
+    序号校验、最新记录查询和后台清理线程由基类统一提供。
+    """
+
+    def __init__(self, retention_days=7):
+        self.retention_days = retention_days
+        self._retention_thread = None
+        self._retention_stop = threading.Event()
+
+    def store_image(self, img_id: str, image_info: dict):
+        """存储图片信息
+        Args:
+            img_id: 图片ID
+            image_info: 图片信息，包含urls、type、operation_params、parent_id、create_time、user_id
+        """
+        raise NotImplementedError
+
+    def get_image(self, img_id: str) -> dict:
+        """获取图片信息，不存在时返回None
+        返回的记录包含id、urls、type、operation_params、parent_id、create_time，
+        edit_chain和operation_history可按需延迟加载
+        """
+        raise NotImplementedError
+
+    def get_ancestors(self, img_id: str) -> list:
+        """获取从最早的祖先到直接父图片的ID列表，不含自身"""
+        raise NotImplementedError
+
+    def get_history(self, img_id: str) -> list:
+        """获取从最早的祖先到自身的操作记录，每项包含id、type、params、timestamp"""
+        raise NotImplementedError
+
+    def get_descendants(self, img_id: str) -> list:
+        """获取按层级排序的后代，每项包含id、type、parent_id、create_time、depth"""
+        raise NotImplementedError
+
+    def query_images(self, conversation_id=None, user_id=None, operation_type=None,
+                     start_time=None, end_time=None, limit=20) -> list:
+        """按条件查询图片记录，按创建时间倒序，每项包含id、urls、type、operation_params、parent_id、created_at"""
+        raise NotImplementedError
+
+    def purge_expired(self, batch_size=500, max_batches=None, pause=0.05, **kwargs) -> dict:
+        """删除超过保留天数且不再被近期记录作为祖先引用的记录
+        Returns:
+            dict: 至少包含rows_deleted
+        """
+        raise NotImplementedError
+
+    def save_session(self, key: str, data: dict):
+        """保存会话状态
+        Args:
+            key: 会话键
+            data: 会话状态，包含conversation_id、section_id、reply_id、message_count
+        """
+        raise NotImplementedError
+
+    def load_session(self, key: str) -> dict:
+        """读取会话状态，不存在时返回None"""
+        raise NotImplementedError
+
+    def flush(self):
+        """提交尚未落盘的写入，默认实现无需处理"""
+
+    def close(self):
+        """释放资源"""
+        self.stop_retention_worker()
+
+    def get_latest_image(self, conversation_id=None, user_id=None, operation_type=None):
+        '''获取最新的一条图片记录，可按会话、用户或操作类型过滤'''
+        images = self.query_images(conversation_id, user_id, operation_type, limit=1)
+        return images[0] if images else None
+
+    def validate_image_index(self, img_id: str, index: int) -> tuple:
+        """验证图片序号是否有效
+        Args:
+            img_id: 图片ID
+            index: 图片序号(1-4)
+        Returns:
+            tuple: (是否有效, 错误信息)
+        """
+        try:
+            image_data = self.get_image(img_id)
+            if not image_data:
+                return False, "找不到对应的图片ID"
+
+            if not isinstance(index, int):
+                return False, "图片序号必须是数字"
+
+            if index < 1 or index > 4:
+                return False, "图片序号必须是1-4之间的数字"
+
+            urls = image_data.get("urls", [])
+            if not urls or len(urls) < index:
+                return False, "图片序号超出范围"
+
+            return True, None
+
+        except Exception as e:
+            logger.error(f"[Doubao] Error validating image index: {e}")
+            return False, "验证图片序号时出错"
+
+    def start_retention_worker(self, interval=3600, batch_size=500):
+        """启动后台清理线程
+        Args:
+            interval: 清理间隔(秒)
+            batch_size: 每批删除的最大行数
+        """
+        if self._retention_thread and self._retention_thread.is_alive():
+            return
+        self._retention_stop.clear()
+
+        def _run():
+            while not self._retention_stop.is_set():
+                try:
+                    self.purge_expired(batch_size=batch_size)
+                except Exception as e:
+                    logger.error(f"[Doubao] Retention cleanup failed: {e}")
+                self._retention_stop.wait(interval)
+
+        self._retention_thread = threading.Thread(target=_run, name="doubao-retention", daemon=True)
+        self._retention_thread.start()
+
+    def stop_retention_worker(self, timeout=5):
+        """停止后台清理线程"""
+        self._retention_stop.set()
+        if self._retention_thread:
+            self._retention_thread.join(timeout)
+            self._retention_thread = None
+
+
+def create_image_storage(storage_config: dict, storage_dir: str) -> StorageBackend:
+    """按配置创建存储后端
+    Args:
+        storage_config: config.json中的storage配置
+        storage_dir: 本地存储目录，sqlite后端的数据库文件位于其中
+    Returns:
+        StorageBackend: 存储后端实例
+    """
+    backend = storage_config.get("backend", "sqlite")
+    retention_days = storage_config.get("retention_days", 7)
+
+    if backend == "memory":
+        from .memory_storage import MemoryImageStorage
+        return MemoryImageStorage(retention_days=retention_days)
+
+    if backend == "redis":
+        from .redis_storage import RedisImageStorage
+        redis_config = storage_config.get("redis", {})
+        return RedisImageStorage(
+            url=redis_config.get("url", "redis://localhost:6379/0"),
+            prefix=redis_config.get("prefix", "doubao"),
+            retention_days=retention_days
+        )
+
+    if backend != "sqlite":
+        raise ValueError(f"unknown storage backend: {backend}")
+
+    from .image_storage import ImageStorage
+    return ImageStorage(
+        os.path.join(storage_dir, "images.db"),
+        retention_days=retention_days,
+        busy_timeout=storage_config.get("busy_timeout", 5.0),
+        cache_size_kb=storage_config.get("cache_size_kb", 8192),
+        durability=storage_config.get("durability", "immediate"),
+        batch_max_delay=storage_config.get("batch_max_delay", 0.2),
+        batch_size=storage_config.get("batch_size", 100)
+    )
@@ -0,0 +1,107 @@
+import io
+import os
+import threading
+import uuid
+from common.log import logger
+
+class _TempFileHandle(io.BufferedReader):
+    """临时文件的只读句柄，关闭时释放一次引用"""
+
+    def __init__(self, registry, path):
+        super().__init__(io.FileIO(path, "rb"))
+        self._registry = registry
+        self._path = path
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._registry.release(self._path)
+
+class TempFileRegistry:
+    """按请求管理的临时文件
+
+    每个文件使用唯一文件名，引用计数归零时立即删除，不影响其他请求仍在使用的文件。
+    只删除自己创建的文件，启动时清理上次运行残留的同类文件。
+    """
+
+    # 文件名前缀，用于识别本类创建的文件
+    PREFIX = "tmp_"
+
+    def __init__(self, temp_dir):
+        self.temp_dir = temp_dir
+        self._lock = threading.Lock()
+        self._refs = {}  # path -> 引用计数
+        os.makedirs(self.temp_dir, exist_ok=True)
+        for name in os.listdir(self.temp_dir):
+            if name.startswith(self.PREFIX):
+                try:
+                    os.remove(os.path.join(self.temp_dir, name))
+                except OSError:
+                    pass
+
+    def create(self, data, prefix="image", ext=".jpg"):
+        """写入数据并返回文件路径，初始引用计数为1
+        Args:
+            data: 文件内容
+            prefix: 文件名前缀
+            ext: 扩展名
+        Returns:
+            str: 文件路径
+        """
+        path = os.path.join(self.temp_dir, f"{self.PREFIX}{prefix}_{uuid.uuid4().hex}{ext}")
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self._refs[path] = 1
+        return path
+
+    def acquire(self, path):
+        """增加一次引用"""
+        with self._lock:
+            if path not in self._refs:
+                raise KeyError(path)
+            self._refs[path] += 1
+
+    def release(self, path):
+        """释放一次引用，归零时删除文件"""
+        with self._lock:
+            count = self._refs.get(path)
+            if count is None:
+                return
+            if count > 1:
+                self._refs[path] = count - 1
+                return
+            del self._refs[path]
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"[Doubao] Failed to remove temp file {path}: {e}")
+
+    def open(self, data, prefix="image", ext=".jpg"):
+        """写入数据并返回只读句柄，句柄关闭后文件被删除
+        Returns:
+            file: 可通过name属性获取路径的文件对象
+        """
+        path = self.create(data, prefix, ext)
+        try:
+            return _TempFileHandle(self, path)
+        except OSError:
+            self.release(path)
+            raise
+
+    def close(self):
+        """删除所有仍未释放的文件，之后句柄关闭时不再重复删除"""
+        with self._lock:
+            paths = list(self._refs)
+            self._refs.clear()
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"[Doubao] Failed to remove temp file {path}: {e}")
+        if paths:
+            logger.info(f"[Doubao] Removed {len(paths)} unreleased temp files")
+
+    def get_stats(self):
+        with self._lock:
+            return {"files": len(self._refs), "refs": sum(self._refs.values())}
@@ -1,12 +1,13 @@
-import requests
 import logging
 import threading
 import time
 from common.log import logger
+from .http_session import HttpSessionPool
 
 class TokenManager:
-    def __init__(self, config):
+    def __init__(self, config, http_pool=None):
         self.config = config
+        self.http_pool = http_pool or HttpSessionPool(config)
         self._lock = threading.Lock()
         self._last_refresh_time = 0
         self._refresh_interval = 1800  # 30分钟刷新一次
@@ -68,7 +69,7 @@ class TokenManager:
                 headers = self.get_headers()
                 params = self.get_request_params()
                 
-                response = requests.get(
+                response = self.http_pool.get(
                     "https://www.doubao.com/chat/create-image",
                     headers=headers,
                     params=params
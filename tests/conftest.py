@@ -0,0 +1,54 @@
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import plugin_env
+
+plugin_env.install()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive，用于检查连接复用
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            responses = server.routes.get(self.path) or [(404, b"", {})]
+            status, body, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.send_response(status)
+        headers = dict(headers)
+        headers.setdefault("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            if value is not None:  # None表示不发送该响应头
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """本地HTTP服务
+
+    server.routes[path]为(状态码, 内容, 响应头)列表，依次返回，最后一项重复使用；
+    server.hits记录各路径的请求次数，server.url(path)返回完整地址。
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.routes = {}
+    server.hits = {}
+    server.url = lambda path: f"http://127.0.0.1:{server.server_address[1]}{path}"
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join(timeout=5)
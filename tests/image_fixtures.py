@@ -0,0 +1,92 @@
+"""测试和基准脚本共用的合成图片，需要numpy和opencv-python"""
+import base64
+
+def _encode_jpeg(image, quality=92):
+    import cv2
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return buffer.tobytes()
+
+def make_photo(width, height, seed=0):
+    """平滑的彩色图像，模拟照片内容
+    Returns:
+        numpy.ndarray: BGR图像
+    """
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (max(2, height // 40), max(2, width // 40), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    return cv2.GaussianBlur(image, (0, 0), 3)
+
+def make_mark_fixture(width, height, seed=0):
+    """原图、红圈标记图、红色涂抹图及各自的真实标记区域
+    Returns:
+        dict: original/circle/brush为JPEG字节，circle_region为圈内区域，brush_region为涂抹线条区域
+    """
+    import cv2
+    import numpy as np
+    # 提亮底图，保证红色标记与底图的灰度差明显，标记线条连续
+    base = (140 + make_photo(width, height, seed) * (115 / 255)).astype(np.uint8)
+    center, axes, angle = (width // 2, height // 2), (width // 5, height // 6), 15
+
+    circle = base.copy()
+    cv2.ellipse(circle, center, axes, angle, 0, 360, (0, 0, 255), max(4, width // 250))
+    circle_region = np.zeros((height, width), np.uint8)
+    cv2.ellipse(circle_region, center, axes, angle, 0, 360, 255, -1)
+
+    brush = base.copy()
+    thickness = max(8, width // 100)
+    cv2.line(brush, (width // 4, height // 4), (width // 2, height // 3), (0, 0, 255), thickness)
+    brush_region = np.zeros((height, width), np.uint8)
+    cv2.line(brush_region, (width // 4, height // 4), (width // 2, height // 3), 255, thickness)
+
+    return {
+        "original": _encode_jpeg(base),
+        "circle": _encode_jpeg(circle),
+        "brush": _encode_jpeg(brush),
+        "circle_region": circle_region,
+        "brush_region": brush_region
+    }
+
+def decode_mask(data_url):
+    """data URL格式的蒙版解码为二值数组"""
+    import cv2
+    import numpy as np
+    data = base64.b64decode(data_url.split(",", 1)[1])
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE) > 127
+
+def iou(a, b):
+    """两个二值蒙版的交并比"""
+    a = a > 0
+    b = b > 0
+    union = (a | b).sum()
+    return float((a & b).sum() / union) if union else 1.0
+
+def make_color_fixtures():
+    """主色调测试图片：纯色块、灰度渐变、分层风景和平滑随机图
+    Returns:
+        dict: 名称 -> BGR图像
+    """
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(1)
+    fixtures = {}
+
+    blocks = np.zeros((300, 400, 3), np.uint8)
+    blocks[:, :200] = (200, 30, 30)
+    blocks[:, 200:320] = (20, 180, 40)
+    blocks[:, 320:] = (240, 240, 240)
+    fixtures["blocks"] = np.clip(blocks + rng.normal(0, 8, blocks.shape), 0, 255).astype(np.uint8)
+
+    fixtures["gray"] = np.tile(np.linspace(0, 255, 300).astype(np.uint8)[None, :, None], (200, 1, 3))
+
+    landscape = np.zeros((300, 400, 3), np.uint8)
+    landscape[:125] = (235, 180, 120)
+    landscape[125:225] = (60, 120, 60)
+    landscape[225:] = (40, 60, 90)
+    landscape = np.clip(landscape + rng.normal(0, 15, landscape.shape), 0, 255).astype(np.uint8)
+    fixtures["landscape"] = cv2.GaussianBlur(landscape, (0, 0), 2)
+
+    fixtures["smooth"] = make_photo(400, 300, seed=3)
+    return fixtures
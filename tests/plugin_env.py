@@ -0,0 +1,49 @@
+"""测试和基准脚本共用的导入环境
+
+插件目录本身是一个包(父包由chatgpt-on-wechat提供)，这里把它注册为独立的包名，
+只导入module下的模块，不执行__init__.py和doubao.py。
+单独运行时宿主程序的common.log不可用，使用标准logging代替。
+"""
+import importlib.util
+import logging
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "doubao_plugin"
+
+def _install_logger():
+    if "common.log" in sys.modules:
+        return
+    try:
+        if importlib.util.find_spec("common.log") is not None:
+            return
+    except ImportError:
+        pass
+    common = sys.modules.setdefault("common", types.ModuleType("common"))
+    common.__path__ = getattr(common, "__path__", [])
+    log = types.ModuleType("common.log")
+    log.logger = logging.getLogger("doubao")
+    common.log = log
+    sys.modules["common.log"] = log
+
+def install():
+    """注册插件包并补齐宿主依赖，可重复调用
+    Returns:
+        str: 插件包名，模块通过f"{PACKAGE}.module.xxx"导入
+    """
+    _install_logger()
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+    return PACKAGE
+
+def load_module(name):
+    """导入module下的模块
+    Args:
+        name: 模块名，如"image_storage"
+    """
+    install()
+    return importlib.import_module(f"{PACKAGE}.module.{name}")
@@ -0,0 +1,98 @@
+import pytest
+
+import plugin_env
+from test_sse_parser import CONVERSATION_LINE, _image_line
+
+pytest.importorskip("requests")
+
+api_client = plugin_env.load_module("api_client")
+
+class _Response:
+    def __init__(self, lines, status=200):
+        self.lines = lines
+        self.status = status
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def json(self):
+        return {"ok": True}
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _Pool:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return self.response
+
+class _TokenManager:
+    config = {}
+
+def _client(response):
+    pool = _Pool(response)
+    return api_client.ApiClient(_TokenManager(), http_pool=pool), pool
+
+def test_send_request_streams_through_iter_completion():
+    response = _Response([CONVERSATION_LINE, _image_line("https://a/1.png")])
+    client, pool = _client(response)
+    events = []
+
+    result = client.send_request({"messages": [{"content": {"text": "cat"}}]}, on_event=events.append)
+
+    assert result["urls"] == ["https://a/1.png"]
+    assert result["conversation_id"] == "c1"
+    assert [e.type for e in events] == ["conversation", "reply", "image"]
+    assert pool.calls[0][1]["stream"] is True
+    # 请求前content被序列化为JSON字符串
+    assert pool.calls[0][1]["json"]["messages"][0]["content"] == '{"text": "cat"}'
+    assert response.closed
+
+def test_iter_completion_exposes_summary_through_parser():
+    client, _ = _client(_Response([_image_line("https://a/1.png", "https://a/2.png")]))
+    parser = api_client.CompletionStreamParser()
+    assert [e.url for e in client.iter_completion({"messages": [{"content": "x"}]}, parser)] == ["https://a/1.png", "https://a/2.png"]
+    assert parser.result["urls"] == ["https://a/1.png", "https://a/2.png"]
+
+def test_iter_completion_closes_response_when_abandoned():
+    response = _Response([_image_line("https://a/1.png"), _image_line("https://a/2.png")])
+    client, _ = _client(response)
+    events = client.iter_completion({"messages": [{"content": "x"}]})
+    next(events)
+    events.close()
+    assert response.closed
+
+def test_send_request_failures_return_none_and_close():
+    response = _Response([CONVERSATION_LINE], status=500)
+    client, _ = _client(response)
+    assert client.send_request({"messages": [{"content": "x"}]}) is None
+    assert response.closed
+
+    def failing_callback(event):
+        raise ValueError("callback bug")
+    response = _Response([CONVERSATION_LINE, _image_line("https://a/1.png")])
+    client, _ = _client(response)
+    # 回调异常不影响流的解析
+    assert client.send_request({"messages": [{"content": "x"}]}, on_event=failing_callback)["urls"] == ["https://a/1.png"]
+
+def test_non_stream_endpoint_returns_json():
+    response = _Response([])
+    client, pool = _client(response)
+    assert client.send_request({}, "/samantha/skill/pack") == {"ok": True}
+    assert "stream" not in pool.calls[0][1]
+    assert response.closed
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+import plugin_env
+
+pytest.importorskip("requests")
+
+async_api_client = plugin_env.load_module("async_api_client")
+
+def test_close_joins_thread_and_closes_loop():
+    client = async_api_client.BlockingApiClient(token_manager=None)
+    assert client.submit(asyncio.sleep(0, result=42)).result(timeout=5) == 42
+
+    client.close()
+    assert not client._thread.is_alive()
+    assert client._loop.is_closed()
+    # 重复关闭不报错
+    client.close()
+
+def test_close_cancels_unfinished_requests():
+    client = async_api_client.BlockingApiClient(token_manager=None)
+    cancelled = []
+
+    async def slow_request():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    future = client.submit(slow_request())
+    client.close(timeout=2)
+
+    assert client._loop.is_closed()
+    assert cancelled == [True]
+    assert future.cancelled()
+
+def test_close_leaves_blocked_loop_running():
+    client = async_api_client.BlockingApiClient(token_manager=None)
+    release = threading.Event()
+
+    async def blocking():
+        release.wait()  # 阻塞事件循环线程
+
+    client.submit(blocking())
+    client.close(timeout=0.2)
+    # 线程未退出时不关闭事件循环
+    assert not client._loop.is_closed()
+    release.set()
+    client._thread.join(timeout=5)
+    assert not client._thread.is_alive()
+    client._loop.close()
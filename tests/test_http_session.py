@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import plugin_env
+
+pytest.importorskip("requests")
+
+http_session = plugin_env.load_module("http_session")
+
+def test_reuses_keep_alive_connection(http_server):
+    http_server.routes["/ping"] = [(200, b"pong", {})]
+    pool = http_session.HttpSessionPool()
+    try:
+        for _ in range(5):
+            response = pool.get(http_server.url("/ping"))
+            assert response.content == b"pong"
+
+        stats = pool.get_stats()
+        assert stats["requests"] == 5
+        assert stats["errors"] == 0
+        assert stats["connections"] == 1
+        assert stats["reuse_rate"] == pytest.approx(0.8)
+        host = f"http://127.0.0.1:{http_server.server_address[1]}"
+        assert stats["hosts"][host] == {"connections": 1, "requests": 5, "idle": 1}
+    finally:
+        pool.close()
+
+def test_threads_share_adapter_connections(http_server):
+    http_server.routes["/ping"] = [(200, b"pong", {})]
+    pool = http_session.HttpSessionPool()
+    try:
+        # 线程依次请求，后面的线程复用前面线程归还的连接
+        for _ in range(3):
+            thread = threading.Thread(target=lambda: pool.get(http_server.url("/ping")).content)
+            thread.start()
+            thread.join()
+        stats = pool.get_stats()
+        assert stats["requests"] == 3
+        assert stats["connections"] == 1
+    finally:
+        pool.close()
+
+def test_prunes_sessions_of_finished_threads(http_server):
+    http_server.routes["/ping"] = [(200, b"pong", {})]
+    pool = http_session.HttpSessionPool()
+    try:
+        pool.get(http_server.url("/ping"))
+        for _ in range(4):
+            thread = threading.Thread(target=lambda: pool.get(http_server.url("/ping"), retry=False))
+            thread.start()
+            thread.join()
+        # 每次创建Session时清理已结束线程的Session，只剩主线程和最后一个工作线程的
+        assert pool.get_stats()["sessions"] == 2
+
+        pool.get(http_server.url("/ping"), retry=False)
+        assert pool.get_stats()["sessions"] == 2
+        assert set(key[0] for key in pool._sessions) == {threading.current_thread()}
+    finally:
+        pool.close()
+
+def test_counts_errors():
+    pool = http_session.HttpSessionPool({"http": {"timeout": 2}})
+    try:
+        with pytest.raises(Exception):
+            # 端口1上没有服务，连接被拒绝
+            pool.get("http://127.0.0.1:1/", retry=False)
+        stats = pool.get_stats()
+        assert stats["requests"] == 1
+        assert stats["errors"] == 1
+    finally:
+        pool.close()
@@ -0,0 +1,77 @@
+import threading
+
+import plugin_env
+
+id_generator = plugin_env.load_module("id_generator")
+
+class FakeClock:
+    """只在sleep时前进的时钟"""
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        self.now += seconds
+
+def test_ids_unique_across_threads():
+    generator = id_generator.IdGenerator(node_id=7)
+    results = [[] for _ in range(8)]
+
+    def worker(out):
+        for _ in range(120):
+            out.append(generator.next_id())
+    threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [i for out in results for i in out]
+    assert len(set(ids)) == len(ids) == 960
+    # 每个线程拿到的ID按生成顺序递增
+    for out in results:
+        assert out == sorted(out)
+
+def test_sequence_overflow_rolls_into_next_second(monkeypatch):
+    clock = FakeClock(id_generator._EPOCH + 1000.5)
+    monkeypatch.setattr(id_generator, "time", clock)
+    generator = id_generator.IdGenerator(node_id=1)
+
+    per_second = 1 << id_generator._SEQ_BITS
+    ids = [generator.next_id() for _ in range(per_second * 2 + 10)]
+
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(len(i) == id_generator._ID_LENGTH for i in ids)
+    # 序号用尽后等到下一秒，而不是回绕或重复
+    assert clock.sleeps > 0
+    assert int(clock.now) - id_generator._EPOCH == 1002
+    assert int(ids[per_second - 1], 36) >> (id_generator._NODE_BITS + id_generator._SEQ_BITS) == 1000
+    assert int(ids[per_second], 36) >> (id_generator._NODE_BITS + id_generator._SEQ_BITS) == 1001
+
+def test_clock_going_backwards_keeps_order(monkeypatch):
+    clock = FakeClock(id_generator._EPOCH + 5000)
+    monkeypatch.setattr(id_generator, "time", clock)
+    generator = id_generator.IdGenerator(node_id=1)
+    first = generator.next_id()
+    clock.now -= 30
+    second = generator.next_id()
+    assert second > first
+
+def test_ids_from_different_nodes_differ(monkeypatch):
+    monkeypatch.setattr(id_generator, "time", FakeClock(id_generator._EPOCH + 10))
+    assert id_generator.IdGenerator(node_id=1).next_id() != id_generator.IdGenerator(node_id=2).next_id()
+
+def test_normalize_image_id():
+    new_id = id_generator.IdGenerator(node_id=3).next_id()
+    assert id_generator.normalize_image_id(new_id.upper()) == new_id
+    assert id_generator.normalize_image_id(f"  {new_id}\n") == new_id
+    # 旧版本的纯数字ID(整数或字符串)原样保留
+    assert id_generator.normalize_image_id(1704067890) == "1704067890"
+    assert id_generator.normalize_image_id(" 1704067890 ") == "1704067890"
+    assert id_generator.normalize_image_id("AbC123xyz") == "abc123xyz"
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+import plugin_env
+
+image_cache = plugin_env.load_module("image_cache")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(image_cache, "time", clock)
+    return clock
+
+def _url(token, variant="image_pre_watermark_1_5b.png"):
+    return f"https://p3-flow-imagex-sign.byteimg.com/tos-cn-i/{token}~tplv-a9rns2rl98-{variant}"
+
+def _files(path, suffix):
+    return sorted(name for name in os.listdir(path) if name.endswith(suffix))
+
+def test_hit_shared_by_url_variants_and_stats(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path))
+    assert cache.get(_url("abc")) is None
+    cache.put(_url("abc"), b"x" * 100)
+    # 同一token的不同尺寸URL命中同一文件
+    assert cache.get(_url("abc", "downsize.webp")) == b"x" * 100
+    assert cache.get(_url("abc")) == b"x" * 100
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 100
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == pytest.approx(0.6667)
+    assert stats["bytes_saved"] == 200
+
+def test_ttl_counts_from_write_not_access(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path), ttl_seconds=100)
+    cache.put(_url("a"), b"data")
+    clock.now += 60
+    assert cache.get(_url("a")) == b"data"
+    clock.now += 60
+    assert cache.get(_url("a")) is None
+    assert _files(tmp_path, ".img") == []
+    assert cache.get_stats()["bytes"] == 0
+
+def test_ttl_restored_from_mtime_after_restart(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path), ttl_seconds=100)
+    cache.put(_url("old"), b"old")
+    cache.put(_url("new"), b"new")
+    old_path = os.path.join(tmp_path, _files(tmp_path, ".img")[0])
+    for name in _files(tmp_path, ".img"):
+        os.utime(os.path.join(tmp_path, name), (clock.now, clock.now))
+    os.utime(old_path, (clock.now - 200, clock.now - 200))
+
+    reloaded = image_cache.ImageCache(str(tmp_path), ttl_seconds=100)
+    assert reloaded.get_stats()["entries"] == 1
+    assert not os.path.exists(old_path)
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path), max_bytes=250)
+    cache.put(_url("a"), b"a" * 100)
+    cache.put(_url("b"), b"b" * 100)
+    assert cache.get(_url("a")) is not None  # a变为最近使用
+    cache.put(_url("c"), b"c" * 100)
+
+    assert cache.get(_url("b")) is None
+    assert cache.get(_url("a")) == b"a" * 100
+    assert cache.get(_url("c")) == b"c" * 100
+    assert cache.get_stats()["bytes"] == 200
+    assert len(_files(tmp_path, ".img")) == 2
+
+def test_skips_data_larger_than_cache(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path), max_bytes=10)
+    cache.put(_url("a"), b"x" * 11)
+    assert _files(tmp_path, ".img") == []
+
+def test_failed_write_keeps_previous_file(tmp_path, clock, monkeypatch):
+    cache = image_cache.ImageCache(str(tmp_path))
+    cache.put(_url("a"), b"original")
+
+    def fail_replace(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(image_cache.os, "replace", fail_replace)
+        cache.put(_url("a"), b"partial")
+
+    # 写入失败时旧文件保持完整，临时文件被清理
+    assert _files(tmp_path, ".tmp") == []
+    assert cache.get(_url("a")) == b"original"
+    assert cache.get_stats()["bytes"] == len(b"original")
+
+def test_overwrite_replaces_whole_file(tmp_path, clock):
+    cache = image_cache.ImageCache(str(tmp_path))
+    cache.put(_url("a"), b"x" * 1000)
+    cache.put(_url("a"), b"short")
+    assert cache.get(_url("a")) == b"short"
+    assert cache.get_stats()["bytes"] == 5
+    assert _files(tmp_path, ".tmp") == []
+
+def test_leftover_temp_files_removed_on_load(tmp_path, clock):
+    (tmp_path / "crashed.tmp").write_bytes(b"half written")
+    (tmp_path / "other.txt").write_bytes(b"keep")
+    cache = image_cache.ImageCache(str(tmp_path))
+    assert _files(tmp_path, ".tmp") == []
+    assert (tmp_path / "other.txt").exists()
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,107 @@
+import time
+import types
+
+import pytest
+
+import plugin_env
+
+pytest.importorskip("requests")
+
+image_downloader = plugin_env.load_module("image_downloader")
+http_session = plugin_env.load_module("http_session")
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待时间，不实际sleep"""
+    delays = []
+    monkeypatch.setattr(image_downloader, "time", types.SimpleNamespace(time=time.time, sleep=delays.append))
+    return delays
+
+@pytest.fixture
+def pool():
+    pool = http_session.HttpSessionPool()
+    yield pool
+    pool.close()
+
+def _downloader(pool, **kwargs):
+    return image_downloader.ImageDownloader(pool, **kwargs)
+
+def test_retries_with_exponential_backoff(http_server, pool, sleeps):
+    http_server.routes["/flaky.png"] = [(503, b"", {}), (502, b"", {}), (200, b"image", {})]
+    downloader = _downloader(pool, retries=3, backoff_factor=0.5)
+    try:
+        result = downloader.download(http_server.url("/flaky.png"))
+    finally:
+        downloader.close()
+
+    assert result.ok
+    assert result.content == b"image"
+    assert result.attempts == 3
+    assert sleeps == [0.5, 1.0]
+    # 不叠加连接池的重试，服务端只收到3次请求
+    assert http_server.hits["/flaky.png"] == 3
+
+def test_gives_up_after_retries(http_server, pool, sleeps):
+    http_server.routes["/down.png"] = [(500, b"", {})]
+    downloader = _downloader(pool, retries=2, backoff_factor=1)
+    try:
+        result = downloader.download(http_server.url("/down.png"))
+        timings = downloader.get_timings()
+    finally:
+        downloader.close()
+
+    assert not result.ok
+    assert result.attempts == 3
+    assert sleeps == [1, 2]
+    assert http_server.hits["/down.png"] == 3
+    host_stats = next(iter(timings["hosts"].values()))
+    assert host_stats["count"] == 1
+    assert host_stats["failed"] == 1
+    assert timings["recent"][0]["ok"] is False
+
+def test_rejects_oversized_content_length(http_server, pool, sleeps):
+    http_server.routes["/big.png"] = [(200, b"x" * 2048, {})]
+    downloader = _downloader(pool, max_bytes=1024, retries=2)
+    try:
+        result = downloader.download(http_server.url("/big.png"))
+    finally:
+        downloader.close()
+
+    assert not result.ok
+    assert "too large" in str(result.error)
+    # 超过大小限制不重试
+    assert result.attempts == 1
+    assert sleeps == []
+
+def test_rejects_oversized_body_without_content_length(http_server, pool, sleeps):
+    # 分块传输时没有Content-Length，读取过程中检查大小
+    body = b"x" * 3000
+    chunked = b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body)
+    http_server.routes["/stream.png"] = [(200, chunked, {"Transfer-Encoding": "chunked", "Content-Length": None})]
+    downloader = _downloader(pool, max_bytes=1024, retries=2)
+    try:
+        result = downloader.download(http_server.url("/stream.png"))
+    finally:
+        downloader.close()
+
+    assert not result.ok
+    assert "exceeds 1024 bytes" in str(result.error)
+    assert result.attempts == 1
+
+def test_download_all_keeps_order_and_records_timings(http_server, pool, sleeps):
+    for i in range(4):
+        http_server.routes[f"/{i}.png"] = [(200, f"img{i}".encode(), {})]
+    http_server.routes["/missing.png"] = [(404, b"", {})]
+    urls = [http_server.url(f"/{i}.png") for i in range(4)] + [http_server.url("/missing.png")]
+    downloader = _downloader(pool, retries=0)
+    try:
+        results = downloader.download_all(urls)
+        timings = downloader.get_timings()
+    finally:
+        downloader.close()
+
+    assert [r.content for r in results] == [b"img0", b"img1", b"img2", b"img3", None]
+    assert {t["url"] for t in timings["recent"]} == set(urls)
+    host_stats = next(iter(timings["hosts"].values()))
+    assert host_stats["count"] == 5
+    assert host_stats["failed"] == 1
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+import plugin_env
+from image_fixtures import make_photo
+
+Image = pytest.importorskip("PIL.Image")
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+image_encoder = plugin_env.load_module("image_encoder")
+
+@pytest.fixture(scope="module")
+def photo():
+    # 叠加噪声，让编码大小随质量明显变化
+    bgr = make_photo(640, 480, seed=3).astype(np.int16)
+    noise = np.random.default_rng(3).integers(-20, 20, bgr.shape)
+    rgb = np.clip(bgr + noise, 0, 255).astype(np.uint8)[..., ::-1]
+    return Image.fromarray(np.ascontiguousarray(rgb))
+
+def _decode(data):
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+@pytest.mark.parametrize("format", ["jpeg", "webp"])
+def test_target_size_picks_highest_quality_that_fits(photo, format):
+    full, full_stats = image_encoder.ImageEncoder(format=format, quality=95).encode(photo)
+    target_kb = len(full) / 1024 / 2
+    encoder = image_encoder.ImageEncoder(format=format, quality=95, target_kb=target_kb, min_quality=10)
+
+    data, stats = encoder.encode(photo)
+    assert len(data) <= target_kb * 1024
+    assert stats["bytes"] == len(data)
+    assert 10 <= stats["quality"] < 95
+    assert stats["attempts"] > 1
+    # 高一级质量就会超过目标大小
+    above = encoder._encode_at(photo, stats["quality"] + 1)
+    assert len(above) > target_kb * 1024
+    assert _decode(data).size == photo.size
+
+def test_min_quality_used_when_target_unreachable(photo):
+    encoder = image_encoder.ImageEncoder(quality=90, target_kb=1, min_quality=40)
+    data, stats = encoder.encode(photo)
+    assert stats["quality"] == 40
+    assert len(data) > 1024
+
+def test_no_search_when_already_under_target(photo):
+    encoder = image_encoder.ImageEncoder(quality=80, target_kb=10_000)
+    _, stats = encoder.encode(photo)
+    assert stats["quality"] == 80
+    assert stats["attempts"] == 1
+
+def test_jpeg_options_applied(photo):
+    data, stats = image_encoder.ImageEncoder(progressive=True, subsampling="4:4:4").encode(photo)
+    image = _decode(data)
+    assert image.format == "JPEG"
+    assert image.info.get("progressive") or image.info.get("progression")
+    assert stats["format"] == "jpeg"
+
+def test_jpg_alias_and_extension():
+    encoder = image_encoder.ImageEncoder(format="JPG")
+    assert encoder.format == "jpeg"
+    assert encoder.extension == ".jpg"
+    assert image_encoder.ImageEncoder(format="webp").extension == ".webp"
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        image_encoder.ImageEncoder(format="gif")
+
+@pytest.mark.parametrize("config", [
+    {"format": "gif", "quality": 70},
+    {"format": "webp", "unknown_option": 1},
+])
+def test_invalid_config_falls_back_to_defaults(config):
+    encoder = image_encoder.create_image_encoder(config)
+    defaults = image_encoder.ImageEncoder()
+    assert vars(encoder) == vars(defaults)
+
+def test_channel_override():
+    config = {
+        "format": "jpeg",
+        "quality": 90,
+        "target_kb": 500,
+        "channels": {"wechatmp": {"format": "webp", "quality": 70}}
+    }
+    default = image_encoder.create_image_encoder(config)
+    assert (default.format, default.quality, default.target_bytes) == ("jpeg", 90, 500 * 1024)
+
+    override = image_encoder.create_image_encoder(config, "wechatmp")
+    # 通道配置只覆盖同名项，其余沿用默认配置
+    assert (override.format, override.quality, override.target_bytes) == ("webp", 70, 500 * 1024)
+
+    other = image_encoder.create_image_encoder(config, "wx")
+    assert vars(other) == vars(default)
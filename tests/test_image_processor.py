@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+import plugin_env
+import image_fixtures
+
+image_processor = plugin_env.load_module("image_processor")
+
+def _processor(tmp_path, **kwargs):
+    return image_processor.ImageProcessor(str(tmp_path / "temp"), **kwargs)
+
+@pytest.mark.parametrize("size", [(800, 600), (2048, 1536), (4000, 3000), (3000, 4000)])
+def test_reduced_mask_matches_full_resolution(tmp_path, size):
+    """缩小工作分辨率计算的蒙版与原分辨率结果一致"""
+    fixture = image_fixtures.make_mark_fixture(*size, seed=1)
+    masks = {}
+    for max_side in (0, 1024):
+        processor = _processor(tmp_path, mask_max_side=max_side)
+        masks[max_side] = (
+            image_fixtures.decode_mask(processor.create_mask_from_circle_selection(fixture["original"], fixture["circle"])),
+            image_fixtures.decode_mask(processor.create_mask_from_marked_image(fixture["original"], fixture["brush"]))
+        )
+
+    (full_circle, full_brush), (circle, brush) = masks[0], masks[1024]
+    assert circle.shape == full_circle.shape == (size[1], size[0])
+    assert image_fixtures.iou(circle, full_circle) >= 0.99
+    assert image_fixtures.iou(brush, full_brush) >= 0.9
+    assert image_fixtures.iou(circle, fixture["circle_region"]) >= 0.95
+    assert image_fixtures.iou(brush, fixture["brush_region"]) >= 0.85
+
+def test_marked_image_bypasses_decode_cache(tmp_path):
+    fixture = image_fixtures.make_mark_fixture(2048, 1536, seed=2)
+    processor = _processor(tmp_path)
+    processor.create_mask_from_circle_selection(fixture["original"], fixture["circle"])
+    processor.create_mask_from_marked_image(fixture["original"], fixture["brush"])
+
+    # 只缓存会被重复使用的原图
+    stats = processor.decoded_cache.get_stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1
+
+# sklearn KMeans(n_clusters=3, n_init=10, random_state=0)在全部像素上的聚类中心(BGR)，按像素占比从高到低
+KMEANS_REFERENCE = {
+    "blocks": [[199.5, 29.5, 29.4], [19.6, 179.5, 39.5], [239.4, 239.4, 239.4]],
+    "gray": [[43.0, 43.0, 43.0], [129.1, 129.1, 129.1], [213.2, 213.2, 213.2]],
+    "landscape": [[232.8, 179.2, 119.1], [60.8, 119.6, 60.2], [39.6, 60.2, 89.2]],
+    "smooth": [[100.3, 107.6, 180.7], [185.1, 150.6, 79.6], [61.2, 116.8, 68.3]],
+}
+# 匹配后聚类中心的最大允许距离(0-255)
+CENTER_TOLERANCE = 8
+
+def _max_center_distance(colors, reference):
+    """按最优一一匹配计算两组聚类中心的最大距离"""
+    import itertools
+    import numpy as np
+    colors = np.asarray(colors, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    dist = np.sqrt(((reference[:, None, :] - colors[None, :, :]) ** 2).sum(axis=2))
+    return min(max(dist[i, j] for i, j in enumerate(perm))
+               for perm in itertools.permutations(range(len(colors))))
+
+@pytest.mark.parametrize("name", sorted(KMEANS_REFERENCE))
+def test_dominant_colors_match_kmeans_reference(tmp_path, name):
+    image = image_fixtures.make_color_fixtures()[name]
+    colors = _processor(tmp_path)._get_dominant_colors(image)
+
+    assert colors.shape == (3, 3)
+    assert _max_center_distance(colors, KMEANS_REFERENCE[name]) <= CENTER_TOLERANCE
+    if name in ("blocks", "landscape"):
+        # 占比差异明显的图片，顺序与参考一致
+        assert abs(colors[0] - KMEANS_REFERENCE[name][0]).max() <= CENTER_TOLERANCE
+
+def test_dominant_colors_match_live_kmeans(tmp_path):
+    cluster = pytest.importorskip("sklearn.cluster")
+    processor = _processor(tmp_path)
+    for name, image in image_fixtures.make_color_fixtures().items():
+        kmeans = cluster.KMeans(n_clusters=3, n_init=10, random_state=0).fit(image.reshape(-1, 3).astype(float))
+        assert _max_center_distance(processor._get_dominant_colors(image), kmeans.cluster_centers_) <= CENTER_TOLERANCE, name
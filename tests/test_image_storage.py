@@ -0,0 +1,185 @@
+import json
+import sqlite3
+
+import pytest
+
+import plugin_env
+
+image_storage = plugin_env.load_module("image_storage")
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = image_storage.ImageStorage(str(tmp_path / "images.db"))
+    yield storage
+    storage.close()
+
+@pytest.mark.parametrize("filters, index", [
+    ({"conversation_id": "conv-1"}, "idx_images_conversation_created"),
+    ({"user_id": "user-1"}, "idx_images_user_created"),
+    ({"operation_type": "edit"}, "idx_images_type_created"),
+    ({"start_time": 1000, "end_time": 2000}, "idx_images_created_at"),
+    ({}, "idx_images_created_at"),
+])
+def test_query_uses_index(storage, filters, index):
+    for i in range(50):
+        storage.store_image(f"img-{i}", {
+            "urls": ["u"],
+            "type": "edit" if i % 2 else "generate",
+            "operation_params": {"conversation_id": f"conv-{i % 5}"},
+            "create_time": 1000 + i,
+            "user_id": f"user-{i % 3}"
+        })
+    conn = storage._get_conn()
+    conn.execute("ANALYZE")
+
+    plan = " | ".join(storage.query_plan(**filters))
+    assert f"USING INDEX {index}" in plan
+    # 排序由索引提供，不需要临时B树
+    assert "TEMP B-TREE" not in plan
+
+def _create_legacy_db(path):
+    """迁移前(无user_version)的数据库，每条记录复制了编辑链和操作历史"""
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE images
+                    (id TEXT PRIMARY KEY,
+                     urls TEXT NOT NULL,
+                     operation_type TEXT NOT NULL,
+                     operation_params TEXT,
+                     parent_id TEXT,
+                     edit_chain TEXT,
+                     operation_history TEXT,
+                     created_at INTEGER)''')
+    conn.execute("INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 ("root", json.dumps(["a"]), "generate", json.dumps({"conversation_id": "conv-1"}),
+                  None, json.dumps([]), json.dumps([{"id": "root", "type": "generate", "params": {}, "timestamp": 1}]), 1))
+    conn.execute("INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 ("child", json.dumps(["b"]), "edit", json.dumps({"conversation_id": "conv-1", "mask": "x" * 1024}),
+                  "root", json.dumps(["root"]), json.dumps([]), 2))
+    conn.commit()
+    conn.close()
+
+def _snapshot(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            "version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "schema": sorted(conn.execute("SELECT type, name, sql FROM sqlite_master").fetchall(), key=str),
+            "images": conn.execute("SELECT * FROM images ORDER BY id").fetchall(),
+            "blobs": conn.execute("SELECT hash, size FROM blobs ORDER BY hash").fetchall(),
+            "links": conn.execute("SELECT * FROM image_blobs ORDER BY image_id").fetchall()
+        }
+    finally:
+        conn.close()
+
+def test_migrating_legacy_db_twice_is_idempotent(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _create_legacy_db(path)
+
+    image_storage.ImageStorage(path).close()
+    first = _snapshot(path)
+    image_storage.ImageStorage(path).close()
+    second = _snapshot(path)
+
+    assert first == second
+    assert first["version"] == image_storage._MIGRATIONS[-1][0]
+    index_names = {row[1] for row in first["schema"] if row[0] == "index"}
+    assert {"idx_images_conversation_created", "idx_images_user_created",
+            "idx_images_type_created", "idx_images_created_at"} <= index_names
+    # 已有记录回填了会话ID，大字段只移入blob表一次
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT conversation_id FROM images WHERE id = 'child'").fetchone()[0] == "conv-1"
+    # 旧版本复制的血缘副本已清空
+    assert conn.execute("SELECT COUNT(*) FROM images WHERE edit_chain IS NOT NULL OR operation_history IS NOT NULL").fetchone()[0] == 0
+    conn.close()
+    assert len(first["blobs"]) == 1
+
+    storage = image_storage.ImageStorage(path)
+    try:
+        assert storage.get_image("child")["operation_params"]["mask"] == "x" * 1024
+        assert storage.get_ancestors("child") == ["root"]
+    finally:
+        storage.close()
+
+def test_reopening_after_partial_migration(tmp_path):
+    """旧版本已执行部分迁移(列已存在)时，剩余迁移仍能执行"""
+    path = str(tmp_path / "partial.db")
+    _create_legacy_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE images ADD COLUMN conversation_id TEXT")
+    conn.commit()
+    conn.close()
+
+    image_storage.ImageStorage(path).close()
+    image_storage.ImageStorage(path).close()
+    assert _snapshot(path)["version"] == image_storage._MIGRATIONS[-1][0]
+
+def test_blob_refs_resolved_in_history_and_queries(storage):
+    mask = "data:image/png;base64," + "A" * 4096
+    storage.store_image("root", {"urls": ["a"], "type": "generate", "operation_params": {"conversation_id": "conv-1"}})
+    storage.store_image("child", {"urls": ["b"], "type": "inpaint", "parent_id": "root",
+                                  "operation_params": {"conversation_id": "conv-1", "mask": mask}})
+
+    # 记录中只保存引用
+    row = storage._get_conn().execute("SELECT operation_params FROM images WHERE id = 'child'").fetchone()
+    assert mask not in row[0]
+
+    history = storage.get_history("child")
+    assert [h["id"] for h in history] == ["root", "child"]
+    assert history[1]["params"]["mask"] == mask
+    assert storage.get_image("child")["operation_history"][1]["params"].get("mask") == mask
+
+    latest = storage.query_images(conversation_id="conv-1", operation_type="inpaint")
+    assert latest[0]["operation_params"]["mask"] == mask
+
+def _batched(tmp_path, **kwargs):
+    # batch_max_delay足够长，由测试显式调用flush
+    return image_storage.ImageStorage(str(tmp_path / "batched.db"), durability="batched",
+                                      batch_max_delay=60, **kwargs)
+
+def test_batched_failure_drops_only_bad_rows(tmp_path):
+    storage = _batched(tmp_path)
+    try:
+        storage._write_batch([("dup", {"urls": ["a"], "type": "generate"})])
+        for img_id in ("a", "dup", "b", "c"):
+            storage.store_image(img_id, {"urls": [img_id], "type": "generate"})
+        storage.flush()
+
+        assert storage._pending == {}
+        rows = storage._get_conn().execute("SELECT id, urls FROM images ORDER BY id").fetchall()
+        assert rows == [("a", '["a"]'), ("b", '["b"]'), ("c", '["c"]'), ("dup", '["a"]')]
+    finally:
+        storage.close()
+
+def test_batched_keeps_records_on_transient_error(tmp_path):
+    storage = _batched(tmp_path, busy_timeout=0.05)
+    try:
+        storage.store_image("a", {"urls": ["a"], "type": "generate"})
+        storage.store_image("b", {"urls": ["b"], "type": "generate"})
+
+        # 其他连接持有写锁时提交失败，记录保留在队列中
+        locker = sqlite3.connect(storage.db_path, isolation_level=None)
+        locker.execute("BEGIN IMMEDIATE")
+        storage.flush()
+        assert list(storage._pending) == ["a", "b"]
+
+        locker.execute("ROLLBACK")
+        locker.close()
+        storage.flush()
+        assert storage._pending == {}
+        assert storage.get_image("b")["urls"] == ["b"]
+    finally:
+        storage.close()
+
+def test_batched_close_flushes_and_unregisters_atexit(tmp_path, monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(image_storage.atexit, "unregister", unregistered.append)
+    storage = _batched(tmp_path)
+    storage.store_image("a", {"urls": ["a"], "type": "generate"})
+    storage.close()
+
+    assert unregistered == [storage.flush]
+    reopened = image_storage.ImageStorage(storage.db_path)
+    try:
+        assert reopened.get_image("a")["urls"] == ["a"]
+    finally:
+        reopened.close()
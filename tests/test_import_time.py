@@ -0,0 +1,23 @@
+import importlib.util
+import os
+
+import pytest
+
+import plugin_env
+
+pytest.importorskip("requests")
+
+# 导入插件的耗时上限(秒)，实测约0.07秒，留出冷启动和慢机器的余量
+IMPORT_BUDGET = 1.0
+
+def _load_benchmark():
+    path = os.path.join(plugin_env.ROOT, "benchmarks", "import_time.py")
+    spec = importlib.util.spec_from_file_location("import_time", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_import_does_not_load_heavy_modules():
+    result = _load_benchmark().measure()
+    assert result["heavy"] == [], f"imported via {result['mode']}"
+    assert result["seconds"] < IMPORT_BUDGET
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+import plugin_env
+
+job_scheduler = plugin_env.load_module("job_scheduler")
+
+TIMEOUT = 5
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def _make(**kwargs):
+        scheduler = job_scheduler.JobScheduler(**kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+    yield _make
+    for scheduler in schedulers:
+        scheduler.shutdown(wait=True, timeout=TIMEOUT)
+
+class Recorder:
+    """记录任务开始顺序，任务阻塞到被放行"""
+
+    def __init__(self):
+        self.started = []
+        self._cond = threading.Condition()
+        self._gates = {}
+
+    def job(self, name):
+        with self._cond:
+            self._gates[name] = threading.Event()
+        def run():
+            with self._cond:
+                self.started.append(name)
+                self._cond.notify_all()
+            assert self._gates[name].wait(TIMEOUT)
+        return run
+
+    def release(self, name):
+        self._gates[name].set()
+
+    def wait_started(self, count):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.started) >= count, TIMEOUT)
+        return list(self.started)
+
+def _wait_idle(scheduler):
+    deadline = time.time() + TIMEOUT
+    while time.time() < deadline:
+        stats = scheduler.get_stats()
+        if stats["running"] == 0 and stats["queue_depth"] == 0:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError("scheduler did not become idle")
+
+def test_per_user_limit(make_scheduler):
+    scheduler = make_scheduler(max_workers=3, per_user_limit=1)
+    recorder = Recorder()
+    scheduler.submit("alice", recorder.job("a1"))
+    scheduler.submit("alice", recorder.job("a2"))
+    scheduler.submit("bob", recorder.job("b1"))
+
+    # 工作线程空闲，但alice的第二个任务要等第一个完成
+    assert sorted(recorder.wait_started(2)) == ["a1", "b1"]
+    time.sleep(0.05)
+    assert recorder.started.count("a2") == 0
+    assert scheduler.user_pending("alice") == 2
+
+    recorder.release("a1")
+    assert recorder.wait_started(3)[-1] == "a2"
+    recorder.release("a2")
+    recorder.release("b1")
+    assert _wait_idle(scheduler)["completed"] == 3
+
+def test_queue_full(make_scheduler):
+    scheduler = make_scheduler(max_workers=1, per_user_limit=1, max_queue=2)
+    recorder = Recorder()
+    scheduler.submit("u0", recorder.job("running"))
+    recorder.wait_started(1)
+    assert scheduler.submit("u1", recorder.job("q1")) == 1
+    assert scheduler.submit("u2", recorder.job("q2")) == 2
+
+    with pytest.raises(job_scheduler.QueueFullError):
+        scheduler.submit("u3", recorder.job("rejected"))
+    assert scheduler.get_stats()["rejected"] == 1
+
+    for name in ("running", "q1", "q2"):
+        recorder.release(name)
+    assert _wait_idle(scheduler)["completed"] == 3
+    assert "rejected" not in recorder.started
+
+def test_fifo_among_eligible_jobs(make_scheduler):
+    scheduler = make_scheduler(max_workers=1, per_user_limit=1)
+    recorder = Recorder()
+    scheduler.submit("blocker", recorder.job("blocker"))
+    recorder.wait_started(1)
+    for name in ("u1", "u2", "u3", "u4"):
+        scheduler.submit(name, recorder.job(name))
+
+    recorder.release("blocker")
+    for count, name in enumerate(("u1", "u2", "u3", "u4"), start=2):
+        assert recorder.wait_started(count)[-1] == name
+        recorder.release(name)
+    _wait_idle(scheduler)
+
+def test_blocked_user_is_skipped_in_order(make_scheduler):
+    scheduler = make_scheduler(max_workers=2, per_user_limit=1)
+    recorder = Recorder()
+    scheduler.submit("alice", recorder.job("a1"))
+    scheduler.submit("carol", recorder.job("c1"))
+    recorder.wait_started(2)
+    scheduler.submit("alice", recorder.job("a2"))
+    scheduler.submit("bob", recorder.job("b1"))
+    scheduler.submit("dave", recorder.job("d1"))
+
+    # a2排在最前但alice已达上限，空出的线程按顺序执行下一个可执行的任务
+    recorder.release("c1")
+    assert recorder.wait_started(3)[-1] == "b1"
+    recorder.release("a1")
+    assert recorder.wait_started(4)[-1] == "a2"
+    for name in ("b1", "a2"):
+        recorder.release(name)
+    assert recorder.wait_started(5)[-1] == "d1"
+    recorder.release("d1")
+    _wait_idle(scheduler)
+
+def test_failed_jobs_counted(make_scheduler):
+    scheduler = make_scheduler(max_workers=1)
+
+    def fail():
+        raise ValueError("boom")
+    scheduler.submit("u", fail)
+    scheduler.submit("u", lambda: None)
+    stats = _wait_idle(scheduler)
+    assert (stats["completed"], stats["failed"]) == (1, 1)
+
+def test_shutdown_drops_queued_jobs(make_scheduler):
+    scheduler = make_scheduler(max_workers=1)
+    recorder = Recorder()
+    scheduler.submit("u0", recorder.job("running"))
+    recorder.wait_started(1)
+    scheduler.submit("u1", recorder.job("queued1"))
+    scheduler.submit("u2", recorder.job("queued2"))
+
+    stopper = threading.Thread(target=scheduler.shutdown, kwargs={"wait": True, "timeout": TIMEOUT})
+    stopper.start()
+    time.sleep(0.05)
+    # 已取出的任务继续执行完成
+    recorder.release("running")
+    stopper.join(TIMEOUT)
+
+    assert not stopper.is_alive()
+    assert recorder.started == ["running"]
+    assert scheduler.get_stats()["queue_depth"] == 0
+    assert all(not worker.is_alive() for worker in scheduler._workers)
+    with pytest.raises(job_scheduler.QueueFullError):
+        scheduler.submit("u3", lambda: None)
@@ -0,0 +1,120 @@
+import os
+
+import plugin_env
+
+pending_store = plugin_env.load_module("pending_store")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+def _store(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(pending_store, "time", clock)
+    return pending_store.PendingStore(**kwargs), clock
+
+def test_set_get_pop(monkeypatch):
+    store, _ = _store(monkeypatch)
+    store.set("reference", "u1", {"prompt": "a cat"})
+    assert store.get("reference", "u1") == {"prompt": "a cat"}
+    assert store.get("inpaint", "u1") is None
+    assert store.get("reference", "u2") is None
+
+    store.pop("reference", "u1")
+    assert store.get("reference", "u1") is None
+    # 正常完成不算过期
+    assert store.pop_expired("reference", "u1") is False
+    assert store.get_stats()["completed"] == 1
+
+def test_ttl_expiry_reported_once(monkeypatch):
+    store, clock = _store(monkeypatch, ttl=60)
+    store.set("inpaint", "u1", {"prompt": "p"})
+    clock.now += 59
+    assert store.get("inpaint", "u1") is not None
+    assert store.pop_expired("inpaint", "u1") is False
+
+    clock.now += 61
+    assert store.get("inpaint", "u1") is None
+    assert store.pop_expired("inpaint", "u1") is True
+    assert store.pop_expired("inpaint", "u1") is False
+    assert store.get_stats()["expired"] == 1
+
+def test_payload_refreshes_ttl(monkeypatch):
+    store, clock = _store(monkeypatch, ttl=60)
+    store.set("inpaint", "u1", {})
+    clock.now += 50
+    assert store.put_payload("inpaint", "u1", "original", b"img")
+    clock.now += 50
+    assert store.get_payload("inpaint", "u1", "original") == b"img"
+    # 命令不存在时不保存数据
+    assert store.put_payload("inpaint", "u2", "original", b"img") is False
+
+def test_new_command_clears_expiry_notice(monkeypatch):
+    store, clock = _store(monkeypatch, ttl=60)
+    store.set("reference", "u1", {})
+    clock.now += 120
+    store.get("reference", "u1")
+    store.set("reference", "u1", {"prompt": "again"})
+    assert store.pop_expired("reference", "u1") is False
+
+def test_evicts_least_recently_used_at_capacity(monkeypatch):
+    store, clock = _store(monkeypatch, max_bytes=2500)
+    for user in ("u1", "u2", "u3"):
+        store.set("inpaint", user, {})
+        clock.now += 1
+    store.put_payload("inpaint", "u1", "original", b"x" * 1000)  # u1变为最近使用
+    clock.now += 1
+    store.put_payload("inpaint", "u2", "original", b"x" * 1000)
+    clock.now += 1
+    # 超过上限时先淘汰最久未更新的u3，再淘汰u1
+    store.put_payload("inpaint", "u3", "original", b"x" * 1000)
+
+    assert store.get("inpaint", "u1") is None
+    assert store.get("inpaint", "u2") is not None
+    assert store.get("inpaint", "u3") is not None
+    assert store.pop_expired("inpaint", "u1") is True
+    stats = store.get_stats()
+    assert stats["evicted"] == 1
+    assert stats["memory_bytes"] <= 2500
+
+def test_large_payloads_spill_to_disk(monkeypatch, tmp_path):
+    spill_dir = tmp_path / "pending"
+    spill_dir.mkdir()
+    (spill_dir / "stale.pending").write_bytes(b"old")
+    store, _ = _store(monkeypatch, spill_dir=str(spill_dir), spill_threshold=1024)
+    # 上次运行残留的文件在启动时清理
+    assert os.listdir(spill_dir) == []
+
+    big = os.urandom(4096)
+    store.set("inpaint", "u1", {})
+    store.put_payload("inpaint", "u1", "original", big)
+    store.put_payload("inpaint", "u1", "mask", "m" * 2048)
+    store.put_payload("inpaint", "u1", "small", b"tiny")
+
+    assert len(os.listdir(spill_dir)) == 2
+    assert store.get_payload("inpaint", "u1", "original") == big
+    assert store.get_payload("inpaint", "u1", "mask") == "m" * 2048
+    assert store.get_payload("inpaint", "u1", "small") == b"tiny"
+    stats = store.get_stats()
+    assert stats["spilled"] == 2
+    # 落盘的数据不计入内存占用
+    assert stats["memory_bytes"] < 1024
+
+    # 覆盖和清除时删除对应文件
+    store.put_payload("inpaint", "u1", "original", os.urandom(4096))
+    assert len(os.listdir(spill_dir)) == 2
+    store.pop("inpaint", "u1")
+    assert os.listdir(spill_dir) == []
+
+def test_stats_by_kind(monkeypatch):
+    store, _ = _store(monkeypatch)
+    store.set("inpaint", "u1", {})
+    store.set("reference", "u1", {})
+    store.set("reference", "u2", {})
+    stats = store.get_stats()
+    assert stats["active"] == 3
+    assert stats["by_kind"] == {"inpaint": 1, "reference": 2}
+    assert stats["created"] == 3
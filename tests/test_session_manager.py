@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+import plugin_env
+
+session_manager = plugin_env.load_module("session_manager")
+memory_storage = plugin_env.load_module("memory_storage")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_manager, "time", clock)
+    return clock
+
+@pytest.fixture
+def storage():
+    storage = memory_storage.MemoryImageStorage()
+    yield storage
+    storage.close()
+
+def test_rotates_after_message_limit(storage, clock):
+    manager = session_manager.SessionManager(storage, rotate_after=3)
+    session = manager.get("group:1")
+    manager.update(session, conversation_id="c1", section_id="s1", reply_id="r1")
+    for i in range(2):
+        session = manager.get("group:1")
+        assert session.conversation_id == "c1"
+        manager.update(session, reply_id=f"r{i + 2}")
+    assert session.message_count == 3
+
+    session = manager.get("group:1")
+    assert session.conversation_id is None
+    assert session.message_count == 0
+    # 轮换结果也持久化
+    assert storage.load_session("group:1")["conversation_id"] is None
+
+def test_new_conversation_id_restarts_count(storage, clock):
+    manager = session_manager.SessionManager(storage, rotate_after=3)
+    session = manager.get("u1")
+    manager.update(session, conversation_id="c1")
+    manager.update(session, conversation_id="c1")
+    manager.update(session, conversation_id="c2")
+    assert session.message_count == 1
+
+def test_idle_sessions_evicted_and_reloaded(storage, clock):
+    manager = session_manager.SessionManager(storage, idle_timeout=60)
+    session = manager.get("u1")
+    manager.update(session, conversation_id="c1", section_id="s1", reply_id="r1")
+
+    clock.now += 61
+    manager.get("u2")
+    assert manager.get_stats()["sessions"] == 1
+
+    reloaded = manager.get("u1")
+    assert reloaded is not session
+    assert (reloaded.conversation_id, reloaded.section_id, reloaded.reply_id) == ("c1", "s1", "r1")
+    assert reloaded.message_count == 1
+
+def test_active_sessions_not_evicted(storage, clock):
+    manager = session_manager.SessionManager(storage, idle_timeout=60)
+    first = manager.get("u1")
+    clock.now += 50
+    manager.get("u1")
+    clock.now += 50
+    manager.get("u2")
+    assert manager.get("u1") is first
+
+def test_evicts_least_recently_used(storage, clock):
+    manager = session_manager.SessionManager(storage, max_sessions=2)
+    a = manager.get("a")
+    b = manager.get("b")
+    manager.get("a")  # a变为最近使用
+    manager.get("c")
+
+    assert manager.get_stats()["sessions"] == 2
+    assert manager.get("a") is a
+    assert manager.get("b") is not b
+
+def test_reloads_from_storage_after_restart(storage, clock):
+    manager = session_manager.SessionManager(storage)
+    manager.update(manager.get("u1"), conversation_id="c1", section_id="s1", reply_id="r1")
+
+    restarted = session_manager.SessionManager(storage)
+    session = restarted.get("u1")
+    assert session.to_dict() == {"conversation_id": "c1", "section_id": "s1", "reply_id": "r1", "message_count": 1}
+
+def test_reset_clears_conversation(storage, clock):
+    manager = session_manager.SessionManager(storage)
+    manager.update(manager.get("u1"), conversation_id="c1")
+    manager.reset("u1")
+    assert session_manager.SessionManager(storage).get("u1").conversation_id is None
+
+def test_concurrent_first_messages_share_session():
+    class SlowStorage:
+        def __init__(self):
+            self.loads = 0
+
+        def load_session(self, key):
+            self.loads += 1
+            time.sleep(0.05)  # 扩大并发加载的时间窗口
+            return None
+
+        def save_session(self, key, data):
+            pass
+
+    storage = SlowStorage()
+    manager = session_manager.SessionManager(storage)
+    barrier = threading.Barrier(8)
+    sessions = []
+
+    def worker():
+        barrier.wait()
+        sessions.append(manager.get("group:1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(session) for session in sessions}) == 1
+    assert storage.loads == 1
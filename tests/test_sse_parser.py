@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import plugin_env
+
+sse_parser = plugin_env.load_module("sse_parser")
+StreamEvent = sse_parser.StreamEvent
+
+def _line(event_data, ensure_ascii=False):
+    """构造一行SSE数据，event_data本身是JSON字符串"""
+    payload = {"event_type": 2001, "event_data": json.dumps(event_data, ensure_ascii=ensure_ascii)}
+    return ("data: " + json.dumps(payload, ensure_ascii=ensure_ascii)).encode("utf-8")
+
+def _image_line(*urls, ensure_ascii=False):
+    content = {"data": [{"image_raw": {"url": url, "width": 1024}} for url in urls]}
+    return _line({"message": {"content_type": 2010, "content": json.dumps(content, ensure_ascii=ensure_ascii)}},
+                 ensure_ascii)
+
+CONVERSATION_LINE = _line({"conversation_id": "c1", "section_id": "s1", "reply_id": "r1"})
+
+def test_conversation_and_images():
+    parser = sse_parser.CompletionStreamParser()
+    events = list(parser.parse([CONVERSATION_LINE, _image_line("https://a/1.png", "https://a/2.png")]))
+
+    assert [e.type for e in events] == [StreamEvent.CONVERSATION, StreamEvent.REPLY, StreamEvent.IMAGE, StreamEvent.IMAGE]
+    assert events[0].conversation_id == "c1" and events[0].section_id == "s1"
+    assert events[1].reply_id == "r1"
+    assert [(e.url, e.index) for e in events[2:]] == [("https://a/1.png", 0), ("https://a/2.png", 1)]
+    assert parser.result == {"urls": ["https://a/1.png", "https://a/2.png"],
+                             "conversation_id": "c1", "section_id": "s1", "reply_id": "r1"}
+
+def test_duplicate_image_urls_reported_once():
+    parser = sse_parser.CompletionStreamParser()
+    events = list(parser.parse([
+        _image_line("https://a/1.png"),
+        _image_line("https://a/1.png", "https://a/2.png"),
+        _image_line("https://a/2.png"),
+    ]))
+    assert [e.url for e in events] == ["https://a/1.png", "https://a/2.png"]
+    assert parser.result["urls"] == ["https://a/1.png", "https://a/2.png"]
+
+def test_partial_lines_are_ignored():
+    parser = sse_parser.CompletionStreamParser()
+    full = _image_line("https://a/1.png")
+    # 被截断的行JSON不完整，跳过后不影响后续完整的行
+    assert parser.feed(full[:len(full) // 2]) == []
+    assert parser.feed(b"") == []
+    assert parser.feed(None) == []
+    assert [e.url for e in parser.feed(full)] == ["https://a/1.png"]
+
+@pytest.mark.parametrize("line", [
+    b"event: message",
+    b": heartbeat",
+    _line({"message": {"content_type": 2001, "content": json.dumps({"text": "hello"})}}),
+    b'data: {"event_type": 2003}',
+])
+def test_lines_without_conversation_or_images_produce_nothing(line):
+    parser = sse_parser.CompletionStreamParser()
+    assert parser.feed(line) == []
+    assert parser.result == {"urls": [], "conversation_id": None, "section_id": None, "reply_id": None}
+
+def test_image_entries_without_image_raw_are_skipped():
+    content = {"data": [{"status": "pending"}, {"image_raw": {"url": "https://a/1.png"}}]}
+    line = _line({"message": {"content_type": 2010, "content": json.dumps(content)}})
+    events = sse_parser.CompletionStreamParser().feed(line)
+    assert [(e.url, e.index) for e in events] == [("https://a/1.png", 0)]
+
+def test_ascii_escaped_payloads():
+    parser = sse_parser.CompletionStreamParser()
+    url = "https://a/图片.png"
+    lines = [_line({"conversation_id": "会话1", "section_id": "s1"}, ensure_ascii=True),
+             _image_line(url, ensure_ascii=True)]
+    assert b"\\u" in lines[1]
+    events = list(parser.parse(lines))
+    assert [e.type for e in events] == [StreamEvent.CONVERSATION, StreamEvent.IMAGE]
+    assert parser.result["conversation_id"] == "会话1"
+    assert parser.result["urls"] == [url]
+
+def test_str_lines_accepted():
+    parser = sse_parser.CompletionStreamParser()
+    assert [e.type for e in parser.feed(CONVERSATION_LINE.decode("utf-8"))] == [StreamEvent.CONVERSATION, StreamEvent.REPLY]
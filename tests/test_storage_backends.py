@@ -0,0 +1,172 @@
+"""各存储后端的一致性测试，sqlite、memory和redis(fakeredis)需表现一致"""
+import importlib.util
+import os
+import time
+
+import pytest
+
+import plugin_env
+
+image_storage = plugin_env.load_module("image_storage")
+memory_storage = plugin_env.load_module("memory_storage")
+redis_storage = plugin_env.load_module("redis_storage")
+
+DAY = 86400
+
+@pytest.fixture(params=["sqlite", "memory", "redis"])
+def storage(request, tmp_path):
+    if request.param == "sqlite":
+        storage = image_storage.ImageStorage(str(tmp_path / "images.db"), retention_days=7)
+    elif request.param == "memory":
+        storage = memory_storage.MemoryImageStorage(retention_days=7)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        storage = redis_storage.RedisImageStorage(client=fakeredis.FakeRedis(decode_responses=True),
+                                                  retention_days=7)
+    storage.backend_name = request.param
+    yield storage
+    storage.close()
+
+def _store(storage, img_id, parent_id=None, create_time=None, type="generate",
+           conversation_id="conv-1", user_id="user-1", **params):
+    params["conversation_id"] = conversation_id
+    storage.store_image(img_id, {
+        "urls": [f"https://example.com/{img_id}/{i}.png" for i in range(4)],
+        "type": type,
+        "operation_params": params,
+        "parent_id": parent_id,
+        "create_time": create_time if create_time is not None else int(time.time()),
+        "user_id": user_id
+    })
+
+def test_store_and_get(storage):
+    _store(storage, "img-1", prompt="a cat", create_time=1000)
+    image = storage.get_image("img-1")
+
+    assert image["id"] == "img-1"
+    assert image["urls"][3] == "https://example.com/img-1/3.png"
+    assert image["type"] == "generate"
+    assert image["operation_params"]["prompt"] == "a cat"
+    assert image["parent_id"] is None
+    assert image["create_time"] == 1000
+    assert storage.get_image("missing") is None
+    assert storage.validate_image_index("img-1", 4) == (True, None)
+    assert storage.validate_image_index("img-1", 5)[0] is False
+
+def test_duplicate_id_rejected(storage):
+    _store(storage, "img-1", prompt="first")
+    with pytest.raises(Exception):
+        _store(storage, "img-1", prompt="second")
+    assert storage.get_image("img-1")["operation_params"]["prompt"] == "first"
+
+def test_lineage(storage):
+    _store(storage, "root", create_time=1)
+    _store(storage, "edit-1", parent_id="root", type="edit", create_time=2, prompt="p1")
+    _store(storage, "edit-2", parent_id="edit-1", type="inpaint", create_time=3, mask="m" * 2048)
+
+    assert storage.get_ancestors("edit-2") == ["root", "edit-1"]
+    assert storage.get_ancestors("root") == []
+    history = storage.get_history("edit-2")
+    assert [(h["id"], h["type"], h["timestamp"]) for h in history] == [
+        ("root", "generate", 1), ("edit-1", "edit", 2), ("edit-2", "inpaint", 3)]
+    assert history[1]["params"]["prompt"] == "p1"
+    assert history[2]["params"]["mask"] == "m" * 2048
+
+    image = storage.get_image("edit-2")
+    assert image["edit_chain"] == ["root", "edit-1"]
+    assert [h["id"] for h in image["operation_history"]] == ["root", "edit-1", "edit-2"]
+    assert image["operation_params"]["mask"] == "m" * 2048
+
+def test_descendants(storage):
+    _store(storage, "root", create_time=1)
+    _store(storage, "b", parent_id="root", create_time=3)
+    _store(storage, "a", parent_id="root", create_time=2)
+    _store(storage, "a1", parent_id="a", create_time=4)
+
+    descendants = storage.get_descendants("root")
+    assert [(d["id"], d["parent_id"], d["depth"]) for d in descendants] == [
+        ("a", "root", 1), ("b", "root", 1), ("a1", "a", 2)]
+    assert storage.get_descendants("a1") == []
+
+def test_query_images_filters(storage):
+    _store(storage, "g1", create_time=100, conversation_id="c1", user_id="u1")
+    _store(storage, "e1", create_time=200, type="edit", conversation_id="c1", user_id="u2")
+    _store(storage, "g2", create_time=300, conversation_id="c2", user_id="u1")
+    _store(storage, "e2", create_time=400, type="edit", conversation_id="c2", user_id="u2")
+
+    def ids(**filters):
+        return [r["id"] for r in storage.query_images(**filters)]
+
+    assert ids() == ["e2", "g2", "e1", "g1"]
+    assert ids(conversation_id="c1") == ["e1", "g1"]
+    assert ids(user_id="u1") == ["g2", "g1"]
+    assert ids(operation_type="edit") == ["e2", "e1"]
+    assert ids(conversation_id="c2", operation_type="edit") == ["e2"]
+    assert ids(user_id="u2", conversation_id="c1") == ["e1"]
+    assert ids(start_time=200, end_time=400) == ["g2", "e1"]
+    assert ids(limit=2) == ["e2", "g2"]
+    assert ids(user_id="nobody") == []
+
+    record = storage.query_images(operation_type="edit", limit=1)[0]
+    assert record["created_at"] == 400
+    assert record["operation_params"]["conversation_id"] == "c2"
+    assert storage.get_latest_image(user_id="u1")["id"] == "g2"
+
+def test_sessions(storage):
+    assert storage.load_session("user-1") is None
+    storage.save_session("user-1", {"conversation_id": "c1", "message_count": 1})
+    storage.save_session("user-1", {"conversation_id": "c1", "message_count": 2})
+    assert storage.load_session("user-1") == {"conversation_id": "c1", "message_count": 2}
+
+def test_purge_keeps_referenced_ancestors(storage):
+    now = int(time.time())
+    old = now - 30 * DAY
+    _store(storage, "old-root", create_time=old)
+    _store(storage, "old-mid", parent_id="old-root", create_time=old + 1)
+    _store(storage, "new-child", parent_id="old-mid", create_time=now)
+    _store(storage, "old-alone", create_time=old)
+    _store(storage, "old-chain-root", create_time=old)
+    _store(storage, "old-chain-child", parent_id="old-chain-root", create_time=old + 1)
+    _store(storage, "new-alone", create_time=now)
+
+    stats = storage.purge_expired(pause=0)
+
+    assert stats["rows_deleted"] == 3
+    for img_id in ("old-alone", "old-chain-root", "old-chain-child"):
+        assert storage.get_image(img_id) is None
+    for img_id in ("old-root", "old-mid", "new-child", "new-alone"):
+        assert storage.get_image(img_id) is not None
+    assert storage.get_ancestors("new-child") == ["old-root", "old-mid"]
+    assert storage.purge_expired(pause=0)["rows_deleted"] == 0
+
+def test_purge_expires_sessions(storage, monkeypatch):
+    if storage.backend_name == "redis":
+        # Redis后端由键的过期时间清理会话
+        storage.save_session("old", {"message_count": 1})
+        assert 0 < storage.client.ttl(storage._key("session", "old")) <= 7 * DAY
+        return
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 30 * DAY)
+    storage.save_session("old", {"message_count": 1})
+    monkeypatch.setattr(time, "time", lambda: now)
+    storage.save_session("new", {"message_count": 1})
+
+    stats = storage.purge_expired(pause=0)
+    assert stats["sessions_deleted"] == 1
+    assert storage.load_session("old") is None
+    assert storage.load_session("new") == {"message_count": 1}
+
+def _load_benchmark():
+    path = os.path.join(plugin_env.ROOT, "benchmarks", "storage_bench.py")
+    spec = importlib.util.spec_from_file_location("storage_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_throughput(storage):
+    """基准脚本在各后端都能运行，吞吐明显退化时失败"""
+    result = _load_benchmark().run(storage, n=200)
+    print(f"{storage.backend_name}: " + ", ".join(f"{k} {v:.0f}/s" for k, v in result.items()))
+    # 下限远低于实测值，只用于发现数量级的退化
+    assert min(result.values()) > 50
@@ -0,0 +1,87 @@
+import os
+import threading
+
+import plugin_env
+
+temp_files = plugin_env.load_module("temp_files")
+
+def test_file_survives_while_any_handle_open(tmp_path):
+    registry = temp_files.TempFileRegistry(str(tmp_path))
+    path = registry.create(b"data")
+    registry.acquire(path)
+    registry.acquire(path)
+
+    registry.release(path)
+    registry.release(path)
+    assert os.path.exists(path)
+    assert registry.get_stats() == {"files": 1, "refs": 1}
+
+    registry.release(path)
+    assert not os.path.exists(path)
+    assert registry.get_stats() == {"files": 0, "refs": 0}
+    # 多余的释放被忽略
+    registry.release(path)
+
+def test_handle_close_releases_reference(tmp_path):
+    registry = temp_files.TempFileRegistry(str(tmp_path))
+    handle = registry.open(b"image", prefix="grid", ext=".webp")
+    assert handle.name.endswith(".webp")
+    registry.acquire(handle.name)  # 另一个请求也在使用
+
+    assert handle.read() == b"image"
+    handle.close()
+    assert os.path.exists(handle.name)
+    handle.close()  # 重复关闭不重复释放
+    assert os.path.exists(handle.name)
+
+    registry.release(handle.name)
+    assert not os.path.exists(handle.name)
+
+def test_files_are_independent(tmp_path):
+    registry = temp_files.TempFileRegistry(str(tmp_path))
+    first = registry.open(b"a")
+    second = registry.open(b"a")
+    assert first.name != second.name
+    first.close()
+    assert not os.path.exists(first.name)
+    assert second.read() == b"a"
+    second.close()
+
+def test_concurrent_acquire_release(tmp_path):
+    registry = temp_files.TempFileRegistry(str(tmp_path))
+    path = registry.create(b"data")
+
+    def worker():
+        for _ in range(200):
+            registry.acquire(path)
+            registry.release(path)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert os.path.exists(path)
+    registry.release(path)
+    assert not os.path.exists(path)
+
+def test_close_removes_unreleased_files(tmp_path):
+    registry = temp_files.TempFileRegistry(str(tmp_path))
+    leaked = registry.create(b"leaked")
+    handle = registry.open(b"open")
+    (tmp_path / "keep.txt").write_bytes(b"not ours")
+
+    registry.close()
+    assert not os.path.exists(leaked)
+    assert not os.path.exists(handle.name)
+    assert registry.get_stats() == {"files": 0, "refs": 0}
+    # 打开的句柄仍可读取，关闭时不再报错
+    assert handle.read() == b"open"
+    handle.close()
+    assert os.listdir(tmp_path) == ["keep.txt"]
+
+def test_leftover_files_removed_on_start(tmp_path):
+    (tmp_path / "tmp_image_old.jpg").write_bytes(b"old")
+    (tmp_path / "user.jpg").write_bytes(b"keep")
+    temp_files.TempFileRegistry(str(tmp_path))
+    assert os.listdir(tmp_path) == ["user.jpg"]